@@ -2,24 +2,25 @@
 # ONLY routes HTTP requests and delegates ALL layer processing to backend
 import os
 import json
+import time
 import logging
-import subprocess
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from typing import Iterator, List, Optional, Tuple
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 
+import config
+
 # ========================
 # IMPORTS FROM BACKEND LAYERS
 # ========================
 # Assuming your folder structure has __init__.py files in layer directories
 # or they are simple python files.
 try:
-    from layer1.inversion_filter import InversionFilter
-    from layer2 import detect_intent # Assuming detect_intent is exposed in layer2/__init__.py
-    from layer3.mathematical_armor import MathematicalArmor
-    from layer4 import filter_output # Assuming filter_output is exposed in layer4/__init__.py
-    from layer5 import enforce_playbook, update_user_score, get_user_status # Assuming these are exposed
-    from layer6 import record_transaction # Assuming this is exposed
+    from layer2 import enable_batching, batching_stats, enable_cache, cache_stats, enable_cascade, cascade_stats, enable_allowlist, allowlist_stats, enable_signatures, signature_stats, use_model # Assuming these are exposed in layer2/__init__.py
+    from pipeline import Pipeline # Layers 1-6 are wired together in pipeline.py
+    from llm_backends import build_backend
+    from layer6 import metrics_snapshot
 except ImportError as e:
     print(f"CRITICAL IMPORT ERROR: {e}")
     print("Ensure all layer folders have __init__.py files or direct file imports.")
@@ -35,6 +36,37 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Layer 2 model variant (default: IntentStateAnalyzer.MODEL_NAME)
+if config.L2_MODEL:
+    use_model(config.L2_MODEL)
+
+# Layer 2 micro-batching: concurrent requests share one ONNX batch
+if config.L2_BATCHING_ENABLED:
+    enable_batching(max_batch_size=config.L2_MAX_BATCH_SIZE, max_wait_ms=config.L2_MAX_WAIT_MS,
+                    timeout_seconds=config.L2_BATCH_TIMEOUT_SECONDS)
+
+# Layer 2 verdict cache: repeated prompts skip the ONNX model entirely
+if config.L2_CACHE_ENABLED:
+    enable_cache(max_bytes=config.L2_CACHE_MAX_BYTES, ttl_seconds=config.L2_CACHE_TTL_SECONDS)
+
+# Layer 2 cascade: confident prompts are decided by the cheap first stage
+if config.L2_CASCADE_ENABLED:
+    enable_cascade(config.L2_CASCADE_MODEL, low=config.L2_CASCADE_LOW, high=config.L2_CASCADE_HIGH)
+
+# Layer 2 allowlist: near-duplicates of curated safe prompts skip or soften the model
+if config.L2_ALLOWLIST_ENABLED:
+    enable_allowlist(config.L2_ALLOWLIST_DB, min_similarity=config.L2_ALLOWLIST_MIN_SIMILARITY,
+                     mode=config.L2_ALLOWLIST_MODE, margin=config.L2_ALLOWLIST_MARGIN,
+                     reload_interval_seconds=config.L2_ALLOWLIST_RELOAD_SECONDS)
+
+# Layer 2 attack signatures: close copies of known attacks are blocked before the model
+if config.L2_SIGNATURES_ENABLED:
+    try:
+        enable_signatures(block_similarity=config.L2_SIGNATURE_BLOCK_SIMILARITY,
+                          tag_similarity=config.L2_SIGNATURE_TAG_SIMILARITY)
+    except RuntimeError as e:
+        logger.warning(f"Layer 2 attack signatures disabled: {e}")
+
 # Store conversation history in memory
 conversation_history = []
 recent_conversations = []
@@ -43,213 +75,44 @@ recent_conversations = []
 # HELPER FUNCTIONS
 # ========================
 
+# LLM backend: resident Ollama server over pooled HTTP by default, with
+# the original `ollama run` subprocess path as fallback (see llm_backends.py)
+llm_backend = build_backend(
+    kind=config.LLM_BACKEND,
+    base_url=config.OLLAMA_URL,
+    model=config.LLM_MODEL,
+    max_concurrency=config.LLM_MAX_CONCURRENCY,
+    timeout=config.LLM_TIMEOUT_SECONDS,
+    keep_alive=config.LLM_KEEP_ALIVE,
+)
+
 def run_llama(system_prompt: str, user_prompt: str) -> str:
     """Call Ollama LLM"""
-    cmd = ["ollama", "run", "llama3.2:1b"]
-    full_prompt = f"{system_prompt}\n\nUser: {user_prompt}"
-    
-    # Pass the prompt as a single argument after the model name
-    # Note: Depending on OS, prompts with newlines might need careful handling
-    # Often it is safer to pipe into stdin for complex prompts
-    
-    try:
-        # Using input=full_prompt to pass via stdin is safer for large/complex strings
-        result = subprocess.run(
-            cmd,
-            input=full_prompt,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            timeout=60
-        )
-
-        if result.returncode != 0:
-            logger.warning(f"Ollama stderr: {result.stderr}")
-            return "Error: LLM failed to respond."
-
-        return result.stdout.strip()
-    except subprocess.TimeoutExpired:
-        logger.error("Ollama call timed out")
-        return "Error: LLM response timeout."
-    except Exception as e:
-        logger.error(f"Error calling Ollama: {str(e)}")
-        return f"Error: {str(e)}"
+    return llm_backend.generate(system_prompt, user_prompt)
+
+def stream_llama(system_prompt: str, user_prompt: str) -> Iterator[str]:
+    """Call Ollama LLM and yield output chunks as soon as they are produced"""
+    return llm_backend.stream(system_prompt, user_prompt)
+
+# Built once per process; warm-up runs in the background (retried with
+# backoff if it fails) and /api/status reports 503 until the Layer 2 model
+# is loaded and exercised.
+pipeline = Pipeline(
+    llm=run_llama,
+    llm_stream=stream_llama,
+    max_input_length=config.L3_MAX_INPUT_LENGTH,
+    l2_threshold=config.L2_THRESHOLD,
+    warm_up_batch_sizes=(1, config.L2_MAX_BATCH_SIZE) if config.L2_BATCHING_ENABLED else (1,),
+    stage_timing=config.STAGE_TIMING_ENABLED,
+)
+pipeline.start_warm_up()
 
 def process_via_backend(user_message: str, user_id: str) -> dict:
     """
-    Orchestrates the 6-layer defense pipeline
+    Orchestrates the 6-layer defense pipeline (delegates to the shared Pipeline)
     """
-    logs = []
-    
-    # Track layer results for frontend
-    layers = {
-        'layer1': {'passed': False, 'message': '', 'details': {}},
-        'layer2': {'passed': False, 'message': '', 'details': {}},
-        'layer3': {'passed': False, 'message': '', 'details': {}},
-        'layer4': {'passed': False, 'message': '', 'details': {}},
-        'layer5': {'passed': False, 'message': '', 'details': {}},
-        'layer6': {'passed': False, 'message': '', 'details': {}}
-    }
-    
-    def log_msg(level, message):
-        """Helper to add logs for frontend display"""
-        timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-        logs.append({
-            'timestamp': timestamp,
-            'level': level,
-            'message': message
-        })
-        # Intentionally do NOT immediately emit to the global logger.
-        # We buffer log entries so we can present a clean, ordered
-        # Layer 1→6 summary in the terminal at the end of processing.
-        return
-    
-    # Initialize State-full Layers
-    layer1 = InversionFilter()
-    layer3 = MathematicalArmor(max_input_length=2000)
-    
-    log_msg('SYSTEM', '=== PROCESSING STARTED ===')
-    
-    transaction_log = {
-        "user_id": user_id,
-        "raw_input": user_message,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # --- LAYER 5: Enforce Playbook FIRST ---
-    log_msg('PROCESS', 'Layer 5: Checking user playbook...')
-    try:
-        block_msg = enforce_playbook(user_id)
-        if block_msg:
-            log_msg('DANGER', f'Layer 5 BLOCKED: {block_msg}')
-            status = get_user_status(user_id)
-            log_msg('WARNING', f'User Status: {status["status"]} | Score: {status["score"]}')
-            transaction_log["was_blocked"] = True
-            record_transaction(transaction_log)
-            layers['layer5']['passed'] = False
-            layers['layer5']['message'] = block_msg
-            return {'final_output': block_msg, 'was_blocked': True, 'severity': 'BLOCKED', 'logs': logs, 'layers': layers}
-    except Exception as e:
-        log_msg('ERROR', f'Layer 5 check failed: {str(e)}')
-
-    log_msg('SUCCESS', 'Layer 5: Playbook check passed')
-    layers['layer5']['passed'] = True
-    layers['layer5']['message'] = 'Playbook check passed'
-    
-    # --- LAYER 1: Inversion Pre-Filter ---
-    log_msg('PROCESS', 'Layer 1: Analyzing input structure...')
-    l1_result = layer1.sanitize(user_message)
-    sanitized_input = l1_result["sanitized_text"]
-    l1_flags = l1_result["flags"]
-    
-    if l1_flags:
-        log_msg('WARNING', f'Layer 1: Suspicious patterns detected → {l1_flags}')
-        update_user_score(user_id, "probe")
-        layers['layer1']['passed'] = True
-        layers['layer1']['message'] = f'Suspicious patterns detected: {l1_flags}'
-        layers['layer1']['details'] = {'flags': l1_flags}
-    else:
-        log_msg('SUCCESS', 'Layer 1: No structural issues detected')
-        layers['layer1']['passed'] = True
-        layers['layer1']['message'] = 'No structural issues detected'
-    
-    # --- LAYER 2: Intent-State Analyzer ---
-    log_msg('PROCESS', 'Layer 2: Analyzing intent...')
-    # Assuming detect_intent returns a dict with 'score' and 'is_malicious'
-    l2_result = detect_intent(sanitized_input, threshold=0.95)
-    
-    if l2_result.get("is_malicious"):
-        log_msg('DANGER', f'Layer 2 BLOCKED: Malicious intent detected! Score: {l2_result["score"]:.4f}')
-        update_user_score(user_id, "breach")
-        transaction_log["was_blocked"] = True
-        record_transaction(transaction_log)
-        layers['layer2']['passed'] = False
-        layers['layer2']['message'] = f'Malicious intent detected (Score: {l2_result["score"]:.4f})'
-        layers['layer2']['details'] = {'score': l2_result["score"]}
-        return {'final_output': 'Request blocked: Malicious intent detected', 'was_blocked': True, 'severity': 'BLOCKED', 'logs': logs, 'layers': layers}
-    
-    log_msg('SUCCESS', f'Layer 2: Safe intent detected (Score: {l2_result["score"]:.4f})')
-    layers['layer2']['passed'] = True
-    layers['layer2']['message'] = f'Safe intent detected (Score: {l2_result["score"]:.4f})'
-    layers['layer2']['details'] = {'score': l2_result["score"]}
-    
-    # Determine Severity
-    severity = "SAFE"
-    if l2_result["score"] > 0.8: severity = "ATTACK"
-    elif l2_result["score"] > 0.5 or l1_flags: severity = "SUSPICIOUS"
-    
-    # --- LAYER 3: Mathematical Armor ---
-    log_msg('PROCESS', f'Layer 3: Applying {severity} armoring...')
-    armor_result = layer3.armor(sanitized_input, severity=severity)
-    
-    if not armor_result["is_armored"]:
-        log_msg('DANGER', 'Layer 3 BLOCKED: Armoring failed')
-        layers['layer3']['passed'] = False
-        layers['layer3']['message'] = 'Armoring failed'
-        return {'final_output': 'Request blocked: Armoring failed', 'was_blocked': True, 'severity': 'BLOCKED', 'logs': logs, 'layers': layers}
-    
-    system_message = armor_result["system_message"]
-    armored_user_message = armor_result["user_message"]
-    log_msg('SUCCESS', f'Layer 3: {severity} armoring applied')
-    layers['layer3']['passed'] = True
-    layers['layer3']['message'] = f'{severity} armoring applied'
-    layers['layer3']['details'] = {'severity': severity, 'token': armor_result.get('token', 'N/A')}
-    
-    # --- LLM INFERENCE ---
-    log_msg('INFO', 'Sending to LLM...')
-    raw_response = run_llama(system_message, armored_user_message)
-    log_msg('SUCCESS', 'LLM response received')
-    
-    # --- LAYER 4: Output Filtering ---
-    log_msg('PROCESS', 'Layer 4: Filtering output...')
-    filter_result = filter_output(raw_response)
-    
-    final_output = raw_response
-    was_blocked = False
-    
-    if not filter_result["safe"]:
-        log_msg('WARNING', f'Layer 4: Content issues detected → {filter_result["issues"]}')
-        final_output = "I cannot fulfill that request due to safety policies." # Sanitized Output
-        update_user_score(user_id, "breach")
-        was_blocked = True
-        layers['layer4']['passed'] = False
-        layers['layer4']['message'] = f'Content issues detected: {filter_result["issues"]}'
-        layers['layer4']['details'] = {'issues': filter_result["issues"]}
-    else:
-        log_msg('SUCCESS', 'Layer 4: Output verified safe')
-        update_user_score(user_id, "normal")
-        layers['layer4']['passed'] = True
-        layers['layer4']['message'] = 'Output verified safe'
-
-    # --- LAYER 6: Record Transaction ---
-    transaction_log.update({
-        "final_output": final_output,
-        "was_blocked": was_blocked,
-        "severity": severity
-    })
-    record_transaction(transaction_log)
-    layers['layer6']['passed'] = True
-    layers['layer6']['message'] = 'Transaction recorded'
-    
-    log_msg('SUCCESS', '=== PROCESSING COMPLETE ===')
-    # Print an ordered summary to the terminal (Layer 1 → Layer 6)
-    ordered_keys = ['layer1', 'layer2', 'layer3', 'layer4', 'layer5', 'layer6']
-    logger.info('Layer summary (display order: 1 → 6)')
-    for idx, k in enumerate(ordered_keys, start=1):
-        layer_info = layers.get(k, {})
-        status_text = 'PASSED' if layer_info.get('passed') else 'FAILED/NA'
-        message = layer_info.get('message', '')
-        summary_msg = f'Layer {idx} ({k}): {status_text}' + (f' - {message}' if message else '')
-        logger.info(summary_msg)
+    return pipeline.process(user_message, user_id)
 
-    return {
-        'final_output': final_output,
-        'was_blocked': was_blocked,
-        'severity': severity,
-        'logs': logs,
-        'layers': layers
-    }
 
 # ========================
 # FRONTEND ROUTES
@@ -275,6 +138,52 @@ def serve_static(filename):
 # API ENDPOINTS
 # ========================
 
+def remember_conversation(user_message: str, user_id: str) -> None:
+    # Update history
+    conversation_entry = {
+        'preview': user_message[:50],
+        'timestamp': datetime.now().isoformat(),
+        'user_id': user_id
+    }
+    recent_conversations.insert(0, conversation_entry)
+    if len(recent_conversations) > 5: recent_conversations.pop()
+
+def build_response_payload(result: dict) -> dict:
+    """JSON body returned to the frontend for a processed message"""
+    payload = {
+        'success': not result.get('was_blocked', False),
+        'message': result.get('final_output', 'Error generating response'),
+        'severity': result.get('severity', 'UNKNOWN'),
+        'logs': result.get('logs', []),
+        'layers': result.get('layers', {})
+    }
+    if 'stream' in result:
+        payload['stream'] = result['stream']
+    return payload
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_events(user_message: str, user_id: str) -> Iterator[str]:
+    """
+    Server-Sent Events for streaming mode:
+        event: token  → {"text": "..."}        (already cleared by Layer 4)
+        event: abort  → {"issues": [...]}      (generation stopped by Layer 4)
+        event: result → same JSON as the non-streaming response
+    """
+    try:
+        for event, data in pipeline.process_stream(user_message, user_id):
+            if event == 'token':
+                yield format_sse('token', {'text': data})
+            elif event == 'abort':
+                yield format_sse('abort', {'issues': data})
+            else:
+                remember_conversation(user_message, user_id)
+                yield format_sse('result', build_response_payload(data))
+    except Exception as e:
+        logger.error(f"Stream Error: {str(e)}", exc_info=True)
+        yield format_sse('error', {'success': False, 'error': str(e)})
+
 @app.route('/api/process', methods=['POST'])
 def process_endpoint():
     try:
@@ -284,41 +193,142 @@ def process_endpoint():
         
         if not user_message:
             return jsonify({'success': False, 'error': 'Empty message'}), 400
+
+        # Streaming mode: {"stream": true} in the body or ?stream=1
+        if data.get('stream') or request.args.get('stream') in ('1', 'true'):
+            return Response(
+                stream_with_context(_stream_events(user_message, user_id)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
         
         result = process_via_backend(user_message, user_id)
+        remember_conversation(user_message, user_id)
         
-        # Update history
-        conversation_entry = {
-            'preview': user_message[:50],
-            'timestamp': datetime.now().isoformat(),
-            'user_id': user_id
-        }
-        recent_conversations.insert(0, conversation_entry)
-        if len(recent_conversations) > 5: recent_conversations.pop()
-        
-        return jsonify({
-            'success': not result.get('was_blocked', False),
-            'message': result.get('final_output', 'Error generating response'),
-            'severity': result.get('severity', 'UNKNOWN'),
-            'logs': result.get('logs', []),
-            'layers': result.get('layers', {})
-        })
+        return jsonify(build_response_payload(result))
     
     except Exception as e:
         logger.error(f"Endpoint Error: {str(e)}", exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def parse_screen_request(data: Optional[dict]) -> Tuple[Optional[List[str]], Optional[str], int]:
+    """Validate a /api/screen/batch body → (prompts, error, http_code)"""
+    prompts = (data or {}).get('prompts')
+    if not isinstance(prompts, list) or not prompts:
+        return None, "'prompts' must be a non-empty list of strings", 400
+    if len(prompts) > config.SCREEN_MAX_ITEMS:
+        return None, f'Too many prompts (max {config.SCREEN_MAX_ITEMS} per call)', 413
+    if not all(isinstance(p, str) for p in prompts):
+        return None, 'Every prompt must be a string', 400
+    # Same bound as chat input: Layer 2 scores every window up to it
+    too_long = [i for i, p in enumerate(prompts) if len(p) > config.L3_MAX_INPUT_LENGTH]
+    if too_long:
+        return None, (f'{len(too_long)} prompt(s) longer than {config.L3_MAX_INPUT_LENGTH} characters '
+                      f'(first at index {too_long[0]})'), 413
+    return prompts, None, 200
+
+def screening_summary(count: int, flagged: int, elapsed: float) -> dict:
+    """Per-batch throughput numbers returned with every screening call"""
+    return {
+        'count': count,
+        'flagged': flagged,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'prompts_per_second': round(count / elapsed, 1) if elapsed > 0 else None,
+        'batch_size': config.SCREEN_BATCH_SIZE
+    }
+
+def _screen_ndjson(prompts: List[str]) -> Iterator[str]:
+    """One JSON line per prompt as each chunk finishes, then a summary line"""
+    start = time.perf_counter()
+    flagged = 0
+    try:
+        for chunk in pipeline.screen_batch(prompts, batch_size=config.SCREEN_BATCH_SIZE):
+            flagged += sum(1 for item in chunk if item['is_malicious'])
+            yield ''.join(json.dumps(item) + '\n' for item in chunk)
+        yield json.dumps({'summary': screening_summary(len(prompts), flagged, time.perf_counter() - start)}) + '\n'
+    except Exception as e:
+        logger.error(f"Screening Stream Error: {str(e)}", exc_info=True)
+        yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+
+@app.route('/api/screen/batch', methods=['POST'])
+def screen_batch_endpoint():
+    """
+    Bulk screening with Layers 1-2 only (no LLM, no user profile updates).
+    Body: {"prompts": [...], "stream": optional bool}
+    Large batches (or stream=true) are returned as NDJSON lines.
+    """
+    try:
+        data = request.get_json(silent=True)
+        prompts, error, code = parse_screen_request(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), code
+
+        if data.get('stream', len(prompts) > config.SCREEN_STREAM_THRESHOLD):
+            return Response(stream_with_context(_screen_ndjson(prompts)), mimetype='application/x-ndjson')
+
+        start = time.perf_counter()
+        results = [item for chunk in pipeline.screen_batch(prompts, batch_size=config.SCREEN_BATCH_SIZE) for item in chunk]
+        flagged = sum(1 for item in results if item['is_malicious'])
+        return jsonify({
+            'success': True,
+            'results': results,
+            'summary': screening_summary(len(results), flagged, time.perf_counter() - start)
+        })
+
+    except Exception as e:
+        logger.error(f"Screening Error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/conversations', methods=['GET'])
 def get_conversations():
     return jsonify({'success': True, 'conversations': recent_conversations})
 
+def server_status() -> tuple:
+    """Status body and HTTP code; 503 until the pipeline is warm"""
+    # Load balancers should only route to workers whose pipeline is warm
+    if not pipeline.ready:
+        pipeline.start_warm_up()  # No-op while a warm-up is running
+    pipeline_status = pipeline.status()
+    ready = pipeline_status['ready']
+    if ready:
+        status = 'Server is running'
+    elif pipeline_status['error']:
+        status = f"Warm-up failed, retrying: {pipeline_status['error']}"
+    else:
+        status = 'Warming up'
+    return {
+        'success': ready,
+        'status': status,
+        'layers': 'Active' if ready else 'Loading',
+        'pipeline': pipeline_status,
+        'layer2_batching': batching_stats(),
+        'layer2_cache': cache_stats(),
+        'layer2_cascade': cascade_stats(),
+        'layer2_allowlist': allowlist_stats(),
+        'layer2_signatures': signature_stats(),
+        'llm_backend': llm_backend.stats(),
+        'stage_latency': pipeline.stage_latency.summary() if pipeline.stage_latency else None
+    }, 200 if ready else 503
+
 @app.route('/api/status', methods=['GET'])
 def get_server_status():
-    return jsonify({
-        'success': True,
-        'status': 'Server is running',
-        'layers': 'Active'
-    })
+    body, code = server_status()
+    return jsonify(body), code
+
+def prometheus_metrics() -> str:
+    """Stage latency histograms in Prometheus text format (empty when timing is off)"""
+    return pipeline.stage_latency.prometheus() if pipeline.stage_latency else ''
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@app.route('/metrics', methods=['GET'])
+def get_prometheus_metrics():
+    return Response(prometheus_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    # Live Layer 6 counters of this worker: constant time, safe to poll
+    return jsonify({'success': True, 'metrics': metrics_snapshot()})
 
 if __name__ == '__main__':
     logger.info("🔥 PromptGuard API Gateway Starting...")
@@ -0,0 +1,379 @@
+# async_api.py - asyncio Frontend Gateway (Quart)
+# Same routes and response JSON as api.py, but each request awaits the LLM
+# instead of holding a thread for up to the full LLM timeout. CPU-bound
+# layers run on a bounded worker pool with explicit backpressure.
+#
+# Run with:  hypercorn async_api:app --bind 0.0.0.0:5000
+#       or:  python async_api.py
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from quart import Quart, Response, request, jsonify, send_file
+
+import config
+
+# The Flask gateway owns the shared pipeline, LLM backend and helpers;
+# importing it builds them once (and starts the pipeline warm-up).
+from api import (
+    pipeline,
+    llm_backend,
+    recent_conversations,
+    remember_conversation,
+    build_response_payload,
+    format_sse,
+    server_status,
+    prometheus_metrics,
+    PROMETHEUS_CONTENT_TYPE,
+    parse_screen_request,
+    screening_summary,
+)
+from layer4 import StreamingOutputFilter
+from pipeline import stream_summary
+from layer6 import metrics_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when the gateway has no room to accept more work."""
+
+
+class CpuOffloader:
+    """
+    Bounded thread pool for the CPU-bound layers.
+
+    At most `max_workers` jobs run at once and `max_pending` more may wait;
+    beyond that run() fails fast with Overloaded instead of queueing
+    without limit. Jobs submitted with shed=False (work for requests that
+    were already admitted) are never rejected.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="promptguard-cpu")
+        self._outstanding = 0  # only touched from the event loop thread
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args, shed: bool = True) -> Any:
+        if shed and self._outstanding >= self.max_workers + self.max_pending:
+            self.rejected += 1
+            raise Overloaded("CPU worker pool is full")
+
+        self._outstanding += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+        finally:
+            self._outstanding -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "outstanding": self._outstanding,
+            "rejected": self.rejected,
+        }
+
+
+class AsyncGateway:
+    """
+    Async orchestration around the shared Pipeline:
+    ingress (Layers 5,1,2,3) on the CPU pool → awaited LLM → egress
+    (Layers 4,6) on the CPU pool.
+    """
+
+    def __init__(self, pipeline, llm_backend, cpu: CpuOffloader, max_inflight: int):
+        self.pipeline = pipeline
+        self.llm_backend = llm_backend
+        self.cpu = cpu
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+
+    def admit(self) -> None:
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            raise Overloaded("Too many requests in flight")
+        self.inflight += 1
+
+    def release(self) -> None:
+        self.inflight -= 1
+
+    async def ingress(self, user_message: str, user_id: str):
+        return await self.cpu.run(self.pipeline.ingress, user_message, user_id)
+
+    async def process(self, user_message: str, user_id: str) -> dict:
+        ctx = await self.ingress(user_message, user_id)
+        if ctx.result is not None:
+            return ctx.result
+
+        # --- LLM INFERENCE (awaited, no thread held) ---
+        ctx.log_msg('INFO', 'Sending to LLM...')
+        t = time.perf_counter_ns()
+        raw_response = await self.llm_backend.agenerate(ctx.system_message, ctx.armored_user_message)
+        ctx.timed('llm', t)
+        ctx.log_msg('SUCCESS', 'LLM response received')
+
+        return await self.cpu.run(self.pipeline.egress, ctx, raw_response, shed=False)
+
+    async def stream(self, ctx) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Async twin of Pipeline.process_stream for a context that already
+        passed ingress. Per-chunk Layer 4 scans are bounded by the filter
+        window, so they run inline on the loop; the final egress uses the pool.
+        """
+        if ctx.result is not None:
+            yield ("result", ctx.result)
+            return
+
+        ctx.log_msg('INFO', 'Streaming from LLM...')
+        stream_filter = StreamingOutputFilter()
+        parts: List[str] = []
+        started = time.perf_counter()
+        llm_started = time.perf_counter_ns()
+        first_token_at: Optional[float] = None
+        aborted_at: Optional[float] = None
+
+        chunks = self.llm_backend.astream(ctx.system_message, ctx.armored_user_message)
+        egress_job: Optional[asyncio.Task] = None
+        try:
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    released = stream_filter.feed(chunk)
+                    if stream_filter.blocked:
+                        aborted_at = time.perf_counter()
+                        break
+                    if released:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield ("token", released)
+                else:
+                    released = stream_filter.finish()
+                    if released:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield ("token", released)
+            finally:
+                # Closing the stream stops generation on the LLM side
+                await chunks.aclose()
+                ctx.timed('llm', llm_started)
+
+            # As in Pipeline.process_stream: penalty and record before the abort event
+            if aborted_at is not None:
+                ctx.log_msg('WARNING', 'LLM generation stopped early by Layer 4')
+            else:
+                ctx.log_msg('SUCCESS', 'LLM response received')
+            # Shielded so a cancellation here leaves the submitted egress to finish
+            egress_job = asyncio.ensure_future(self.cpu.run(
+                self.pipeline.egress, ctx, "".join(parts), stream_filter.result(), shed=False
+            ))
+            result = await asyncio.shield(egress_job)
+        except (GeneratorExit, asyncio.CancelledError):
+            # Disconnected or cancelled before egress was submitted: run it
+            # inline (no awaiting in a closing generator). It is only the
+            # Layer 5 update and the Layer 6 record; the verdict is known.
+            if egress_job is None:
+                ctx.log_msg('WARNING', 'Client disconnected during streaming')
+                self.pipeline.egress(ctx, "".join(parts), filter_result=stream_filter.result())
+            raise
+
+        result['stream'] = stream_summary(started, first_token_at, aborted_at)
+        if aborted_at is not None:
+            yield ("abort", stream_filter.issues)
+        yield ("result", result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "rejected": self.rejected,
+            "cpu_pool": self.cpu.stats(),
+        }
+
+
+# Initialize Quart app
+app = Quart(__name__)
+
+gateway = AsyncGateway(
+    pipeline,
+    llm_backend,
+    CpuOffloader(max_workers=config.ASYNC_CPU_WORKERS, max_pending=config.ASYNC_MAX_PENDING),
+    max_inflight=config.ASYNC_MAX_INFLIGHT,
+)
+
+
+@app.after_request
+async def add_cors_headers(response):
+    # Same permissive policy as flask_cors.CORS(app) in api.py
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+
+def _busy_response(e: Overloaded):
+    return jsonify({'success': False, 'error': f'Server busy: {e}'}), 503, {'Retry-After': '1'}
+
+# ========================
+# FRONTEND ROUTES
+# ========================
+
+@app.route('/')
+async def serve_index():
+    return await send_file('frontend/index.html')
+
+@app.route('/chat.html')
+async def serve_chat():
+    return await send_file('frontend/chat.html')
+
+@app.route('/<path:filename>')
+async def serve_static(filename):
+    filepath = os.path.join('frontend', filename)
+    if os.path.isfile(filepath):
+        return await send_file(filepath)
+    return jsonify({'error': f'File not found: {filename}'}), 404
+
+# ========================
+# API ENDPOINTS
+# ========================
+
+@app.route('/api/process', methods=['POST'])
+async def process_endpoint():
+    try:
+        data = await request.get_json()
+        user_message = data.get('message', '').strip()
+        user_id = data.get('user_id', 'demo_user_01')
+
+        if not user_message:
+            return jsonify({'success': False, 'error': 'Empty message'}), 400
+
+        gateway.admit()
+    except Overloaded as e:
+        return _busy_response(e)
+    except Exception as e:
+        logger.error(f"Endpoint Error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    streaming = bool(data.get('stream')) or request.args.get('stream') in ('1', 'true')
+    handed_off = False  # the SSE generator releases the slot once it finishes
+    try:
+        if streaming:
+            # Ingress runs before the response starts, so overload still maps to 503
+            ctx = await gateway.ingress(user_message, user_id)
+            handed_off = True
+        else:
+            result = await gateway.process(user_message, user_id)
+            remember_conversation(user_message, user_id)
+            return jsonify(build_response_payload(result))
+    except Overloaded as e:
+        return _busy_response(e)
+    except Exception as e:
+        logger.error(f"Endpoint Error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if not handed_off:
+            gateway.release()
+
+    async def events():
+        try:
+            async for event, payload in gateway.stream(ctx):
+                if event == 'token':
+                    yield format_sse('token', {'text': payload})
+                elif event == 'abort':
+                    yield format_sse('abort', {'issues': payload})
+                else:
+                    remember_conversation(user_message, user_id)
+                    yield format_sse('result', build_response_payload(payload))
+        except Exception as e:
+            logger.error(f"Stream Error: {str(e)}", exc_info=True)
+            yield format_sse('error', {'success': False, 'error': str(e)})
+        finally:
+            gateway.release()
+
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/screen/batch', methods=['POST'])
+async def screen_batch_endpoint():
+    data = await request.get_json(silent=True)
+    prompts, error, code = parse_screen_request(data)
+    if error:
+        return jsonify({'success': False, 'error': error}), code
+
+    # Pull one chunk at a time through the CPU pool
+    chunks = pipeline.screen_batch(prompts, batch_size=config.SCREEN_BATCH_SIZE)
+    next_chunk = functools.partial(next, chunks, None)
+
+    try:
+        gateway.admit()
+    except Overloaded as e:
+        return _busy_response(e)
+
+    if data.get('stream', len(prompts) > config.SCREEN_STREAM_THRESHOLD):
+        async def lines():
+            start = time.perf_counter()
+            flagged = 0
+            try:
+                while (chunk := await gateway.cpu.run(next_chunk, shed=False)) is not None:
+                    flagged += sum(1 for item in chunk if item['is_malicious'])
+                    yield ''.join(json.dumps(item) + '\n' for item in chunk)
+                yield json.dumps({'summary': screening_summary(len(prompts), flagged, time.perf_counter() - start)}) + '\n'
+            except Exception as e:
+                logger.error(f"Screening Stream Error: {str(e)}", exc_info=True)
+                yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+            finally:
+                gateway.release()
+
+        return Response(lines(), mimetype='application/x-ndjson')
+
+    try:
+        start = time.perf_counter()
+        results = []
+        # Only the first chunk may be shed; after that the batch is admitted
+        while (chunk := await gateway.cpu.run(next_chunk, shed=not results)) is not None:
+            results.extend(chunk)
+        flagged = sum(1 for item in results if item['is_malicious'])
+        return jsonify({
+            'success': True,
+            'results': results,
+            'summary': screening_summary(len(results), flagged, time.perf_counter() - start)
+        })
+    except Overloaded as e:
+        return _busy_response(e)
+    except Exception as e:
+        logger.error(f"Screening Error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        gateway.release()
+
+@app.route('/api/conversations', methods=['GET'])
+async def get_conversations():
+    return jsonify({'success': True, 'conversations': recent_conversations})
+
+@app.route('/api/status', methods=['GET'])
+async def get_server_status():
+    body, code = server_status()
+    body['gateway'] = gateway.stats()
+    return jsonify(body), code
+
+@app.route('/metrics', methods=['GET'])
+async def get_prometheus_metrics():
+    return Response(prometheus_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/metrics', methods=['GET'])
+async def get_metrics():
+    return jsonify({'success': True, 'metrics': metrics_snapshot()})
+
+if __name__ == '__main__':
+    logger.info("🔥 PromptGuard async API Gateway Starting...")
+    app.run(host='0.0.0.0', port=5000)
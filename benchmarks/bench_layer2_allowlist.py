@@ -0,0 +1,112 @@
+# benchmarks/bench_layer2_allowlist.py
+"""
+Layer 2 safe-prompt allowlist: query latency, reload cost and hit quality.
+
+Copies data/safe_prompts.db to a temporary file and pads it to each --sizes
+entry count with synthetic prompts built from the benign rows of
+data/intent_dataset.csv, then reports per size:
+
+  - full load time, and the incremental reload time for --add new rows
+  - match() latency (p50/p99, microseconds) for near-duplicates of the
+    curated prompts (re-cased, one word added) and for attack prompts,
+    and the share of near-duplicates found
+  - how many attack prompts of the dataset the allowlist would match
+    (should stay at 0; raise --min-similarity if not)
+
+Run from the repository root:
+    python -m benchmarks.bench_layer2_allowlist [--sizes 15,1000,100000] [--min-similarity 0.7]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.datasets import load_intent_dataset
+from layer2.allowlist import SAFE_PROMPTS_DB, SafePromptAllowlist
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _variant(text: str, rng: random.Random) -> str:
+    """`text` re-cased, with a word added at either end: a typical near-duplicate."""
+    word = rng.choice(("please", "quickly", "again", "now"))
+    text = text.lower() if rng.random() < 0.5 else text
+    return f"{text} {word}?" if rng.random() < 0.5 else f"{word.capitalize()}, {text}"
+
+
+def _latencies_us(allowlist: SafePromptAllowlist, queries):
+    out, hits = [], 0
+    for text in queries:
+        t = time.perf_counter()
+        hits += allowlist.match(text) is not None
+        out.append((time.perf_counter() - t) * 1e6)
+    return sorted(out), hits
+
+
+def _pad(db_path: str, benign, count: int, rng: random.Random) -> None:
+    conn = sqlite3.connect(db_path)
+    rows = [(" ".join(rng.sample(benign, 2)), "synthetic", "benchmark") for _ in range(count)]
+    conn.executemany("INSERT INTO safe_prompts (text, category, source) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="15,1000,100000", help="comma-separated entry counts")
+    parser.add_argument("--add", type=int, default=100, help="rows added before the incremental reload")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--min-similarity", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    dataset = load_intent_dataset()
+    benign = [text for text, label in dataset if label != "ATTACK"]
+    attacks = [text for text, label in dataset if label == "ATTACK"]
+    conn = sqlite3.connect(f"file:{SAFE_PROMPTS_DB}?mode=ro", uri=True)
+    curated = [row[0] for row in conn.execute("SELECT text FROM safe_prompts")]
+    conn.close()
+
+    near = [_variant(rng.choice(curated), rng) for _ in range(args.queries)]
+    misses = rng.sample(attacks, min(args.queries, len(attacks)))
+
+    print(f"{'entries':>8} | {'load s':>7} {'+' + str(args.add) + ' s':>8} | {'hit p50':>8} {'p99':>8} {'found':>6} | "
+          f"{'miss p50':>8} {'p99':>8} | attacks matched")
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "safe_prompts.db")
+        shutil.copy(SAFE_PROMPTS_DB, db_path)
+        entries = len(curated)
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            if size > entries:
+                _pad(db_path, benign, size - entries, rng)
+                entries = size
+
+            start = time.perf_counter()
+            allowlist = SafePromptAllowlist(db_path, min_similarity=args.min_similarity, reload_interval_seconds=None)
+            load_s = time.perf_counter() - start
+            _pad(db_path, benign, args.add, rng)
+            entries += args.add
+            start = time.perf_counter()
+            allowlist.reload()
+            reload_s = time.perf_counter() - start
+
+            hit_us, found = _latencies_us(allowlist, near)
+            miss_us, _ = _latencies_us(allowlist, misses)
+            matched = sum(allowlist.match(text) is not None for text in attacks)
+            print(f"{len(allowlist):>8} | {load_s:>7.2f} {reload_s:>8.3f} | {_percentile(hit_us, 50):>8.1f} "
+                  f"{_percentile(hit_us, 99):>8.1f} {found / len(near):>6.1%} | {_percentile(miss_us, 50):>8.1f} "
+                  f"{_percentile(miss_us, 99):>8.1f} | {matched} of {len(attacks)}")
+            allowlist.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_layer2_padding.py
+"""
+Layer 2 padding benchmark: fixed 512-token padding vs length buckets.
+
+For every length bucket, times single-prompt inference with both padding
+strategies on real prompts from data/intent_dataset.csv and checks that the
+bucketed scores match the padded path.
+
+Run from the repository root:
+    python -m benchmarks.bench_layer2_padding [--per-bucket 20]
+"""
+import argparse
+import time
+from typing import Dict, List
+
+from benchmarks.datasets import load_intent_dataset
+from layer2.intent_detector import IntentStateAnalyzer
+
+SCORE_TOLERANCE = 1e-3
+
+
+def _pick_prompts(analyzer: IntentStateAnalyzer, per_bucket: int) -> Dict[int, List[str]]:
+    picked: Dict[int, List[str]] = {b: [] for b in analyzer.LENGTH_BUCKETS}
+    for text, _ in load_intent_dataset():
+        n_tokens = len(analyzer.tokenizer(text, truncation=True, max_length=analyzer.MAX_LENGTH)["input_ids"])
+        bucket = analyzer.bucket_for(n_tokens)
+        if len(picked[bucket]) < per_bucket:
+            picked[bucket].append(text)
+        if all(len(v) >= per_bucket for v in picked.values()):
+            break
+    # Long buckets are rare in the dataset; synthesize by repetition
+    for bucket, prompts in picked.items():
+        seed = "could I check if there is anything new on my refund? "
+        while len(prompts) < per_bucket:
+            prompts.append(seed * max(1, bucket // 14))
+    return picked
+
+
+def _time_strategy(analyzer: IntentStateAnalyzer, strategy: str, prompts: List[str]):
+    analyzer.padding_strategy = strategy
+    analyzer.score_batch(prompts[:1])  # warm-up
+    scores, elapsed = [], []
+    for prompt in prompts:
+        start = time.perf_counter()
+        scores.append(analyzer.score_batch([prompt])[0])
+        elapsed.append((time.perf_counter() - start) * 1000)
+    elapsed.sort()
+    return scores, elapsed[len(elapsed) // 2], sum(elapsed) / len(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-bucket", type=int, default=20, help="prompts timed per length bucket")
+    args = parser.parse_args()
+
+    analyzer = IntentStateAnalyzer()
+    picked = _pick_prompts(analyzer, args.per_bucket)
+
+    print(f"{'bucket':>6} | {'padded p50':>10} | {'bucket p50':>10} | {'speedup':>7} | {'max |Δscore|':>12}")
+    print("-" * 60)
+    worst = 0.0
+    for bucket, prompts in picked.items():
+        padded_scores, padded_p50, _ = _time_strategy(analyzer, "max_length", prompts)
+        bucket_scores, bucket_p50, _ = _time_strategy(analyzer, "bucket", prompts)
+        diff = max(abs(a - b) for a, b in zip(padded_scores, bucket_scores))
+        worst = max(worst, diff)
+        print(f"{bucket:>6} | {padded_p50:>8.2f}ms | {bucket_p50:>8.2f}ms | "
+              f"{padded_p50 / bucket_p50:>6.1f}x | {diff:>12.2e}")
+
+    analyzer.padding_strategy = "bucket"
+    status = "OK" if worst <= SCORE_TOLERANCE else "MISMATCH"
+    print(f"\nScores vs padded path: max |Δ| = {worst:.2e} (tolerance {SCORE_TOLERANCE}) → {status}")
+    if worst > SCORE_TOLERANCE:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_layer2_signatures.py
+"""
+Layer 2 attack signature index: build cost, query latency and accuracy at
+the bundled dataset size and at --scale times that.
+
+The index holds the persuasive prompts of
+data/adversarial_dataset_with_techniques.csv and the ATTACK rows of
+data/intent_dataset.csv. The scaled index adds (--scale - 1) perturbed
+copies of every attack (--edit of the words replaced), standing in for a
+larger attack corpus. Per size it reports:
+
+  - build time, signatures and stored non-zeros
+  - match() latency (p50/p99, microseconds) for perturbed attacks and for
+    benign prompts, and match_batch() cost per prompt at --batch-size
+  - perturbed attacks blocked (recall of the short-circuit), benign prompts
+    (SAFE rows of intent_dataset.csv, the adversarial dataset's own benign
+    queries) blocked and tagged
+
+Run from the repository root:
+    python -m benchmarks.bench_layer2_signatures [--scale 10] [--queries 1000] [--block 0.6]
+"""
+import argparse
+import random
+import time
+from typing import List
+
+from benchmarks.datasets import load_adversarial_queries, load_intent_dataset
+from layer2.signatures import AttackSignatureIndex, SignatureRow, load_signature_rows
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def perturb(text: str, edit: float, rng: random.Random) -> str:
+    """`text` with a fraction `edit` of its words replaced by other words of it."""
+    words = text.split()
+    for _ in range(max(1, int(len(words) * edit))):
+        words[rng.randrange(len(words))] = rng.choice(words)
+    return " ".join(words)
+
+
+def _latencies_us(index: AttackSignatureIndex, texts: List[str]) -> List[float]:
+    out = []
+    for text in texts:
+        t = time.perf_counter()
+        index.match(text)
+        out.append((time.perf_counter() - t) * 1e6)
+    return sorted(out)
+
+
+def bench(rows: List[SignatureRow], attacks: List[str], benign: List[str],
+          block: float, tag: float, batch_size: int) -> None:
+    start = time.perf_counter()
+    index = AttackSignatureIndex(rows, block_similarity=block, tag_similarity=tag)
+    build_s = time.perf_counter() - start
+
+    attack_us = _latencies_us(index, attacks)
+    benign_us = _latencies_us(index, benign)
+    start = time.perf_counter()
+    for offset in range(0, len(benign), batch_size):
+        index.match_batch(benign[offset:offset + batch_size])
+    batch_us = (time.perf_counter() - start) / len(benign) * 1e6
+
+    blocked = sum(bool(m and m.blocked) for m in index.match_batch(attacks))
+    benign_matches = index.match_batch(benign)
+    false_blocks = sum(bool(m and m.blocked) for m in benign_matches)
+    tagged = sum(m is not None for m in benign_matches)
+    print(f"{len(index):>8} {build_s:>7.2f} {index.matrix.nnz:>10,} | "
+          f"{_percentile(attack_us, 50):>8.0f} {_percentile(attack_us, 99):>8.0f} | "
+          f"{_percentile(benign_us, 50):>8.0f} {_percentile(benign_us, 99):>8.0f} | {batch_us:>7.0f} | "
+          f"{blocked / len(attacks):>7.1%} | {false_blocks:>4} / {tagged:<5} of {len(benign)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=10, help="size multiplier of the scaled index")
+    parser.add_argument("--queries", type=int, default=1000, help="perturbed attacks and benign prompts each")
+    parser.add_argument("--edit", type=float, default=0.05, help="fraction of words replaced in perturbed copies")
+    parser.add_argument("--block", type=float, default=0.6, help="block_similarity")
+    parser.add_argument("--tag", type=float, default=0.4, help="tag_similarity")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = load_signature_rows()
+    attacks = [perturb(row.text, args.edit, rng) for row in rng.sample(rows, min(args.queries, len(rows)))]
+    benign = [text for text, label in load_intent_dataset() if label != "ATTACK"] + load_adversarial_queries()
+    benign = rng.sample(benign, min(args.queries, len(benign)))
+    scaled = rows + [row._replace(text=perturb(row.text, args.edit, rng)) for row in rows for _ in range(args.scale - 1)]
+
+    print(f"Block at cosine >= {args.block}, tag at >= {args.tag}; latencies in microseconds")
+    print(f"{'attacks':>8} {'build s':>7} {'non-zeros':>10} | {'atk p50':>8} {'p99':>8} | {'ben p50':>8} {'p99':>8} | "
+          f"{'batch':>7} | {'blocked':>7} | benign blocked / tagged")
+    for size_rows in (rows, scaled):
+        bench(size_rows, attacks, benign, args.block, args.tag, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_layer2_windows.py
+"""
+Layer 2 sliding-window inference on long prompts.
+
+Builds prompts of each --lengths size (characters) from a benign preamble
+(SAFE rows of data/intent_dataset.csv, concatenated) with an injection
+from the ATTACK rows appended at the end, and the same preamble alone.
+For each length it reports:
+
+  - tokens and windows per prompt
+  - latency of scoring every window, and with early exit at --threshold
+    (attack prompts usually stop after the first ONNX call, which holds
+    the head and tail windows)
+  - attacks detected when only the first 512 tokens are scored (the old
+    truncating behaviour) vs with windows, and benign prompts flagged
+
+Latency should grow linearly with the number of windows.
+
+Run from the repository root:
+    python -m benchmarks.bench_layer2_windows [--lengths 1000,4000,16000] [--per-length 20]
+"""
+import argparse
+import random
+import time
+from typing import List, Optional
+
+from benchmarks.datasets import load_intent_dataset
+from layer2.intent_detector import IntentStateAnalyzer
+
+
+def _median_ms(analyzer: IntentStateAnalyzer, prompts: List[str], stop_at: Optional[float]) -> float:
+    elapsed = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        analyzer.score_batch([prompt], stop_at=stop_at)
+        elapsed.append((time.perf_counter() - start) * 1000)
+    elapsed.sort()
+    return elapsed[len(elapsed) // 2]
+
+
+def _preamble(benign: List[str], chars: int, rng: random.Random) -> str:
+    parts, size = [], 0
+    while size < chars:
+        parts.append(rng.choice(benign))
+        size += len(parts[-1]) + 1
+    return " ".join(parts)[:chars]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="1000,2000,4000,8000,16000", help="comma-separated prompt lengths (characters)")
+    parser.add_argument("--per-length", type=int, default=20, help="attack and benign prompts per length")
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    dataset = load_intent_dataset()
+    benign = [text for text, label in dataset if label != "ATTACK"]
+    attacks = [text for text, label in dataset if label == "ATTACK"]
+
+    analyzer = IntentStateAnalyzer()
+    analyzer.warm_up()
+    tokenize = lambda text: analyzer.tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"]
+
+    print(f"{'chars':>6} {'tokens':>6} {'windows':>7} | {'all ms':>8} {'exit ms':>8} {'benign ms':>9} | "
+          f"{'first-512 hit':>13} {'window hit':>10} {'benign FP':>9}")
+    print("-" * 92)
+    for length in (int(n) for n in args.lengths.split(",")):
+        attack_prompts, benign_prompts = [], []
+        for _ in range(args.per_length):
+            injection = rng.choice(attacks)
+            attack_prompts.append(_preamble(benign, max(0, length - len(injection) - 1), rng) + " " + injection)
+            benign_prompts.append(_preamble(benign, length, rng))
+
+        tokens = sorted(len(tokenize(p)) for p in attack_prompts)[len(attack_prompts) // 2]
+        windows = len(analyzer.windows(list(range(tokens))))
+        all_ms = _median_ms(analyzer, attack_prompts, None)
+        exit_ms = _median_ms(analyzer, attack_prompts, args.threshold)
+        benign_ms = _median_ms(analyzer, benign_prompts, args.threshold)
+
+        first = analyzer._score_rows([analyzer.windows(tokenize(p))[0] for p in attack_prompts])
+        windowed = analyzer.score_batch(attack_prompts, stop_at=args.threshold)
+        flagged = analyzer.score_batch(benign_prompts, stop_at=args.threshold)
+        hit = lambda scores: sum(s > args.threshold for s in scores)
+        print(f"{length:>6} {tokens:>6} {windows:>7} | {all_ms:>8.1f} {exit_ms:>8.1f} {benign_ms:>9.1f} | "
+              f"{hit(first):>6} of {len(first):<4} {hit(windowed):>4} of {len(windowed):<3} {hit(flagged):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_layer5_limiter.py
+"""
+Layer 5 playbook checks per second on one core.
+
+1. Engine: RateLimiter.take() and ScoreDecay.value() on numeric state.
+   Both are a handful of float operations, so the rate stays flat as the
+   number of users (--users) and the event history length grow.
+2. Legacy: the old Playbook A check (datetime.fromisoformat on the stored
+   ISO last_prompt_time, then timedelta arithmetic) for comparison.
+3. End to end: UserProfiler.enforce_playbook() through a ProfileStore on a
+   temporary database, including the SQLite round trip.
+
+Run from the repository root:
+    python -m benchmarks.bench_layer5_limiter [--users 100000] [--checks 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from layer5.limiter import RateLimiter, ScoreDecay, TierLimit
+from layer5.profile_store import ProfileStore
+from layer5.user_profiler import UserProfiler
+
+
+def rate(checks: int, elapsed: float) -> str:
+    return f"{checks / elapsed:>12,.0f} checks/s  ({elapsed / checks * 1e9:,.0f} ns/check)"
+
+
+def bench_engine(users: int, checks: int) -> None:
+    limiter = RateLimiter()
+    decay = ScoreDecay()
+    limit = TierLimit.per_minute(1)
+    mono, wall = time.monotonic(), time.time()
+    buckets = [[None, None] for _ in range(users)]
+    scores = [(random.uniform(0, 40), wall - random.uniform(0, 7200)) for _ in range(users)]
+    order = [random.randrange(users) for _ in range(checks)]
+
+    start = time.perf_counter()
+    for step, i in enumerate(order):
+        bucket = buckets[i]
+        allowed, bucket[0], bucket[1], _ = limiter.take(limit, bucket[0], bucket[1], mono + step * 1e-3)
+    took = time.perf_counter() - start
+    print(f"  RateLimiter.take   : {rate(checks, took)}")
+
+    start = time.perf_counter()
+    for i in order:
+        score, stamp = scores[i]
+        decay.value(score, stamp, wall)
+    took = time.perf_counter() - start
+    print(f"  ScoreDecay.value   : {rate(checks, took)}")
+
+
+def bench_legacy(users: int, checks: int) -> None:
+    stamps = [(datetime.now() - timedelta(seconds=random.uniform(0, 120))).isoformat() for _ in range(users)]
+    order = [random.randrange(users) for _ in range(checks)]
+
+    start = time.perf_counter()
+    for i in order:
+        last_time = datetime.fromisoformat(stamps[i])
+        if datetime.now() - last_time < timedelta(minutes=1):
+            remaining = timedelta(minutes=1) - (datetime.now() - last_time)
+            int(remaining.total_seconds() // 60)
+        stamps[i] = datetime.now().isoformat()
+    took = time.perf_counter() - start
+    print(f"  ISO last_prompt    : {rate(checks, took)}")
+
+
+def bench_end_to_end(users: int, checks: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProfileStore(os.path.join(tmp, "profiles.db"))
+        profiler = UserProfiler(store=store, legacy_file=None)
+        for i in range(users):
+            if i % 2:
+                profiler.update_score(f"user-{i}", "breach")  # MEDIUM_RISK: rate limited
+        order = [f"user-{random.randrange(users)}" for _ in range(checks)]
+
+        start = time.perf_counter()
+        for user_id in order:
+            profiler.enforce_playbook(user_id)
+        took = time.perf_counter() - start
+        store.close()
+    print(f"  enforce_playbook   : {rate(checks, took)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--store-users", type=int, default=2_000, help="users for the end-to-end run")
+    parser.add_argument("--store-checks", type=int, default=20_000, help="checks for the end-to-end run")
+    args = parser.parse_args()
+
+    print(f"Engine: {args.checks:,} checks over {args.users:,} users")
+    bench_engine(args.users, args.checks)
+    bench_legacy(args.users, args.checks)
+    print(f"\nEnd to end: {args.store_checks:,} checks over {args.store_users:,} users (SQLite store)")
+    bench_end_to_end(args.store_users, args.store_checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_layer5_memory.py
+"""
+Layer 5 memory at 1M users.
+
+1. Representation: bytes per user for the old profile layout (a dict per
+   user holding a list of event dicts with ISO-string timestamps) versus
+   CompactProfile (slots + array-backed event ring), each holding
+   --events events.
+2. Hot set: streams events for --users distinct users through a
+   ProfileStore capped at --max-resident profiles and reports memory held
+   afterwards, which stays bounded by the cap rather than the user count.
+
+Run from the repository root:
+    python -m benchmarks.bench_layer5_memory [--users 1000000] [--events 3] [--max-resident 100000]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from layer5.compact_profile import CompactProfile
+from layer5.profile_store import ProfileStore
+
+EVENTS = ("probe", "breach", "normal")
+
+
+def legacy_profiles(users: int, events: int) -> dict:
+    profiles = {}
+    for i in range(users):
+        profiles[f"user-{i}"] = {
+            "score": 13,
+            "status": "MEDIUM_RISK",
+            "last_prompt_time": None,
+            "banned": False,
+            "events": [
+                {"event": EVENTS[j % 3], "time": datetime.now().isoformat(), "score": 3 * j}
+                for j in range(events)
+            ],
+        }
+    return profiles
+
+
+def compact_profiles(users: int, events: int) -> dict:
+    profiles = {}
+    now = time.time()
+    for i in range(users):
+        profile = CompactProfile(13, now, "MEDIUM_RISK")
+        for j in range(events):
+            profile.add_event(EVENTS[j % 3], now, 3 * j)
+        profiles[f"user-{i}"] = profile
+    return profiles
+
+
+def measure(build, *args) -> int:
+    gc.collect()
+    tracemalloc.start()
+    data = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    gc.collect()
+    return size
+
+
+def hot_set(users: int, max_resident: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProfileStore(os.path.join(tmp, "profiles.db"), max_resident=max_resident, max_batch=4096)
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        now = time.time()
+        for i in range(users):
+            store.append_event(f"user-{i}", "probe", now, 3)
+        store.flush()
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = store.stats()
+        store.close()
+
+    print(f"\nHot set: {users:,} users through a store capped at {max_resident:,} profiles")
+    print(f"  resident profiles : {stats['resident']:,} ({stats['evictions']:,} evicted)")
+    print(f"  events written    : {stats['events_written']:,} in {elapsed:.1f}s")
+    print(f"  memory held       : {current / 2**20:.1f} MiB (peak {peak / 2**20:.1f} MiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--events", type=int, default=3, help="events per user for the representation test")
+    parser.add_argument("--max-resident", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"Representation: {args.users:,} users x {args.events} events")
+    print(f"{'layout':>16} | {'total':>10} | {'per user':>9}")
+    print("-" * 42)
+    for name, build in (("dict + ISO", legacy_profiles), ("CompactProfile", compact_profiles)):
+        size = measure(build, args.users, args.events)
+        print(f"{name:>16} | {size / 2**20:>7.0f}MiB | {size / args.users:>7.0f} B")
+
+    hot_set(args.users, args.max_resident)
+
+
+if __name__ == "__main__":
+    main()
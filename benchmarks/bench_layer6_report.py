@@ -0,0 +1,162 @@
+# benchmarks/bench_layer6_report.py
+"""
+Layer 6 daily report cost as the forensic history grows.
+
+Builds a synthetic history of --per-day transactions per day and, at
+1, 7, 30, 90 and 365 days of history, times one day's report metrics:
+
+  - legacy: the old path (parse the whole single-file JSONL history,
+    filter every record with datetime.fromisoformat, build a DataFrame)
+  - partitioned: ForensicAnalyzer.daily_metrics(), streaming only that
+    day's partition
+
+and reports the peak memory of each. The partitioned numbers should stay
+flat while the legacy ones grow with the history.
+
+Then, for one day of --compact-day transactions, compares the streaming
+JSONL metrics with the vectorized ones over the day's compacted Parquet
+file (and the on-disk size of each). Peaks are the Python heap as seen by
+tracemalloc, which does not see Arrow's own buffers.
+
+Run from the repository root:
+    python -m benchmarks.bench_layer6_report [--per-day 1000] [--days 365] [--compact-day 200000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from layer6 import compaction
+from layer6.forensic_analysis import ForensicAnalyzer
+
+CHECKPOINTS = (1, 7, 30, 90, 365)
+START = datetime(2025, 1, 1)
+
+
+def _records(day: datetime, count: int, rng: random.Random):
+    for i in range(count):
+        suspicious = rng.random() < 0.1
+        yield json.dumps({
+            "timestamp": (day + timedelta(seconds=i * 86400 / count)).isoformat(),
+            "user_id": f"user-{rng.randrange(500)}",
+            "original_input": "Summarize the attached quarterly report in three bullet points.",
+            "layer1_flags": ["phrase_jailbreak"] if rng.random() < 0.05 else [],
+            "layer2_is_suspicious": suspicious,
+            "layer4_issues": ["SSN"] if rng.random() < 0.01 else [],
+            "was_blocked": suspicious and rng.random() < 0.9,
+            "severity": "LOW",
+        })
+
+
+def legacy_metrics(log_file: str, date: datetime) -> dict:
+    logs = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                logs.append(json.loads(line))
+    start_time = datetime.combine(date.date(), datetime.min.time())
+    end_time = start_time + timedelta(days=1)
+    daily_logs = [
+        log for log in logs
+        if start_time <= datetime.fromisoformat(log.get('timestamp', '').replace('Z', '+00:00')).replace(tzinfo=None) < end_time
+    ]
+    df = pd.DataFrame(daily_logs)
+    detected = len(df[df.get('layer2_is_suspicious', False) == True])
+    return {
+        "total_requests": len(df),
+        "detected_attacks": detected,
+        "successful_attacks": len(df[(df.get('layer2_is_suspicious', False) == True) & (df.get('was_blocked', True) == False)]),
+        "sanitizations": len(df[df['layer1_flags'].apply(lambda x: len(x or []) > 0)]),
+        "pii_prevented": len(df[df['layer4_issues'].apply(lambda x: len(x or []) > 0)]),
+    }
+
+
+def _measure(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_compaction(records: int) -> None:
+    rng = random.Random(1)
+    day = START.strftime("%Y-%m-%d")
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = ForensicAnalyzer(os.path.join(tmp, "logs"), os.path.join(tmp, "reports"),
+                                    compact_interval_seconds=None)
+        lines = _records(START, records, rng)
+        while analyzer.writer.import_lines(day, (line for _, line in zip(range(50_000), lines))):
+            pass
+        analyzer.writer.close()  # waits for the gzip of every part
+
+        def size() -> float:
+            folder = analyzer.writer.day_dir(day)
+            return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder)) / 2**20
+
+        jsonl, jsonl_time, jsonl_peak = _measure(analyzer.daily_metrics, day)
+        jsonl_size = size()
+        start = time.perf_counter()
+        compaction.compact_day(analyzer.writer, day, grace_seconds=0)
+        compact_time = time.perf_counter() - start
+        compaction.compact_day(analyzer.writer, day, grace_seconds=0)  # drops the covered parts
+        parquet, parquet_time, parquet_peak = _measure(analyzer.daily_metrics, day)
+        parquet_size = size()
+        assert jsonl == parquet, (jsonl, parquet)
+
+    print(f"\nOne day, {records:,} transactions (compaction took {compact_time:.1f}s)")
+    print(f"  JSONL (gzip) streaming : {jsonl_time * 1000:>8.1f} ms  peak {jsonl_peak / 2**20:>5.1f} MiB  "
+          f"on disk {jsonl_size:>6.1f} MiB")
+    print(f"  Parquet vectorized     : {parquet_time * 1000:>8.1f} ms  peak {parquet_peak / 2**20:>5.1f} MiB  "
+          f"on disk {parquet_size:>6.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-day", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--compact-day", type=int, default=200_000, help="transactions in the compaction day")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    print(f"{'history':>9} | {'legacy':>10} {'peak':>9} | {'partitioned':>11} {'peak':>9}")
+    print("-" * 58)
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, "legacy.jsonl")
+        analyzer = ForensicAnalyzer(os.path.join(tmp, "logs"), os.path.join(tmp, "reports"),
+                                    compact_interval_seconds=None)
+        with open(log_file, "w", encoding="utf-8") as legacy:
+            for n in range(args.days):
+                day = START + timedelta(days=n)
+                lines = list(_records(day, args.per_day, rng))
+                legacy.write("\n".join(lines) + "\n")
+                analyzer.writer.import_lines(day.strftime("%Y-%m-%d"), lines)
+                if n + 1 not in CHECKPOINTS and n + 1 != args.days:
+                    continue
+                legacy.flush()
+
+                old, old_time, old_peak = _measure(legacy_metrics, log_file, day)
+                new, new_time, new_peak = _measure(analyzer.daily_metrics, day)
+                assert all(new[key] == value for key, value in old.items()), (old, new)
+                print(f"{n + 1:>5} days | {old_time * 1000:>7.1f} ms {old_peak / 2**20:>5.1f} MiB | "
+                      f"{new_time * 1000:>8.1f} ms {new_peak / 2**20:>5.2f} MiB")
+        analyzer.writer.close()
+
+    if compaction.available():
+        bench_compaction(args.compact_day)
+    else:
+        print("\npyarrow not installed: skipping the Parquet comparison")
+
+
+if __name__ == "__main__":
+    main()
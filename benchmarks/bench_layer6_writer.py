@@ -0,0 +1,92 @@
+# benchmarks/bench_layer6_writer.py
+"""
+Layer 6 forensic log: per-call latency on the request path.
+
+Compares the old recorder (open, append one line, close, per transaction)
+with ForensicAnalyzer's background group-commit writer, from --callers
+threads recording --records transactions in total, and reports
+throughput plus p50/p99/max latency of the record call itself. The writer
+timing includes the final flush, so both sides put every line on disk.
+
+Run from the repository root:
+    python -m benchmarks.bench_layer6_writer [--records 50000] [--callers 8] [--fsync interval]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from layer6.forensic_analysis import ForensicAnalyzer
+from layer6.log_writer import FSYNC_POLICIES
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _transaction(i: int) -> dict:
+    return {
+        "user_id": f"user-{i % 500}",
+        "original_input": "Summarize the attached quarterly report in three bullet points.",
+        "sanitized_input": "Summarize the attached quarterly report in three bullet points.",
+        "final_output": "The report shows revenue growth across all regions. " * 4,
+        "was_blocked": i % 17 == 0,
+        "severity": "LOW",
+    }
+
+
+def legacy_record(log_file: str, transaction: dict) -> None:
+    transaction.setdefault('timestamp', datetime.utcnow().isoformat())
+    transaction.setdefault('user_id', 'anonymous')
+    with open(log_file, 'a', encoding='utf-8') as f:
+        json.dump(transaction, f)
+        f.write('\n')
+
+
+def _drive(record, records: int, callers: int):
+    def one(i):
+        transaction = _transaction(i)
+        start = time.perf_counter()
+        record(transaction)
+        return (time.perf_counter() - start) * 1e6
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        latencies = sorted(pool.map(one, range(records), chunksize=256))
+    return start, latencies
+
+
+def _report(name, records, elapsed, latencies):
+    print(f"{name:<18} {records / elapsed:>10,.0f} rec/s | p50 {_percentile(latencies, 50):7.1f} us | "
+          f"p99 {_percentile(latencies, 99):7.1f} us | max {latencies[-1] / 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="interval")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, "legacy.jsonl")
+        start, latencies = _drive(lambda t: legacy_record(log_file, t), args.records, args.callers)
+        _report("open/append/close", args.records, time.perf_counter() - start, latencies)
+
+        analyzer = ForensicAnalyzer(os.path.join(tmp, "logs"), os.path.join(tmp, "reports"), fsync=args.fsync)
+        start, latencies = _drive(analyzer.record_transaction, args.records, args.callers)
+        analyzer.writer.flush()
+        _report(f"writer ({args.fsync})", args.records, time.perf_counter() - start, latencies)
+        stats = analyzer.writer.stats()
+        analyzer.writer.close()
+        print(f"  batches {stats['batches']:,} | fsyncs {stats['fsyncs']:,} | dropped {stats['dropped']:,}")
+
+
+if __name__ == "__main__":
+    main()
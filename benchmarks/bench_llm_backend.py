@@ -0,0 +1,71 @@
+# benchmarks/bench_llm_backend.py
+"""
+LLM backend overhead against the local stub Ollama server.
+
+Runs N concurrent callers through OllamaHTTPBackend and reports throughput,
+latency percentiles, connection reuse and how the concurrency limit queues
+callers. With --subprocess, also times the `ollama run` fallback path
+(requires the ollama CLI).
+
+Run from the repository root:
+    python -m benchmarks.bench_llm_backend [--requests 200] [--callers 16]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_llm import StubLLM, StubOllamaServer
+from llm_backends import OllamaHTTPBackend, SubprocessBackend
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _drive(backend, n_requests: int, callers: int):
+    def one(_):
+        start = time.perf_counter()
+        backend.generate("You are a helpful assistant.", "ping")
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        latencies = sorted(pool.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    return n_requests / elapsed, latencies
+
+
+def _report(name, throughput, latencies):
+    print(f"{name:<28} {throughput:8.1f} req/s | p50 {_percentile(latencies, 50):7.2f} ms | "
+          f"p95 {_percentile(latencies, 95):7.2f} ms | p99 {_percentile(latencies, 99):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--subprocess", action="store_true", help="also time the ollama CLI fallback")
+    args = parser.parse_args()
+
+    # Instant stub: measures backend overhead, not generation time
+    llm = StubLLM("pong " * 20, tokens_per_second=1e9, first_token_delay=0.0)
+    with StubOllamaServer(llm) as server:
+        backend = OllamaHTTPBackend(base_url=server.url, max_concurrency=args.max_concurrency)
+        throughput, latencies = _drive(backend, args.requests, args.callers)
+        _report(f"http pooled (limit {args.max_concurrency})", throughput, latencies)
+        stats = backend.stats()
+        print(f"  connections opened={stats['connections_opened']} reused={stats['connections_reused']} "
+              f"busy={stats['busy_rejections']} timeouts={stats['timeouts']}")
+
+    if args.subprocess:
+        backend = SubprocessBackend()
+        throughput, latencies = _drive(backend, min(args.requests, 20), min(args.callers, 4))
+        _report("subprocess (ollama run)", throughput, latencies)
+
+
+if __name__ == "__main__":
+    main()
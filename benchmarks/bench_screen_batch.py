@@ -0,0 +1,51 @@
+# benchmarks/bench_screen_batch.py
+"""
+Bulk screening throughput (Layers 1-2, no LLM) for several batch sizes.
+
+Replays prompts from data/intent_dataset.csv through Pipeline.screen_batch
+and compares against screening the same prompts one call at a time, so
+/api/screen/batch can be sized. The Layer 2 cache is disabled to measure
+model throughput rather than cache hits.
+
+Run from the repository root:
+    python -m benchmarks.bench_screen_batch [--prompts 512] [--batch-sizes 1,16,64,128]
+"""
+import argparse
+import time
+
+from benchmarks.datasets import load_intent_dataset
+from layer2 import disable_cache, disable_batching
+from pipeline import Pipeline
+
+
+def _screen(pipeline: Pipeline, prompts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for _ in pipeline.screen_batch(prompts, batch_size=batch_size):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=512)
+    parser.add_argument("--batch-sizes", default="1,16,64,128")
+    args = parser.parse_args()
+
+    disable_cache()
+    disable_batching()
+    prompts = [text for text, _ in load_intent_dataset()[:args.prompts]]
+
+    pipeline = Pipeline(llm=lambda system, user: "")
+    pipeline.warm_up()
+
+    print(f"Screening {len(prompts)} prompts")
+    print(f"{'batch size':>10} | {'elapsed':>9} | {'prompts/s':>9} | {'ms/prompt':>9}")
+    print("-" * 48)
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        elapsed = _screen(pipeline, prompts, batch_size)
+        print(f"{batch_size:>10} | {elapsed:>8.2f}s | {len(prompts) / elapsed:>9.1f} | "
+              f"{elapsed * 1000 / len(prompts):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_streaming.py
+"""
+Streaming vs blocking responses against a local stub LLM.
+
+Measures, through the real Pipeline:
+  - time-to-first-token in streaming mode vs. full-response latency
+  - time-to-abort when Layer 4 stops a leaking response mid-generation,
+    and how many tokens were generated before the stop
+
+Run from the repository root:
+    python -m benchmarks.bench_streaming [--tokens-per-second 50]
+"""
+import argparse
+import time
+
+from benchmarks.stub_llm import BENIGN_RESPONSE, LEAKING_RESPONSE, StubLLM, split_tokens
+from pipeline import Pipeline
+
+PROMPT = "How do I reset my account password?"
+
+
+def _run_stream(pipeline: Pipeline, user_id: str):
+    result = None
+    for event, data in pipeline.process_stream(PROMPT, user_id):
+        if event == "result":
+            result = data
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    benign = StubLLM(BENIGN_RESPONSE, args.tokens_per_second, args.first_token_delay)
+    pipeline = Pipeline(llm=benign.generate, llm_stream=benign.stream)
+    pipeline.warm_up()
+
+    start = time.perf_counter()
+    pipeline.process(PROMPT, "bench_stream_blocking")
+    blocking_ms = (time.perf_counter() - start) * 1000
+
+    result = _run_stream(pipeline, "bench_stream_benign")
+    ttft_ms = result["stream"]["time_to_first_token_ms"]
+
+    leaking = StubLLM(LEAKING_RESPONSE, args.tokens_per_second, args.first_token_delay)
+    pipeline.llm_stream = leaking.stream
+    result = _run_stream(pipeline, "bench_stream_leak")
+    abort_ms = result["stream"]["time_to_abort_ms"]
+    total_tokens = sum(1 for _ in split_tokens(LEAKING_RESPONSE))
+
+    print(f"Blocking response latency : {blocking_ms:8.1f} ms")
+    print(f"Streaming time-to-first-token : {ttft_ms:8.1f} ms (LLM stream only)")
+    print(f"Leak aborted after        : {abort_ms:8.1f} ms, "
+          f"{leaking.tokens_generated}/{total_tokens} tokens generated, "
+          f"blocked={result['was_blocked']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# benchmarks/bench_suite.py
+"""
+Offline per-layer benchmark suite over the bundled datasets.
+
+Replays the prompts of data/intent_dataset.csv and the persuasive prompts
+of data/adversarial_dataset_with_techniques.csv, one at a time:
+
+  layer1    InversionFilter.sanitize
+  layer2    detect_intent (the ONNX model; no batching or cache)
+  layer3    MathematicalArmor.armor at SUSPICIOUS severity
+  layer4    filter_output, with the prompt standing in for the LLM output
+  layer5    playbook check + score update on a private profile store
+  layer6    record_transaction on a private forensic log
+  pipeline  Pipeline.process with a stub LLM that answers instantly
+
+and reports throughput and p50/p95/p99 latency per layer, overall and by
+input-length band (characters). For the pipeline it also prints the
+per-stage histograms the pipeline keeps itself (bucket upper bounds).
+
+--baseline writes the results as JSON. --compare re-runs against such a
+file and exits 1 if any layer's p50 or p95 (overall or per band) regressed
+by more than --tolerance (relative) and --min-delta-ms (absolute). Layers
+that cannot start here (e.g. no Layer 2 model) are skipped and reported;
+with --compare, a skipped layer that the baseline measured also fails.
+
+The pipeline runs on a private Layer 5 profile store and Layer 6 log in a
+temporary directory, swapped in for the process-wide ones for the run;
+every request gets a fresh user so rate limits and bans do not skew the
+numbers.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--limit 2000] [--layers layer1,layer3,pipeline] [--baseline base.json]
+    python -m benchmarks.bench_suite --compare base.json [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.datasets import load_adversarial_dataset, load_intent_dataset
+from benchmarks.stub_llm import BENIGN_RESPONSE
+from layer1.inversion_filter import InversionFilter
+from layer2 import detect_intent, warm_up as warm_up_layer2
+from layer3.mathematical_armor import MathematicalArmor
+from layer4 import filter_output
+import layer5.user_profiler as user_profiler
+import layer6.forensic_analysis as forensic_analysis
+from layer5.profile_store import ProfileStore
+from layer5.user_profiler import UserProfiler
+from layer6 import TransactionRecord
+from layer6.forensic_analysis import ForensicAnalyzer
+from pipeline import Pipeline
+
+LAYERS = ("layer1", "layer2", "layer3", "layer4", "layer5", "layer6", "pipeline")
+
+# (label, lower bound inclusive, upper bound exclusive) in characters
+BANDS = (
+    ("<64", 0, 64),
+    ("64-255", 64, 256),
+    ("256-1023", 256, 1024),
+    ("1024+", 1024, None),
+)
+
+# Compared by --compare (p99 is reported but too noisy to gate on)
+GATED = ("p50_ms", "p95_ms")
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _band(text: str) -> str:
+    for label, low, high in BANDS:
+        if len(text) >= low and (high is None or len(text) < high):
+            return label
+    return BANDS[-1][0]
+
+
+def _stats(latencies: List[float], elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "throughput_per_s": len(ordered) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(ordered, 50),
+        "p95_ms": _percentile(ordered, 95),
+        "p99_ms": _percentile(ordered, 99),
+    }
+
+
+def load_prompts(limit: int, seed: int = 0) -> List[str]:
+    """Up to `limit` prompts from each dataset, shuffled together."""
+    rng = random.Random(seed)
+    prompts = []
+    for rows in (load_intent_dataset(), load_adversarial_dataset()):
+        texts = [text for text, _ in rows]
+        prompts.extend(rng.sample(texts, min(limit, len(texts))) if limit else texts)
+    rng.shuffle(prompts)
+    return prompts
+
+
+def replay(fn: Callable[[int, str], Any], prompts: List[str], warm_up: int) -> Dict[str, Any]:
+    """Time fn(i, prompt) over every prompt, after `warm_up` untimed calls."""
+    for i, text in enumerate(prompts[:warm_up]):
+        fn(-1 - i, text)
+
+    latencies: List[float] = []
+    by_band: Dict[str, List[float]] = {label: [] for label, _, _ in BANDS}
+    start = time.perf_counter()
+    for i, text in enumerate(prompts):
+        t = time.perf_counter()
+        fn(i, text)
+        ms = (time.perf_counter() - t) * 1000
+        latencies.append(ms)
+        by_band[_band(text)].append(ms)
+    result = _stats(latencies, time.perf_counter() - start)
+    result["bands"] = {label: _stats(values, sum(values) / 1000) for label, values in by_band.items() if values}
+    return result
+
+
+def build_layer(name: str, workdir: str, closers: List[Callable[[], None]]) -> Callable[[int, str], Any]:
+    """
+    Set up `name` and return its per-prompt callable; raises if it cannot
+    start. The pipeline's callable exposes the Pipeline as `.pipeline`.
+    """
+    if name == "layer1":
+        layer1 = InversionFilter()
+        return lambda i, text: layer1.sanitize(text)
+
+    if name == "layer2":
+        warm_up_layer2()
+        return lambda i, text: detect_intent(text, threshold=0.95)
+
+    if name == "layer3":
+        layer3 = MathematicalArmor()
+        return lambda i, text: layer3.armor(text, severity="SUSPICIOUS")
+
+    if name == "layer4":
+        return lambda i, text: filter_output(text)
+
+    if name == "layer5":
+        store = ProfileStore(os.path.join(workdir, "profiles.db"))
+        profiler = UserProfiler(store=store, legacy_file=None)
+        closers.append(store.close)
+
+        def layer5(i: int, text: str) -> None:
+            user_id = f"user-{i % 500}"
+            profiler.enforce_playbook(user_id)
+            profiler.update_score(user_id, "normal")
+        return layer5
+
+    if name == "layer6":
+        analyzer = ForensicAnalyzer(os.path.join(workdir, "logs"), os.path.join(workdir, "reports"),
+                                    compact_interval_seconds=None, rebuild_metrics=False)
+        closers.append(analyzer.writer.close)
+        return lambda i, text: analyzer.record_transaction(TransactionRecord(user_id=f"user-{i % 500}", raw_input=text))
+
+    if name == "pipeline":
+        # Layers 5 and 6 reach the module singletons; point them at workdir
+        store = ProfileStore(os.path.join(workdir, "pipeline_profiles.db"))
+        analyzer = ForensicAnalyzer(os.path.join(workdir, "pipeline_logs"), os.path.join(workdir, "pipeline_reports"),
+                                    compact_interval_seconds=None, rebuild_metrics=False)
+        saved = (user_profiler.profiler, forensic_analysis.analyzer)
+        user_profiler.profiler = UserProfiler(store=store, legacy_file=None)
+        forensic_analysis.analyzer = analyzer
+
+        def restore() -> None:
+            user_profiler.profiler, forensic_analysis.analyzer = saved
+            analyzer.writer.close()
+            store.close()
+        closers.append(restore)
+
+        pipeline = Pipeline(llm=lambda system, user: BENIGN_RESPONSE)
+        pipeline.warm_up()
+        if not pipeline.ready:
+            raise RuntimeError(pipeline.warm_up_error or "warm-up failed")
+        run = f"{os.getpid()}-{int(time.time())}"
+
+        def process(i: int, text: str) -> dict:
+            return pipeline.process(text, f"bench-suite-{run}-{i}")
+        process.pipeline = pipeline
+        return process
+
+    raise ValueError(f"unknown layer {name!r}")
+
+
+def run_suite(layers: List[str], prompts: List[str], warm_up: int) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """(results per layer, skip reason per layer that could not start)."""
+    results: Dict[str, Any] = {}
+    skipped: Dict[str, str] = {}
+    closers: List[Callable[[], None]] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for name in layers:
+                try:
+                    fn = build_layer(name, workdir, closers)
+                except Exception as e:
+                    skipped[name] = f"{type(e).__name__}: {e}"
+                    continue
+                results[name] = replay(fn, prompts, warm_up)
+                pipeline = getattr(fn, "pipeline", None)
+                if pipeline is not None and pipeline.stage_latency is not None:
+                    results[name]["stages"] = pipeline.stage_latency.summary()
+        finally:
+            for close in closers:
+                close()
+    return results, skipped
+
+
+def print_results(results: Dict[str, Any], skipped: Dict[str, str]) -> None:
+    header = f"{'layer':<9} {'band':<9} | {'count':>6} {'req/s':>10} | {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        rows = [("all", result)] + list(result["bands"].items())
+        for band, r in rows:
+            print(f"{name if band == 'all' else '':<9} {band:<9} | {r['count']:>6} {r['throughput_per_s']:>10,.0f} | "
+                  f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+    for name, result in results.items():
+        if "stages" in result:
+            print(f"\n{name} stages (histogram bucket upper bounds, ms):")
+            for stage, s in result["stages"].items():
+                if s["count"]:
+                    print(f"  {stage:<14} n={s['count']:<6} mean {s['mean_ms']:8.3f}  "
+                          f"p50 <= {s['p50_ms']:<8g} p95 <= {s['p95_ms']:<8g} p99 <= {s['p99_ms']:g}")
+    for name, reason in skipped.items():
+        print(f"\n{name}: skipped ({reason})")
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any], skipped: Dict[str, str],
+            tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    Regressions of `results` against `baseline`, as printable lines. A
+    layer the baseline measured that could not start this run is one.
+    """
+    regressions = []
+    for name, old in baseline["results"].items():
+        new = results.get(name)
+        if name in skipped:
+            regressions.append(f"{name}: measured in the baseline but could not start ({skipped[name]})")
+            continue
+        if new is None:
+            print(f"  {name}: in the baseline but not measured this run")
+            continue
+        pairs = [("all", old, new)] + [
+            (band, old_band, new["bands"][band]) for band, old_band in old.get("bands", {}).items() if band in new["bands"]
+        ]
+        for band, o, n in pairs:
+            for metric in GATED:
+                before, after = o[metric], n[metric]
+                if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                    regressions.append(f"{name} [{band}] {metric}: {before:.3f} -> {after:.3f} ms "
+                                       f"(+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=2000, help="prompts per dataset (0: all)")
+    parser.add_argument("--layers", default=",".join(LAYERS), help="comma-separated subset of " + ",".join(LAYERS))
+    parser.add_argument("--warm-up", type=int, default=20, help="untimed calls per layer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p50/p95 increase")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore increases smaller than this")
+    args = parser.parse_args()
+
+    layers = [name.strip() for name in args.layers.split(",") if name.strip()]
+    unknown = set(layers) - set(LAYERS)
+    if unknown:
+        parser.error(f"unknown layers: {', '.join(sorted(unknown))}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        meta = baseline["meta"]
+        if (meta["limit"], meta["seed"]) != (args.limit, args.seed):
+            print(f"Note: baseline used --limit {meta['limit']} --seed {meta['seed']}; "
+                  f"this run uses --limit {args.limit} --seed {args.seed}")
+
+    prompts = load_prompts(args.limit, args.seed)
+    print(f"Replaying {len(prompts)} prompts through: {', '.join(layers)}\n")
+    results, skipped = run_suite(layers, prompts, args.warm_up)
+    print_results(results, skipped)
+
+    if args.baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "prompts": len(prompts),
+                    "limit": args.limit,
+                    "seed": args.seed,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "skipped": skipped,
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if baseline is not None:
+        print(f"\nCompared with {args.compare} (tolerance {args.tolerance:.0%}, min delta {args.min_delta_ms} ms):")
+        regressions = compare(baseline, results, skipped, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("  no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/datasets.py
+# Loaders for the bundled datasets in data/, shared by the benchmark scripts.
+import csv
+import json
+import re
+from pathlib import Path
+from typing import List, Tuple
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# Some persuasive prompts are far longer than csv's default field limit
+csv.field_size_limit(10 * 1024 * 1024)
+
+
+def _clean(text: str) -> str:
+    text = (text or "").strip()
+    # intent_dataset.csv keeps the fine-tuning "###" separator and quoting
+    if text.endswith("###"):
+        text = text[:-3].strip()
+    if len(text) >= 2 and text.startswith('"') and text.endswith('"'):
+        text = text[1:-1].strip()
+    return text
+
+
+def load_intent_dataset(path: Path = DATA_DIR / "intent_dataset.csv") -> List[Tuple[str, str]]:
+    """(text, label) rows, label is "SAFE" or "ATTACK"."""
+    rows = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            text = _clean(row.get("text", ""))
+            if text:
+                rows.append((text, row.get("label", "").strip()))
+    return rows
+
+
+def load_adversarial_dataset(
+    path: Path = DATA_DIR / "adversarial_dataset_with_techniques.csv",
+) -> List[Tuple[str, str]]:
+    """(persuasive_prompt, technique) rows: every prompt is an attack."""
+    rows = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            text = (row.get("persuasive_prompt") or "").strip()
+            if text:
+                rows.append((text, (row.get("technique") or "").strip()))
+    return rows
+
+
+def load_adversarial_queries(
+    path: Path = DATA_DIR / "adversarial_dataset_with_techniques.csv",
+) -> List[str]:
+    """The distinct benign customer queries the adversarial prompts were built from."""
+    seen = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            for column in ("original_query", "variant_query"):
+                # Variants are numbered ("1. How can I ...")
+                text = re.sub(r"^\d+\.\s*", "", (row.get(column) or "").strip())
+                if text:
+                    seen.setdefault(text, None)
+    return list(seen)
+
+
+def load_finetuning_dataset(
+    path: Path = DATA_DIR / "fine_tuning_dataset_prepared_valid.jsonl",
+) -> List[Tuple[str, str]]:
+    """(text, label) rows of a prepared fine-tuning split; label is "SAFE" or "ATTACK"."""
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = _clean(record.get("prompt", ""))
+            if text:
+                rows.append((text, "ATTACK" if record.get("completion", "").strip() == "jailbreakable" else "SAFE"))
+    return rows
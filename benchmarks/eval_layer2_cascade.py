@@ -0,0 +1,120 @@
+# benchmarks/eval_layer2_cascade.py
+"""
+Layer 2 cascade: how much traffic skips the ONNX model, and at what cost.
+
+Trains the hashed n-gram first stage from data/intent_dataset.csv and
+data/intent_dataset_balanced.csv (or loads --model), scores the held-out
+data/fine_tuning_dataset_prepared_valid.jsonl with it and with the ONNX
+model, then for each band (low, high) reports:
+
+  - skip: fraction of prompts the first stage decides on its own
+  - first-stage errors among the prompts it decides
+  - accuracy of the Layer 2 block decision (score > --threshold) for the
+    cascade vs the model alone, and the accuracy lost
+  - mean Layer 2 cost per prompt, from the measured per-prompt latency of
+    each stage
+
+Without the ONNX model (not downloaded) only the first-stage columns are
+filled. --save writes the trained first stage where enable_cascade()
+loads it.
+
+Run from the repository root:
+    python -m benchmarks.eval_layer2_cascade [--bands 0.02:0.995,0.05:0.95] [--save models/intent_cascade.npz]
+"""
+import argparse
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import config
+from benchmarks.datasets import load_finetuning_dataset
+from layer2.cascade import HashedNgramClassifier, load_training_rows
+from layer2.intent_detector import IntentStateAnalyzer
+
+DEFAULT_BANDS = "0.005:0.999,0.02:0.995,0.05:0.95,0.1:0.9,0.2:0.8"
+
+
+def _parse_bands(value: str) -> List[Tuple[float, float]]:
+    bands = []
+    for item in value.split(","):
+        low, high = item.split(":")
+        bands.append((float(low), float(high)))
+    return bands
+
+
+def _heavy_scores(texts: List[str], batch_size: int) -> Tuple[Optional[np.ndarray], float, str]:
+    """ONNX scores of `texts` and per-prompt latency (ms), or None and the reason."""
+    try:
+        analyzer = IntentStateAnalyzer()
+        analyzer.warm_up()
+    except Exception as e:
+        return None, 0.0, f"{type(e).__name__}: {e}"
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    scores = np.zeros(len(texts))
+    for offset in range(0, len(order), batch_size):
+        indices = order[offset:offset + batch_size]
+        scores[indices] = analyzer.score_batch([texts[i] for i in indices])
+    sample = texts[:200]
+    start = time.perf_counter()
+    for text in sample:
+        analyzer.score_batch([text])
+    return scores, (time.perf_counter() - start) / len(sample) * 1000, ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bands", default=DEFAULT_BANDS, help="comma-separated low:high bands")
+    parser.add_argument("--threshold", type=float, default=config.L2_THRESHOLD, help="Layer 2 block threshold")
+    parser.add_argument("--model", help="load this first stage instead of training one")
+    parser.add_argument("--save", help="write the trained first stage here")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    valid = load_finetuning_dataset()
+    texts = [text for text, _ in valid]
+    labels = np.array([label == "ATTACK" for _, label in valid])
+
+    if args.model:
+        stage1 = HashedNgramClassifier.load(args.model)
+        print(f"First stage loaded from {args.model}")
+    else:
+        held_out = set(texts)
+        rows = [(text, label) for text, label in load_training_rows() if text not in held_out]
+        start = time.perf_counter()
+        stage1 = HashedNgramClassifier.train(rows)
+        print(f"First stage trained on {len(rows)} prompts in {time.perf_counter() - start:.1f}s")
+        if args.save:
+            stage1.save(args.save)
+            print(f"Saved to {args.save}")
+
+    start = time.perf_counter()
+    cheap = np.array([stage1.score(text) for text in texts])
+    cheap_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    heavy, heavy_ms, reason = _heavy_scores(texts, args.batch_size)
+    print(f"Validation: {len(texts)} prompts ({int(labels.sum())} attacks), block threshold {args.threshold}")
+    print(f"Per prompt: first stage {cheap_ms * 1000:.0f} us" +
+          (f", ONNX model {heavy_ms:.1f} ms" if heavy is not None else f"; ONNX model unavailable ({reason})"))
+    if heavy is not None:
+        model_accuracy = float(((heavy > args.threshold) == labels).mean())
+        print(f"Model alone: accuracy {model_accuracy:.4f}")
+
+    print(f"\n{'band':>13} | {'skip':>6} | {'stage-1 errors':>14} | {'cascade acc':>11} {'lost':>8} | {'mean L2 cost':>12}")
+    print("-" * 78)
+    for low, high in _parse_bands(args.bands):
+        decided = (cheap < low) | (cheap > high)
+        errors = int(((cheap[decided] > 0.5) != labels[decided]).sum())
+        row = f"{low:>5}-{high:<7} | {decided.mean():>6.1%} | {errors:>5} of {int(decided.sum()):>6} |"
+        if heavy is not None:
+            final = np.where(decided, cheap, heavy)
+            accuracy = float(((final > args.threshold) == labels).mean())
+            cost_ms = cheap_ms + (1 - decided.mean()) * heavy_ms
+            row += f" {accuracy:>11.4f} {model_accuracy - accuracy:>+8.4f} | {cost_ms:>9.2f} ms"
+        else:
+            row += f" {'-':>11} {'-':>8} | {'-':>12}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# benchmarks/eval_layer2_variants.py
+"""
+Layer 2 model variants: detection quality and cost side by side.
+
+Scores two labelled sets with every model variant given by --models
+(default: the IntentStateAnalyzer.MODEL_VARIANTS already in the local ONNX
+cache), using batched inference sorted by length:
+
+  valid        data/fine_tuning_dataset_prepared_valid.jsonl
+               (jailbreakable vs benign)
+  adversarial  data/adversarial_dataset_with_techniques.csv: the
+               persuasive prompts as attacks, their plain customer
+               queries as benign
+
+Per variant and dataset it reports ROC AUC and average precision,
+precision/recall/FPR at the serving threshold and the documented
+0.6-0.8 range, the best-F1 threshold, and the highest threshold that
+still reaches --target-recall. Next to that: per-prompt latency (p50/p95
+at batch size 1), batched throughput, and memory (RSS growth while
+loading, which depends on what was loaded before; run one --models at a
+time for clean numbers) plus size on disk.
+
+It closes with the cheapest variant (lowest p50) that reaches
+--target-recall at --min-precision or better on every dataset. --out
+writes all results, ROC/PR curves included, as JSON; --plots DIR draws
+the curves with matplotlib.
+
+Run from the repository root:
+    python -m benchmarks.eval_layer2_variants [--models a,b] [--target-recall 0.9] [--min-precision 0.9] [--out eval.json] [--plots eval_plots]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+import config
+from benchmarks.datasets import load_adversarial_dataset, load_adversarial_queries, load_finetuning_dataset
+from layer2.intent_detector import IntentStateAnalyzer
+
+# Thresholds reported as-is: the serving one and the documented range
+REPORTED_THRESHOLDS = (0.6, 0.7, 0.8)
+CURVE_POINTS = 200
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _rss_mb() -> float:
+    """Current resident set size; peak RSS where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _disk_mb(model_name: str) -> float:
+    total = 0
+    for root, _, files in os.walk(IntentStateAnalyzer.model_dir(model_name)):
+        for name in files:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):  # snapshots/ links into blobs/
+                total += os.path.getsize(path)
+    return total / 2**20
+
+
+def load_eval_sets() -> Dict[str, Tuple[List[str], np.ndarray]]:
+    """name: (texts, labels with 1 = attack)."""
+    valid = load_finetuning_dataset()
+    attacks = [text for text, _ in load_adversarial_dataset()]
+    benign = load_adversarial_queries()
+    return {
+        "valid": ([text for text, _ in valid], np.array([label == "ATTACK" for _, label in valid], dtype=np.int8)),
+        "adversarial": (attacks + benign, np.array([1] * len(attacks) + [0] * len(benign), dtype=np.int8)),
+    }
+
+
+def score_all(analyzer: IntentStateAnalyzer, texts: List[str], batch_size: int) -> Tuple[np.ndarray, float]:
+    """Malicious scores in input order, and the seconds spent scoring."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    scores = np.zeros(len(texts))
+    start = time.perf_counter()
+    for offset in range(0, len(order), batch_size):
+        indices = order[offset:offset + batch_size]
+        scores[indices] = analyzer.score_batch([texts[i] for i in indices])
+    return scores, time.perf_counter() - start
+
+
+def at_threshold(scores: np.ndarray, labels: np.ndarray, threshold: float) -> Dict[str, float]:
+    """Metrics of the Layer 2 rule (block when score > threshold)."""
+    predicted = scores > threshold
+    tp = int(np.sum(predicted & (labels == 1)))
+    fp = int(np.sum(predicted & (labels == 0)))
+    fn = int(np.sum(~predicted & (labels == 1)))
+    negatives = int(np.sum(labels == 0))
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "threshold": float(threshold),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "fpr": fp / negatives if negatives else 0.0,
+    }
+
+
+def _thin(values: np.ndarray) -> List[float]:
+    step = max(1, len(values) // CURVE_POINTS)
+    return [round(float(v), 5) for v in np.r_[values[::step], values[-1:]]]
+
+
+def evaluate(scores: np.ndarray, labels: np.ndarray, serving_threshold: float, target_recall: float) -> Dict[str, Any]:
+    """ROC/PR curves, summary areas and threshold picks for one dataset."""
+    order = np.argsort(-scores, kind="mergesort")
+    ranked, y = scores[order], labels[order]
+    # One point per distinct score: everything scored >= it is flagged
+    last = np.r_[np.nonzero(np.diff(ranked))[0], len(ranked) - 1]
+    tp = np.cumsum(y)[last]
+    fp = np.cumsum(1 - y)[last]
+    positives, negatives = max(int(y.sum()), 1), max(len(y) - int(y.sum()), 1)
+    tpr, fpr = tp / positives, fp / negatives
+    precision = tp / (tp + fp)
+    # Runtime thresholds (strict >) between each score and the next lower one
+    cuts = np.r_[(ranked[last][:-1] + ranked[last][1:]) / 2, ranked[last][-1] / 2]
+
+    x, y_roc = np.r_[0.0, fpr], np.r_[0.0, tpr]
+    auc = float(np.sum(np.diff(x) * (y_roc[1:] + y_roc[:-1]) / 2))
+    average_precision = float(np.sum(np.diff(np.r_[0.0, tpr]) * precision))
+    f1 = 2 * precision * tpr / np.maximum(precision + tpr, 1e-12)
+    best = int(np.argmax(f1))
+    reaching = np.nonzero(tpr >= target_recall)[0]
+
+    thresholds = sorted({serving_threshold, *REPORTED_THRESHOLDS})
+    return {
+        "n": int(len(y)),
+        "attacks": int(y.sum()),
+        "roc_auc": auc,
+        "average_precision": average_precision,
+        "at_thresholds": [at_threshold(scores, labels, t) for t in thresholds],
+        "best_f1": at_threshold(scores, labels, float(cuts[best])),
+        "target_recall": at_threshold(scores, labels, float(cuts[reaching[0]])) if len(reaching) else None,
+        "curves": {
+            "roc": {"fpr": _thin(fpr), "tpr": _thin(tpr)},
+            "pr": {"recall": _thin(tpr), "precision": _thin(precision)},
+        },
+    }
+
+
+def evaluate_variant(model_name: str, sets, args) -> Dict[str, Any]:
+    gc.collect()
+    rss_before = _rss_mb()
+    analyzer = IntentStateAnalyzer(model_name=model_name)
+    analyzer.warm_up()
+    result: Dict[str, Any] = {
+        "model": model_name,
+        "memory": {"rss_growth_mb": _rss_mb() - rss_before, "disk_mb": _disk_mb(model_name)},
+        "datasets": {},
+    }
+
+    scored = total_seconds = 0
+    for name, (texts, labels) in sets.items():
+        scores, seconds = score_all(analyzer, texts, args.batch_size)
+        scored += len(texts)
+        total_seconds += seconds
+        result["datasets"][name] = evaluate(scores, labels, args.threshold, args.target_recall)
+
+    rng = random.Random(0)
+    sample = rng.sample([text for texts, _ in sets.values() for text in texts], args.latency_sample)
+    latencies = []
+    for text in sample:
+        start = time.perf_counter()
+        analyzer.score_batch([text])
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    result["latency"] = {
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "batched_prompts_per_s": scored / total_seconds if total_seconds else 0.0,
+        "batch_size": args.batch_size,
+    }
+    return result
+
+
+def meets_target(result: Dict[str, Any], min_precision: float) -> bool:
+    return all(
+        d["target_recall"] is not None and d["target_recall"]["precision"] >= min_precision
+        for d in result["datasets"].values()
+    )
+
+
+def print_variant(result: Dict[str, Any], target_recall: float) -> None:
+    lat, mem = result["latency"], result["memory"]
+    print(f"\n=== {result['model']}")
+    print(f"latency p50 {lat['p50_ms']:.1f} ms  p95 {lat['p95_ms']:.1f} ms  | batched {lat['batched_prompts_per_s']:,.0f} "
+          f"prompts/s (batch {lat['batch_size']}) | RSS +{mem['rss_growth_mb']:.0f} MiB, {mem['disk_mb']:.0f} MiB on disk")
+    for name, d in result["datasets"].items():
+        print(f"  {name}: {d['n']} prompts ({d['attacks']} attacks)  ROC AUC {d['roc_auc']:.4f}  AP {d['average_precision']:.4f}")
+        rows = [(f"> {m['threshold']:.2f}", m) for m in d["at_thresholds"]]
+        rows.append((f"best F1 > {d['best_f1']['threshold']:.4f}", d["best_f1"]))
+        if d["target_recall"] is not None:
+            rows.append((f"recall {target_recall:.0%} > {d['target_recall']['threshold']:.4f}", d["target_recall"]))
+        for label, m in rows:
+            print(f"    {label:<26} precision {m['precision']:.3f}  recall {m['recall']:.3f}  "
+                  f"F1 {m['f1']:.3f}  FPR {m['fpr']:.3f}")
+
+
+def plot(results: List[Dict[str, Any]], directory: str) -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(directory, exist_ok=True)
+    for name in results[0]["datasets"]:
+        fig, (roc, pr) = plt.subplots(1, 2, figsize=(12, 5))
+        for result in results:
+            curves = result["datasets"][name]["curves"]
+            label = result["model"].split("/")[-1]
+            roc.plot(curves["roc"]["fpr"], curves["roc"]["tpr"], label=label)
+            pr.plot(curves["pr"]["recall"], curves["pr"]["precision"], label=label)
+        roc.set(title=f"ROC - {name}", xlabel="false positive rate", ylabel="true positive rate")
+        pr.set(title=f"Precision/recall - {name}", xlabel="recall", ylabel="precision")
+        roc.legend()
+        pr.legend()
+        fig.savefig(os.path.join(directory, f"layer2_{name}.png"), bbox_inches="tight", dpi=120)
+        plt.close(fig)
+    print(f"\nCurves drawn in {directory}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", help="comma-separated model names (default: cached MODEL_VARIANTS)")
+    parser.add_argument("--threshold", type=float, default=config.L2_THRESHOLD, help="serving threshold to report")
+    parser.add_argument("--target-recall", type=float, default=0.9)
+    parser.add_argument("--min-precision", type=float, default=0.9)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency-sample", type=int, default=200, help="prompts timed one at a time")
+    parser.add_argument("--out", help="write results (with curves) to this JSON file")
+    parser.add_argument("--plots", help="directory for ROC/PR plots")
+    args = parser.parse_args()
+
+    models = args.models.split(",") if args.models else IntentStateAnalyzer.cached_variants()
+    if not models:
+        parser.error(f"no model variant in {IntentStateAnalyzer.CACHE_DIR}; pass --models to download some")
+
+    sets = load_eval_sets()
+    results = []
+    for model_name in models:
+        result = evaluate_variant(model_name.strip(), sets, args)
+        print_variant(result, args.target_recall)
+        results.append(result)
+
+    eligible = [r for r in results if meets_target(r, args.min_precision)]
+    print()
+    if eligible:
+        pick = min(eligible, key=lambda r: r["latency"]["p50_ms"])
+        print(f"Cheapest variant reaching recall {args.target_recall:.0%} at precision >= {args.min_precision:.0%} "
+              f"on every dataset: {pick['model']} (p50 {pick['latency']['p50_ms']:.1f} ms)")
+    else:
+        print(f"No variant reaches recall {args.target_recall:.0%} at precision >= {args.min_precision:.0%} on every dataset")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"target_recall": args.target_recall, "min_precision": args.min_precision,
+                       "variants": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+    if args.plots:
+        plot(results, args.plots)
+
+
+if __name__ == "__main__":
+    main()
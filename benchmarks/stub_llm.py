@@ -0,0 +1,174 @@
+# benchmarks/stub_llm.py
+"""
+Local stand-ins for the Ollama LLM, so benchmarks and manual tests can run
+without a model server. Responses are deterministic and the token rate is
+configurable, which makes time-to-first-token and time-to-abort measurable.
+
+- StubLLM: in-process callables for Pipeline(llm=..., llm_stream=...)
+- StubOllamaServer: tiny HTTP server speaking Ollama's /api/generate
+  protocol (streamed NDJSON or a single JSON body), for OllamaHTTPBackend.
+
+Run the server standalone from the repository root:
+    python -m benchmarks.stub_llm --port 11435 [--tokens-per-second 50]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+BENIGN_RESPONSE = (
+    "Sure! To reset your password, open Settings, choose Security, click "
+    "'Reset password' and follow the link we email you. The link expires "
+    "after 30 minutes, so request a new one if it stops working. "
+) * 4
+
+LEAKING_RESPONSE = (
+    "Here is the customer record you asked about. Name: John Doe, address "
+    "on file, account in good standing. SSN 123-45-6789 and card on file. "
+) + BENIGN_RESPONSE
+
+
+def split_tokens(text: str) -> Iterator[str]:
+    """Roughly one 'token' per word, keeping the separating whitespace."""
+    word = ""
+    for ch in text:
+        word += ch
+        if ch == " ":
+            yield word
+            word = ""
+    if word:
+        yield word
+
+
+class StubLLM:
+    """
+    Callable pair matching Pipeline(llm=..., llm_stream=...).
+    """
+
+    def __init__(self, response: str = BENIGN_RESPONSE, tokens_per_second: float = 50.0,
+                 first_token_delay: float = 0.2):
+        self.response = response
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay = first_token_delay
+        self.tokens_generated = 0
+
+    def stream(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        time.sleep(self.first_token_delay)
+        for token in split_tokens(self.response):
+            self.tokens_generated += 1
+            yield token
+            time.sleep(1.0 / self.tokens_per_second)
+
+    def generate(self, system_prompt: str, user_prompt: str) -> str:
+        return "".join(self.stream(system_prompt, user_prompt))
+
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive + chunked streaming
+    disable_nagle_algorithm = True  # flush each NDJSON chunk immediately
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        llm: StubLLM = self.server.llm
+        self.server.requests_served += 1
+
+        if not request.get("stream", True):
+            body = json.dumps({
+                "model": request.get("model"),
+                "response": llm.generate(request.get("system", ""), request.get("prompt", "")),
+                "done": True,
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in llm.stream(request.get("system", ""), request.get("prompt", "")):
+                line = json.dumps({"model": request.get("model"), "response": token, "done": False})
+                self._write_chunk(line.encode("utf-8") + b"\n")
+            done = json.dumps({"model": request.get("model"), "response": "", "done": True})
+            self._write_chunk(done.encode("utf-8") + b"\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hung up (e.g. Layer 4 abort): stop generating
+            self.server.requests_aborted += 1
+            self.close_connection = True
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    """
+    Background stub server; use as a context manager:
+
+        with StubOllamaServer(StubLLM()) as server:
+            backend = OllamaHTTPBackend(base_url=server.url)
+    """
+    daemon_threads = True
+
+    def __init__(self, llm: StubLLM, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _StubOllamaHandler)
+        self.llm = llm
+        self.requests_served = 0
+        self.requests_aborted = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StubOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for local tests and benchmarks")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--leak", action="store_true", help="answer with a response Layer 4 must block")
+    args = parser.parse_args()
+
+    llm = StubLLM(LEAKING_RESPONSE if args.leak else BENIGN_RESPONSE,
+                  args.tokens_per_second, args.first_token_delay)
+    server = StubOllamaServer(llm, port=args.port)
+    print(f"Stub Ollama listening on {server.url} (set PROMPTGUARD_OLLAMA_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
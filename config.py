@@ -0,0 +1,124 @@
+# config.py - Runtime knobs for the PromptGuard gateway
+# Every value can be overridden through the environment (PROMPTGUARD_*),
+# so deployments can tune the pipeline without code changes.
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+# ========================
+# LAYER 2: Intent-State Analyzer
+# ========================
+# Model and block threshold. benchmarks/eval_layer2_variants.py reports
+# precision/recall, the best threshold and latency per model variant.
+# An empty L2_MODEL keeps IntentStateAnalyzer.MODEL_NAME.
+L2_MODEL = os.environ.get("PROMPTGUARD_L2_MODEL", "")
+L2_THRESHOLD = _env_float("PROMPTGUARD_L2_THRESHOLD", 0.95)
+
+# Micro-batching: concurrent requests wait up to L2_MAX_WAIT_MS for
+# company, then run as one ONNX batch of at most L2_MAX_BATCH_SIZE rows.
+# A request waits at most L2_BATCH_TIMEOUT_SECONDS for its batch.
+L2_BATCHING_ENABLED = _env_bool("PROMPTGUARD_L2_BATCHING", True)
+L2_MAX_BATCH_SIZE = _env_int("PROMPTGUARD_L2_MAX_BATCH_SIZE", 16)
+L2_MAX_WAIT_MS = _env_float("PROMPTGUARD_L2_MAX_WAIT_MS", 5.0)
+L2_BATCH_TIMEOUT_SECONDS = _env_float("PROMPTGUARD_L2_BATCH_TIMEOUT_SECONDS", 10.0)
+
+# Verdict cache: identical sanitized prompts reuse the stored score.
+L2_CACHE_ENABLED = _env_bool("PROMPTGUARD_L2_CACHE", True)
+L2_CACHE_MAX_BYTES = _env_int("PROMPTGUARD_L2_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+L2_CACHE_TTL_SECONDS = _env_float("PROMPTGUARD_L2_CACHE_TTL_SECONDS", 600.0)
+
+# Cascade: a hashed n-gram classifier decides prompts it scores below
+# L2_CASCADE_LOW or above L2_CASCADE_HIGH; only the band in between reaches
+# the ONNX model. benchmarks/eval_layer2_cascade.py shows the skip rate and
+# accuracy cost of a band. The model is trained on first start if missing.
+L2_CASCADE_ENABLED = _env_bool("PROMPTGUARD_L2_CASCADE", True)
+L2_CASCADE_MODEL = os.environ.get("PROMPTGUARD_L2_CASCADE_MODEL", "./models/intent_cascade.npz")
+L2_CASCADE_LOW = _env_float("PROMPTGUARD_L2_CASCADE_LOW", 0.02)
+L2_CASCADE_HIGH = _env_float("PROMPTGUARD_L2_CASCADE_HIGH", 0.995)
+
+# Allowlist: prompts whose word n-grams overlap a curated safe prompt
+# (data/safe_prompts.db) by at least L2_ALLOWLIST_MIN_SIMILARITY (Jaccard)
+# are not scored ("skip") or are held to raised thresholds ("downweight"):
+# every threshold t (L2_THRESHOLD for blocking, 0.5 for SUSPICIOUS) becomes
+# t + L2_ALLOWLIST_MARGIN * (1 - t), e.g. 0.95 -> 0.975 and 0.5 -> 0.75 at
+# the default 0.5. The margin must be in [0, 1), so an allowlisted prompt
+# the model is sure about is still blocked; use "skip" to never score
+# them. New rows are picked up every L2_ALLOWLIST_RELOAD_SECONDS.
+L2_ALLOWLIST_ENABLED = _env_bool("PROMPTGUARD_L2_ALLOWLIST", True)
+L2_ALLOWLIST_DB = os.environ.get("PROMPTGUARD_L2_ALLOWLIST_DB", "./data/safe_prompts.db")
+L2_ALLOWLIST_MIN_SIMILARITY = _env_float("PROMPTGUARD_L2_ALLOWLIST_MIN_SIMILARITY", 0.7)
+L2_ALLOWLIST_MODE = os.environ.get("PROMPTGUARD_L2_ALLOWLIST_MODE", "downweight")
+L2_ALLOWLIST_MARGIN = _env_float("PROMPTGUARD_L2_ALLOWLIST_MARGIN", 0.5)
+L2_ALLOWLIST_RELOAD_SECONDS = _env_float("PROMPTGUARD_L2_ALLOWLIST_RELOAD_SECONDS", 30.0)
+
+# Attack signatures: prompts within L2_SIGNATURE_BLOCK_SIMILARITY (TF-IDF
+# cosine) of a known attack from the bundled datasets are blocked before
+# the model runs; from L2_SIGNATURE_TAG_SIMILARITY the nearest attack's
+# technique is logged. Needs scipy.
+L2_SIGNATURES_ENABLED = _env_bool("PROMPTGUARD_L2_SIGNATURES", True)
+L2_SIGNATURE_BLOCK_SIMILARITY = _env_float("PROMPTGUARD_L2_SIGNATURE_BLOCK_SIMILARITY", 0.6)
+L2_SIGNATURE_TAG_SIMILARITY = _env_float("PROMPTGUARD_L2_SIGNATURE_TAG_SIMILARITY", 0.4)
+
+# ========================
+# LAYER 3: Mathematical Armor
+# ========================
+# Longest input accepted (characters), for chat and for each prompt of
+# /api/screen/batch (413 past it). Layer 2 scores inputs past its 512-token
+# window as overlapping windows, so its cost grows linearly with length up
+# to this bound.
+L3_MAX_INPUT_LENGTH = _env_int("PROMPTGUARD_L3_MAX_INPUT_LENGTH", 16000)
+
+# ========================
+# LLM BACKEND
+# ========================
+# "http": resident Ollama server over pooled keep-alive connections,
+#         falling back to the CLI when the server is unreachable.
+# "subprocess": one `ollama run` process per request (legacy path).
+LLM_BACKEND = os.environ.get("PROMPTGUARD_LLM_BACKEND", "http")
+OLLAMA_URL = os.environ.get("PROMPTGUARD_OLLAMA_URL", "http://127.0.0.1:11434")
+LLM_MODEL = os.environ.get("PROMPTGUARD_LLM_MODEL", "llama3.2:1b")
+LLM_MAX_CONCURRENCY = _env_int("PROMPTGUARD_LLM_MAX_CONCURRENCY", 4)
+LLM_TIMEOUT_SECONDS = _env_float("PROMPTGUARD_LLM_TIMEOUT_SECONDS", 60.0)
+LLM_KEEP_ALIVE = os.environ.get("PROMPTGUARD_LLM_KEEP_ALIVE", "30m")
+
+# ========================
+# ASYNC GATEWAY (async_api.py)
+# ========================
+# CPU-bound layers (1, 2, 4) run on a bounded thread pool. Requests beyond
+# ASYNC_MAX_PENDING queued jobs, or beyond ASYNC_MAX_INFLIGHT concurrent
+# requests, are rejected with 503 + Retry-After instead of piling up.
+ASYNC_CPU_WORKERS = _env_int("PROMPTGUARD_ASYNC_CPU_WORKERS", max(4, L2_MAX_BATCH_SIZE))
+ASYNC_MAX_PENDING = _env_int("PROMPTGUARD_ASYNC_MAX_PENDING", 64)
+ASYNC_MAX_INFLIGHT = _env_int("PROMPTGUARD_ASYNC_MAX_INFLIGHT", 256)
+
+# ========================
+# BULK SCREENING (/api/screen/batch)
+# ========================
+SCREEN_MAX_ITEMS = _env_int("PROMPTGUARD_SCREEN_MAX_ITEMS", 5000)
+SCREEN_BATCH_SIZE = _env_int("PROMPTGUARD_SCREEN_BATCH_SIZE", 64)
+# Batches larger than this are streamed back as NDJSON
+SCREEN_STREAM_THRESHOLD = _env_int("PROMPTGUARD_SCREEN_STREAM_THRESHOLD", 200)
+
+# ========================
+# OBSERVABILITY
+# ========================
+# Per-stage latency histograms (Layer 5 check, Layers 1-4, LLM, Layer 6
+# write), served in Prometheus text format at /metrics and attached to each
+# forensic record as stage_ms.
+STAGE_TIMING_ENABLED = _env_bool("PROMPTGUARD_STAGE_TIMING", True)
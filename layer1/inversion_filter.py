@@ -1,6 +1,8 @@
 import re
 from typing import Dict, List
 
+from .multi_pattern import MultiPatternMatcher, merge_spans
+
 
 class InversionFilter:
     """
@@ -50,44 +52,24 @@ class InversionFilter:
             # XML / HTML style tag abuse
             r"<\s*assistant\s*>",
             r"<\s*user\s*>",
-            r"<\s*system\s*>",
         ]
 
         # Compile everything once for speed
         self.phrase_regexes = [re.compile(p, re.IGNORECASE) for p in phrase_patterns]
         self.structural_regexes = [re.compile(p, re.IGNORECASE) for p in structural_patterns]
 
+        # One matcher over both lists: a single scan finds every match
+        self.matcher = MultiPatternMatcher(
+            [(p, "phrase_jailbreak") for p in phrase_patterns]
+            + [(p, "structural_abuse") for p in structural_patterns]
+        )
+
     def _wrap_inert(self, text: str) -> str:
         """
         Wrap a suspicious span in inert tags so it is treated as data.
         """
         return f"[INERT_DATA]{text}[/INERT_DATA]"
 
-    def _sanitize_with_patterns(
-        self,
-        text: str,
-        regexes: List[re.Pattern],
-        flag_name: str,
-        flags: List[str],
-    ) -> str:
-        """
-        Apply a list of regexes to 'text', wrapping matches in inert tags.
-        Collect a flag if anything was changed.
-        """
-
-        def replacer(match: re.Match) -> str:
-            span = match.group(0)
-            return self._wrap_inert(span)
-
-        original = text
-        for rgx in regexes:
-            text = rgx.sub(replacer, text)
-
-        if text != original:
-            flags.append(flag_name)
-
-        return text
-
     def sanitize(self, user_input: str) -> Dict:
         """
         Main API for Layer 1.
@@ -108,24 +90,21 @@ class InversionFilter:
             # For safety, cast to string so the rest of the pipeline doesn't blow up
             user_input = str(user_input)
 
-        text = user_input
-        flags: List[str] = []
+        spans = self.matcher.find_spans(user_input)
 
-        # 1) Phrase-level jailbreak patterns
-        text = self._sanitize_with_patterns(
-            text,
-            self.phrase_regexes,
-            flag_name="phrase_jailbreak",
-            flags=flags,
-        )
+        # Flags keep their historical order: phrases first, then structure
+        found = {tag for _, _, tag in spans}
+        flags: List[str] = [f for f in ("phrase_jailbreak", "structural_abuse") if f in found]
 
-        # 2) Structural / delimiter / JSON / SYSTEM tricks
-        text = self._sanitize_with_patterns(
-            text,
-            self.structural_regexes,
-            flag_name="structural_abuse",
-            flags=flags,
-        )
+        # Wrap each merged span exactly once, rebuilding the string in one go
+        parts: List[str] = []
+        cursor = 0
+        for start, end in merge_spans(spans):
+            parts.append(user_input[cursor:start])
+            parts.append(self._wrap_inert(user_input[start:end]))
+            cursor = end
+        parts.append(user_input[cursor:])
+        text = "".join(parts)
 
         return {
             "sanitized_text": text,
@@ -139,8 +118,4 @@ class InversionFilter:
         Not used in the new pipeline, but kept so main.py doesn't break
         until you migrate to sanitize().
         """
-        merged = self.phrase_regexes + self.structural_regexes
-        for regex in merged:
-            if regex.search(user_input or ""):
-                return True
-        return False
\ No newline at end of file
+        return self.matcher.search(user_input or "")
\ No newline at end of file
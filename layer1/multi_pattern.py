@@ -0,0 +1,198 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Regex metacharacters that end a literal prefix
+_META = set(".^$*+?{}[]()|\\")
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Longest literal string every match of `pattern` must start with.
+
+    Leading \\b anchors are skipped (they are zero-width); the prefix stops
+    at the first class, group, wildcard or optional/repeated character.
+    Returns "" when no safe prefix exists (e.g. top-level alternation).
+    """
+    if _has_top_level_alternation(pattern):
+        return ""
+
+    out: List[str] = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 >= len(pattern):
+                break
+            nxt = pattern[i + 1]
+            if nxt == "b" and not out:
+                i += 2
+                continue
+            if nxt.isalnum():
+                break  # \s, \d, \w, \b mid-pattern, backrefs...
+            literal, step = nxt, 2
+        elif c == "{" and i == 0:
+            literal, step = c, 1  # a leading "{" cannot be a quantifier
+        elif c in _META:
+            break
+        else:
+            literal, step = c, 1
+
+        quantifier = pattern[i + step] if i + step < len(pattern) else ""
+        if quantifier in ("*", "?", "{"):
+            break  # this character may be absent or repeated
+        out.append(literal)
+        i += step
+        if quantifier == "+":
+            break
+    return "".join(out)
+
+
+def _trie_regex(words: List[str], marked: Optional[List[str]] = None) -> str:
+    """
+    Compile literal words into a trie-shaped alternation, so matching at a
+    position costs one branch per character instead of one per word.
+
+    With `marked`, each word ends in an empty capturing group and the words
+    are appended to `marked` in group order: `match.lastindex` then names
+    the word that matched, whatever case-insensitive spelling the text used.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict], path: str) -> str:
+        branches = [re.escape(ch) + build(child, path + ch) for ch, child in sorted(node.items()) if ch]
+        optional = "" in node
+        if marked is not None and optional:
+            marked.append(path)
+            branches.append("()")
+            optional = False
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie, "")
+
+
+class MultiPatternMatcher:
+    """
+    Finds every match of many tagged regexes in a single linear scan.
+
+    Each pattern is indexed by its literal prefix. One trigger regex built
+    from those prefixes (as a trie) walks the text once and stops only where
+    some prefix occurs; there, only the patterns sharing that prefix are
+    tried with `match`. Cost is one pass over the text plus the verified
+    candidates, so it stays flat as the pattern list grows. Patterns with no
+    literal prefix fall back to their own `finditer` pass.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, str]], flags: int = re.IGNORECASE):
+        """
+        patterns: (regex, tag) pairs; the tag is reported with each match.
+        """
+        self.flags = flags
+        self.compiled: List[Tuple[re.Pattern, str]] = []
+        self._buckets: Dict[str, List[Tuple[re.Pattern, str]]] = {}
+        self._fallback: List[Tuple[re.Pattern, str]] = []
+
+        indexed: List[Tuple[str, re.Pattern, str]] = []
+        for pattern, tag in patterns:
+            rgx = re.compile(pattern, flags)
+            self.compiled.append((rgx, tag))
+            prefix = literal_prefix(pattern)
+            if flags & re.IGNORECASE:
+                prefix = prefix.lower()
+            if prefix:
+                indexed.append((prefix, rgx, tag))
+            else:
+                self._fallback.append((rgx, tag))
+
+        # Trigger only on minimal prefixes: any longer prefix that extends a
+        # minimal one is checked whenever the minimal one fires.
+        prefixes = sorted({prefix for prefix, _, _ in indexed}, key=len)
+        minimal: List[str] = []
+        for prefix in prefixes:
+            if not any(prefix.startswith(m) for m in minimal):
+                minimal.append(prefix)
+
+        for prefix, rgx, tag in indexed:
+            owner = next(m for m in minimal if prefix.startswith(m))
+            self._buckets.setdefault(owner, []).append((rgx, tag))
+
+        # Minimal prefixes are never prefixes of each other, so at most one
+        # fires per position; a lookahead lets triggers overlap. The bucket
+        # is found from the group that matched, not from the matched text:
+        # IGNORECASE also matches Unicode case variants ("\u017f" for "s")
+        # that str.lower() does not map back to the prefix.
+        self._owners: List[str] = []
+        self._trigger = re.compile(f"(?={_trie_regex(minimal, self._owners)})", flags) if minimal else None
+
+    def find_spans(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        All (start, end, tag) matches, sorted by start. Matches may overlap.
+        """
+        spans: List[Tuple[int, int, str]] = []
+
+        if self._trigger is not None:
+            for trigger in self._trigger.finditer(text):
+                pos = trigger.start()
+                for rgx, tag in self._buckets[self._owners[trigger.lastindex - 1]]:
+                    m = rgx.match(text, pos)
+                    if m and m.end() > pos:
+                        spans.append((pos, m.end(), tag))
+
+        for rgx, tag in self._fallback:
+            for m in rgx.finditer(text):
+                if m.end() > m.start():
+                    spans.append((m.start(), m.end(), tag))
+
+        spans.sort()
+        return spans
+
+    def search(self, text: str) -> bool:
+        """True if any pattern matches anywhere in `text`."""
+        return bool(self.find_spans(text))
+
+
+def merge_spans(spans: List[Tuple[int, int, str]]) -> List[Tuple[int, int]]:
+    """
+    Merge overlapping (start-sorted) spans. Spans that only touch are kept
+    separate, matching what sequential per-pattern substitution produced.
+    """
+    merged: List[List[int]] = []
+    for start, end, _ in spans:
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
@@ -1,4 +1,18 @@
 # layer2/__init__.py
-from .intent_detector import detect_intent, analyzer
+from .intent_detector import (
+    detect_intent, detect_intent_batch, analyzer, warm_up, use_model,
+    enable_batching, disable_batching, batching_stats,
+    enable_cache, disable_cache, cache_stats,
+    enable_cascade, disable_cascade, cascade_stats,
+    enable_allowlist, disable_allowlist, allowlist_stats,
+    enable_signatures, disable_signatures, signature_stats,
+)
 
-__all__ = ["detect_intent", "analyzer"]
\ No newline at end of file
+__all__ = [
+    "detect_intent", "detect_intent_batch", "analyzer", "warm_up", "use_model",
+    "enable_batching", "disable_batching", "batching_stats",
+    "enable_cache", "disable_cache", "cache_stats",
+    "enable_cascade", "disable_cascade", "cascade_stats",
+    "enable_allowlist", "disable_allowlist", "allowlist_stats",
+    "enable_signatures", "disable_signatures", "signature_stats",
+]
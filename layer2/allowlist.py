@@ -0,0 +1,196 @@
+# layer2/allowlist.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .cascade import DATA_DIR, word_ngrams
+
+# Curated benign prompts (see data/safe_prompts_db.py)
+SAFE_PROMPTS_DB = os.path.join(DATA_DIR, "safe_prompts.db")
+
+# MinHash signature: NUM_BANDS bands of ROWS_PER_BAND hashes. A prompt is a
+# candidate for an entry when any band matches exactly; with 16x4 an entry
+# at Jaccard 0.7 is found 99% of the time, one at 0.3 about 12%.
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0x5AFE)
+_A = _rng.integers(1, _PRIME, size=(NUM_PERM, 1), dtype=np.int64)
+_B = _rng.integers(0, _PRIME, size=(NUM_PERM, 1), dtype=np.int64)
+_BAND_BYTES = ROWS_PER_BAND * 4
+
+
+class AllowlistMatch(NamedTuple):
+    id: int
+    category: str
+    similarity: float
+
+
+def shingles(text: str) -> FrozenSet[int]:
+    """crc32 of the word unigrams and bigrams of `text`."""
+    return frozenset(zlib.crc32(g.encode("utf-8")) for g in word_ngrams(text))
+
+
+def band_keys(grams: FrozenSet[int]) -> List[bytes]:
+    """One LSH key per band of the MinHash signature of `grams`."""
+    # crc32 < 2**32 and a < 2**31, so a*x + b fits in an int64
+    values = np.fromiter(grams, dtype=np.int64, count=len(grams))
+    signature = ((_A * values + _B) % _PRIME).min(axis=1).astype(np.uint32).tobytes()
+    return [signature[i:i + _BAND_BYTES] for i in range(0, len(signature), _BAND_BYTES)]
+
+
+class SafePromptAllowlist:
+    """
+    In-memory near-duplicate index over the safe_prompts table. match()
+    finds an entry whose word uni+bigram Jaccard similarity with the prompt
+    is at least `min_similarity`, through MinHash LSH buckets: a few dozen
+    microseconds, independent of the table size.
+
+    Rows are loaded by id; every `reload_interval_seconds` a background
+    thread fetches only the rows added since (id > last seen id). If rows
+    were deleted the index is rebuilt from scratch.
+    """
+
+    def __init__(self, db_path: str = SAFE_PROMPTS_DB, min_similarity: float = 0.7,
+                 reload_interval_seconds: Optional[float] = 30.0):
+        if not 0.0 < min_similarity <= 1.0:
+            raise ValueError(f"min_similarity must be in (0, 1], got {min_similarity}")
+        self.db_path = db_path
+        self.min_similarity = min_similarity
+        self.reload_interval_seconds = reload_interval_seconds
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reset()
+        self.queries = 0
+        self.hits = 0
+        self.reloads = 0
+        self.last_reload: Optional[float] = None
+        self.reload()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if reload_interval_seconds:
+            self._thread = threading.Thread(target=self._run, name="layer2-allowlist", daemon=True)
+            self._thread.start()
+
+    def _reset(self) -> None:
+        self._ids: List[int] = []
+        self._categories: List[str] = []
+        self._grams: List[FrozenSet[int]] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(NUM_BANDS)]
+        self._last_id = 0
+        self._rows = 0  # rows read, including ones without words
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _fetch(self, after_id: int) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """(row count, rows with id > after_id) of the table; (0, []) without a database."""
+        if not os.path.exists(self.db_path):
+            return 0, []
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM safe_prompts").fetchone()[0]
+            rows = conn.execute(
+                "SELECT id, text, category FROM safe_prompts WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return count, rows
+
+    def reload(self) -> int:
+        """Index rows added since the last call; returns how many were added."""
+        with self._reload_lock:
+            return self._reload()
+
+    def _reload(self) -> int:
+        try:
+            count, rows = self._fetch(self._last_id)
+            if count < self._rows + len(rows):
+                # Rows were deleted: start over
+                count, rows = self._fetch(0)
+                full = True
+            else:
+                full = False
+        except sqlite3.Error as e:
+            logging.warning(f"Layer 2 allowlist: could not read {self.db_path}: {e}")
+            return 0
+
+        entries = []
+        for row_id, text, category in rows:
+            grams = shingles(text or "")
+            if grams:
+                entries.append((row_id, category or "", grams, band_keys(grams)))
+
+        with self._lock:
+            if full:
+                self._reset()
+            for row_id, category, grams, keys in entries:
+                position = len(self._ids)
+                self._ids.append(row_id)
+                self._categories.append(category)
+                self._grams.append(grams)
+                for buckets, key in zip(self._buckets, keys):
+                    buckets.setdefault(key, []).append(position)
+            if rows:
+                self._last_id = max(self._last_id, rows[-1][0])
+            self._rows += len(rows)
+            self.reloads += 1
+            self.last_reload = time.time()
+        if entries:
+            logging.info(f"Layer 2 allowlist: indexed {len(entries)} safe prompts ({len(self._ids)} total)")
+        return len(entries)
+
+    def match(self, text: str) -> Optional[AllowlistMatch]:
+        """The most similar entry at or above min_similarity, or None."""
+        grams = shingles(text)
+        if not grams:
+            return None
+        keys = band_keys(grams)
+        best, best_similarity = -1, 0.0
+        with self._lock:
+            self.queries += 1
+            candidates = set()
+            for buckets, key in zip(self._buckets, keys):
+                positions = buckets.get(key)
+                if positions:
+                    candidates.update(positions)
+            for position in candidates:
+                other = self._grams[position]
+                shared = len(grams & other)
+                similarity = shared / (len(grams) + len(other) - shared)
+                if similarity > best_similarity:
+                    best, best_similarity = position, similarity
+            if best < 0 or best_similarity < self.min_similarity:
+                return None
+            self.hits += 1
+            return AllowlistMatch(self._ids[best], self._categories[best], best_similarity)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._ids),
+                "min_similarity": self.min_similarity,
+                "queries": self.queries,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.queries if self.queries else 0.0,
+                "reloads": self.reloads,
+                "last_reload": self.last_reload,
+            }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.reload_interval_seconds):
+            self.reload()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
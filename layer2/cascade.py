@@ -0,0 +1,172 @@
+# layer2/cascade.py
+import csv
+import logging
+import os
+import re
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .verdict_cache import normalize_text
+
+# Trained weights; built from TRAINING_FILES on first use when missing
+CASCADE_MODEL_PATH = "./models/intent_cascade.npz"
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+TRAINING_FILES = (
+    os.path.join(DATA_DIR, "intent_dataset.csv"),
+    os.path.join(DATA_DIR, "intent_dataset_balanced.csv"),
+)
+
+_WORD = re.compile(r"\w+")
+
+
+def word_ngrams(text: str) -> List[str]:
+    """Lower-cased word unigrams and bigrams of `text` (whitespace-normalised)."""
+    words = _WORD.findall(normalize_text(text).lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def load_training_rows(paths: Iterable[str] = TRAINING_FILES) -> List[Tuple[str, int]]:
+    """Distinct (text, label) rows of text,label CSVs; label 1 = ATTACK."""
+    csv.field_size_limit(10 * 1024 * 1024)
+    rows: Dict[str, int] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                text = (row.get("text") or "").strip()
+                # Fine-tuning leftovers: trailing "###" and wrapping quotes
+                if text.endswith("###"):
+                    text = text[:-3].strip()
+                text = text.strip('"').strip()
+                if text:
+                    rows[text] = int(row.get("label", "").strip() == "ATTACK")
+    return list(rows.items())
+
+
+class HashedNgramClassifier:
+    """
+    Logistic regression over hashed word unigrams and bigrams: a few dozen
+    microseconds per prompt, no tokenizer, no model download. Features are
+    crc32 hashes folded into 2**bits buckets, L2-normalised per prompt.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float):
+        self.weights = weights
+        self.bias = float(bias)
+        self.bits = int(np.log2(len(weights)))
+        self._mask = len(weights) - 1
+
+    def features(self, text: str) -> Tuple[np.ndarray, float]:
+        """(distinct bucket indexes, value of each) for `text`."""
+        grams = word_ngrams(text)
+        if not grams:
+            return np.zeros(0, dtype=np.int64), 0.0
+        mask = self._mask
+        indexes = np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) & mask for g in grams), dtype=np.int64, count=len(grams)))
+        return indexes, 1.0 / np.sqrt(len(indexes))
+
+    def score(self, text: str) -> float:
+        """Probability that `text` is an attack."""
+        indexes, value = self.features(text)
+        z = self.bias + value * float(self.weights[indexes].sum())
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    @classmethod
+    def train(cls, rows: Sequence[Tuple[str, int]], bits: int = 18, epochs: int = 6,
+              learning_rate: float = 0.5, l2: float = 1e-6, seed: int = 0) -> "HashedNgramClassifier":
+        """
+        Fit on (text, label) rows with per-sample AdaGrad; classes are
+        weighted inversely to their frequency.
+        """
+        model = cls(np.zeros(2 ** bits), 0.0)
+        encoded = [model.features(text) for text, _ in rows]
+        labels = np.array([label for _, label in rows], dtype=np.float64)
+        positives = max(labels.sum(), 1.0)
+        negatives = max(len(labels) - labels.sum(), 1.0)
+        class_weight = (len(labels) / (2 * negatives), len(labels) / (2 * positives))
+
+        squared = np.full(2 ** bits, 1e-8)
+        bias_squared = 1e-8
+        order = np.arange(len(rows))
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for i in order:
+                indexes, value = encoded[i]
+                w = model.weights[indexes]
+                z = model.bias + value * w.sum()
+                p = 1.0 / (1.0 + np.exp(-z))
+                g = (p - labels[i]) * class_weight[int(labels[i])]
+                grad = g * value + l2 * w
+                squared[indexes] += grad * grad
+                model.weights[indexes] = w - learning_rate * grad / np.sqrt(squared[indexes])
+                bias_squared += g * g
+                model.bias -= learning_rate * g / np.sqrt(bias_squared)
+        return model
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp, weights=self.weights.astype(np.float32), bias=np.array([self.bias]))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        with np.load(path) as data:
+            return cls(data["weights"].astype(np.float64), float(data["bias"][0]))
+
+    @classmethod
+    def load_or_train(cls, path: str = CASCADE_MODEL_PATH) -> "HashedNgramClassifier":
+        """The classifier saved at `path`, trained from TRAINING_FILES (and saved) if missing."""
+        if os.path.exists(path):
+            return cls.load(path)
+        logging.info(f"Layer 2 cascade: training the first stage from {', '.join(map(os.path.basename, TRAINING_FILES))}")
+        model = cls.train(load_training_rows())
+        model.save(path)
+        return model
+
+
+class IntentCascade:
+    """
+    First stage in front of the ONNX model: prompts the hashed n-gram
+    classifier scores below `low` or above `high` are decided with its
+    score; only the uncertain band in between reaches DeBERTa.
+    """
+
+    def __init__(self, classifier: HashedNgramClassifier, low: float = 0.02, high: float = 0.995):
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError(f"Cascade band must satisfy 0 <= low <= high <= 1, got ({low}, {high})")
+        self.classifier = classifier
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self.decided_benign = 0
+        self.decided_attack = 0
+        self.forwarded = 0
+
+    def decide(self, text: str) -> Optional[float]:
+        """The first-stage score if it is confident, else None (ask the model)."""
+        score = self.classifier.score(text)
+        with self._lock:
+            if score < self.low:
+                self.decided_benign += 1
+                return score
+            if score > self.high:
+                self.decided_attack += 1
+                return score
+            self.forwarded += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            screened = self.decided_benign + self.decided_attack + self.forwarded
+            return {
+                "band": [self.low, self.high],
+                "screened": screened,
+                "decided_benign": self.decided_benign,
+                "decided_attack": self.decided_attack,
+                "forwarded": self.forwarded,
+                "skip_fraction": (screened - self.forwarded) / screened if screened else 0.0,
+            }
@@ -1,11 +1,20 @@
 # layer2/intent_detector.py
 import os
+import hashlib
+import threading
+import time
 from optimum.onnxruntime import ORTModelForSequenceClassification
 from transformers import AutoTokenizer
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 import numpy as np
 
+from .allowlist import SAFE_PROMPTS_DB, SafePromptAllowlist
+from .cascade import CASCADE_MODEL_PATH, HashedNgramClassifier, IntentCascade
+from .micro_batcher import MicroBatcher, MicroBatcherClosed
+from .signatures import AttackSignatureIndex
+from .verdict_cache import VerdictCache
+
 # Prevent tokenizer parallelism warnings/deadlocks
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
@@ -15,49 +24,111 @@ class IntentStateAnalyzer:
     No training, no hardcoded rules — pure model inference.
     """
     MODEL_NAME = "ProtectAI/deberta-v3-base-prompt-injection-v2"  # Best accuracy
-    # For faster/smaller model, use: "ProtectAI/deberta-v3-small-prompt-injection-v2"
+    # Drop-in alternatives (same tokenizer family and labels); compare them
+    # with benchmarks/eval_layer2_variants.py before switching (use_model)
+    MODEL_VARIANTS = (
+        "ProtectAI/deberta-v3-base-prompt-injection-v2",
+        "ProtectAI/deberta-v3-small-prompt-injection-v2",
+    )
     ONNX_SUBFOLDER = "onnx"
     CACHE_DIR = "./models/onnx_cache"  # Keeps downloads inside your project
+    MAX_LENGTH = 512
+    # Inputs are padded up to the smallest bucket that fits, so attention
+    # cost follows the real prompt length instead of always paying for 512.
+    LENGTH_BUCKETS = (32, 64, 128, 256, 512)
+    # Longer inputs are scored as overlapping MAX_LENGTH-token windows,
+    # WINDOW_STRIDE tokens apart; the prompt scores its highest window.
+    # Each ONNX call takes up to WINDOWS_PER_CALL windows per prompt, head
+    # and tail first; with a stop_at threshold, the remaining windows are
+    # skipped once one passes it. MAX_WINDOWS covers 16000 tokens, Layer 3's
+    # max_input_length even at one token per character; longer inputs keep
+    # the first and last windows and as many as fit in between.
+    WINDOW_STRIDE = 384
+    WINDOWS_PER_CALL = 4
+    MAX_WINDOWS = 42
+    # Prompts longer than this (characters) likely span several windows
+    LONG_PROMPT_CHARS = 2000
 
-    def __init__(self):
-        logging.info("Loading Layer 2: ONNX DeBERTa-v3 prompt injection detector...")
+    def __init__(self, padding_strategy: str = "bucket", model_name: Optional[str] = None):
+        """
+        padding_strategy:
+            "bucket"     → pad each row to its length bucket (default)
+            "max_length" → legacy fixed 512-token padding
+        model_name: a specific model (e.g. one of MODEL_VARIANTS); by
+            default MODEL_NAME, followed when it changes (see is_stale)
+        """
+        if padding_strategy not in ("bucket", "max_length"):
+            raise ValueError(f"Unknown padding_strategy: {padding_strategy}")
+        self.padding_strategy = padding_strategy
+        self.follows_default = model_name is None
+        self.model_name = model_name or self.MODEL_NAME
+
+        logging.info(f"Loading Layer 2: ONNX prompt injection detector {self.model_name}...")
         
         self.tokenizer = AutoTokenizer.from_pretrained(
-            self.MODEL_NAME,
+            self.model_name,
             subfolder=self.ONNX_SUBFOLDER,
             cache_dir=self.CACHE_DIR,
             use_fast=True
         )
 
         self.model = ORTModelForSequenceClassification.from_pretrained(
-            self.MODEL_NAME,
+            self.model_name,
             subfolder=self.ONNX_SUBFOLDER,
             cache_dir=self.CACHE_DIR,
             provider="CPUExecutionProvider"  # Optimized for CPU (very fast with INT8)
         )
 
         self.session = self.model.model  # Raw ONNX session
+        self.fingerprint = self.model_fingerprint()
+        self.model_id = f"{self.model_name}@{self.fingerprint[:12]}"
         logging.info("Layer 2 ONNX model loaded successfully")
 
-    def analyze(self, prompt: str, threshold: float = 0.7) -> Dict[str, Any]:
+    @classmethod
+    def model_dir(cls, model_name: str) -> str:
+        """Where the hub cache keeps `model_name` inside CACHE_DIR."""
+        return os.path.join(cls.CACHE_DIR, "models--" + model_name.replace("/", "--"))
+
+    @classmethod
+    def cached_variants(cls) -> List[str]:
+        """MODEL_VARIANTS already downloaded into CACHE_DIR (loadable offline)."""
+        return [name for name in cls.MODEL_VARIANTS if os.path.isdir(cls.model_dir(name))]
+
+    def model_fingerprint(self) -> str:
         """
-        Analyze prompt for malicious intent.
-        Recommended thresholds:
-            0.6 → balanced
-            0.7 → strict but reasonable (good for demo)
-            0.8+ → very strict
+        Hash of (path, size, mtime) for every cached file of this model.
+        Changes whenever the model files on disk are replaced or updated.
         """
-        inputs = self.tokenizer(
-            prompt,
-            truncation=True,
-            max_length=512,
-            padding="max_length",
-            return_tensors="np"  # numpy arrays for ONNX
-        )
+        model_dir = self.model_dir(self.model_name)
+        digest = hashlib.sha1(self.model_name.encode("utf-8"))
+        for root, _, files in sorted(os.walk(model_dir)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                digest.update(f"{os.path.relpath(path, model_dir)}:{st.st_size}:{st.st_mtime_ns};".encode("utf-8"))
+        return digest.hexdigest()
 
+    def is_stale(self) -> bool:
+        """True when MODEL_NAME (if followed) or the model files changed since loading."""
+        if self.follows_default and self.MODEL_NAME != self.model_name:
+            return True
+        return self.model_fingerprint() != self.fingerprint
+
+    def bucket_for(self, length: int) -> int:
+        """Smallest length bucket that holds `length` tokens."""
+        for bucket in self.LENGTH_BUCKETS:
+            if length <= bucket:
+                return bucket
+        return self.MAX_LENGTH
+
+    def _run_session(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Run the ONNX model and return the malicious-class probability per row."""
         ort_inputs = {
-            "input_ids": inputs["input_ids"],
-            "attention_mask": inputs["attention_mask"]
+            "input_ids": input_ids,
+            "attention_mask": attention_mask
         }
 
         # Run inference
@@ -67,28 +138,490 @@ class IntentStateAnalyzer:
         # Softmax to get probabilities
         exp_logits = np.exp(logits - np.max(logits, axis=1, keepdims=True))
         probs = exp_logits / np.sum(exp_logits, axis=1, keepdims=True)
-        malicious_score = float(probs[0][1])  # Index 1 = malicious/injection class
+        return probs[:, 1]  # Index 1 = malicious/injection class
 
-        is_malicious = malicious_score > threshold
+    def warm_up(self, batch_sizes: Tuple[int, ...] = (1,)) -> None:
+        """
+        Run dummy inferences at every length bucket (and batch size) so ONNX
+        Runtime has allocated buffers and picked kernels before real traffic.
+        """
+        filler_id = self.tokenizer.convert_tokens_to_ids(self.tokenizer.tokenize("hello"))[0]
+        cls_id = self.tokenizer.cls_token_id
+        sep_id = self.tokenizer.sep_token_id
+        for length in self.LENGTH_BUCKETS:
+            row = [cls_id] + [filler_id] * (length - 2) + [sep_id]
+            for batch_size in batch_sizes:
+                input_ids = np.array([row] * batch_size, dtype=np.int64)
+                self._run_session(input_ids, np.ones_like(input_ids))
+        # Shape of one windowed long prompt
+        row = [cls_id] + [filler_id] * (self.MAX_LENGTH - 2) + [sep_id]
+        input_ids = np.array([row] * self.WINDOWS_PER_CALL, dtype=np.int64)
+        self._run_session(input_ids, np.ones_like(input_ids))
+        logging.info(f"Layer 2 warm-up done (lengths={self.LENGTH_BUCKETS}, batch_sizes={batch_sizes})")
 
-        return {
-            "is_malicious": bool(is_malicious),
-            "score": float(malicious_score),
-            "threshold": threshold,
-            "label": "injection-detected" if is_malicious else "benign"
-        }
+    def windows(self, ids: List[int]) -> List[List[int]]:
+        """
+        [CLS] window [SEP] rows covering the token ids `ids` (no special
+        tokens): one row when it fits, else overlapping windows, head and
+        tail first, then the middle in order.
+        """
+        size = self.MAX_LENGTH - 2
+        cls_id, sep_id = self.tokenizer.cls_token_id, self.tokenizer.sep_token_id
+        if len(ids) <= size:
+            return [[cls_id] + ids + [sep_id]]
+        starts = list(range(0, len(ids) - size, self.WINDOW_STRIDE)) + [len(ids) - size]
+        starts = [starts[0], starts[-1]] + starts[1:-1][:self.MAX_WINDOWS - 2]
+        return [[cls_id] + ids[start:start + size] + [sep_id] for start in starts]
+
+    def _score_rows(self, rows: List[List[int]]) -> List[float]:
+        """
+        Malicious probability of each token row (at most MAX_LENGTH ids).
+        With bucket padding, rows are grouped by length bucket and each group
+        runs as one batch padded only to its bucket size.
+        """
+        groups: Dict[int, List[int]] = {}
+        for idx, ids in enumerate(rows):
+            width = self.MAX_LENGTH if self.padding_strategy == "max_length" else self.bucket_for(len(ids))
+            groups.setdefault(width, []).append(idx)
+
+        scores = [0.0] * len(rows)
+        pad_id = self.tokenizer.pad_token_id or 0
+        for width, indices in groups.items():
+            input_ids = np.full((len(indices), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(indices), width), dtype=np.int64)
+            for row, idx in enumerate(indices):
+                ids = rows[idx]
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+
+            probs = self._run_session(input_ids, attention_mask)
+            for row, idx in enumerate(indices):
+                scores[idx] = float(probs[row])
+        return scores
+
+    def score_batch(self, prompts: List[str], stop_at: Optional[float] = None) -> List[float]:
+        """
+        Score several prompts with as few ONNX forward passes as possible.
+        Returns the malicious-class probability for each prompt, in order:
+        the highest of its windows (see windows).
+
+        Prompts of one window take a single pass. Longer ones add a pass per
+        WINDOWS_PER_CALL further windows, skipped once the prompt's score is
+        above `stop_at` (the caller's block threshold).
+        """
+        return self.score_windows(prompts, stop_at)[0]
+
+    def score_windows(self, prompts: List[str], stop_at: Optional[float] = None) -> Tuple[List[float], List[bool]]:
+        """
+        score_batch, plus whether every window of each prompt was scored.
+        A prompt that stopped early scores above `stop_at` but may score
+        higher still: its score is a lower bound, not worth caching.
+        """
+        encoded = self.tokenizer(prompts, add_special_tokens=False, truncation=False, padding=False, verbose=False)
+        pending = [self.windows(ids) for ids in encoded["input_ids"]]
+
+        scores = [0.0] * len(prompts)
+        complete = [True] * len(prompts)
+        active = list(range(len(prompts)))
+        offset = 0
+        while active:
+            rows, owners = [], []
+            for idx in active:
+                chunk = pending[idx][offset:offset + self.WINDOWS_PER_CALL]
+                rows.extend(chunk)
+                owners.extend([idx] * len(chunk))
+            for idx, prob in zip(owners, self._score_rows(rows)):
+                scores[idx] = max(scores[idx], prob)
+            offset += self.WINDOWS_PER_CALL
+            remaining, active = [idx for idx in active if len(pending[idx]) > offset], []
+            for idx in remaining:
+                if stop_at is not None and scores[idx] > stop_at:
+                    complete[idx] = False
+                else:
+                    active.append(idx)
+        return scores, complete
+
+    def analyze(self, prompt: str, threshold: float = 0.7) -> Dict[str, Any]:
+        """
+        Analyze prompt for malicious intent.
+        Recommended thresholds:
+            0.6 → balanced
+            0.7 → strict but reasonable (good for demo)
+            0.8+ → very strict
+        """
+        malicious_score = self.score_batch([prompt])[0]
+        return build_verdict(malicious_score, threshold)
+
+
+def build_verdict(malicious_score: float, threshold: float) -> Dict[str, Any]:
+    """Turn a raw malicious score into the Layer 2 verdict dict."""
+    is_malicious = malicious_score > threshold
+
+    return {
+        "is_malicious": bool(is_malicious),
+        "score": float(malicious_score),
+        "threshold": threshold,
+        "label": "injection-detected" if is_malicious else "benign"
+    }
 
 
 # Lazy-initialized singleton to avoid heavy imports at module load time
 # The model will be loaded on first use (safer for starting the Flask dev server)
 analyzer = None
 
+# Optional micro-batching front-end (see enable_batching)
+batcher: Optional[MicroBatcher] = None
+# Longest a detect_intent call waits on the batcher (seconds)
+batch_timeout_seconds = 10.0
+
+# Optional score cache (see enable_cache)
+verdict_cache: Optional[VerdictCache] = None
+
+# Optional first-stage classifier (see enable_cascade)
+cascade: Optional[IntentCascade] = None
+
+# Optional near-duplicate allowlist of curated safe prompts (see enable_allowlist)
+allowlist: Optional[SafePromptAllowlist] = None
+# "skip": allowlisted prompts score ALLOWLIST_SCORE without inference;
+# "downweight": their score is shifted down by allowlist_margin (see _downweight)
+ALLOWLIST_MODES = ("skip", "downweight")
+ALLOWLIST_SCORE = 0.0
+allowlist_mode = "downweight"
+allowlist_margin = 0.5
+
+# Optional nearest-known-attack index (see enable_signatures); blocked
+# matches score SIGNATURE_SCORE without inference
+signatures: Optional[AttackSignatureIndex] = None
+SIGNATURE_SCORE = 1.0
+
+# How often (seconds) detect_intent checks whether the model changed on disk
+MODEL_CHECK_INTERVAL = 30.0
+_last_model_check = 0.0
+# Guards the first load, the check schedule and the swap after a reload
+_analyzer_lock = threading.Lock()
+_reloading = False
+
 
 def _get_analyzer() -> IntentStateAnalyzer:
-    global analyzer
-    if analyzer is None:
-        analyzer = IntentStateAnalyzer()
-    return analyzer
+    """
+    The loaded model. Every MODEL_CHECK_INTERVAL seconds one background
+    thread checks it for staleness and loads its replacement; callers keep
+    the current model until the new one is ready.
+    """
+    global analyzer, _last_model_check, _reloading
+    current = analyzer
+    if current is None:
+        with _analyzer_lock:
+            if analyzer is None:
+                analyzer = IntentStateAnalyzer()
+                _last_model_check = time.monotonic()
+            return analyzer
+    if time.monotonic() - _last_model_check > MODEL_CHECK_INTERVAL:
+        with _analyzer_lock:
+            if not _reloading and time.monotonic() - _last_model_check > MODEL_CHECK_INTERVAL:
+                _last_model_check = time.monotonic()
+                _reloading = True
+                threading.Thread(target=_reload_if_stale, args=(current,),
+                                 name="layer2-model-reload", daemon=True).start()
+    return current
+
+
+def _reload_if_stale(current: IntentStateAnalyzer) -> None:
+    global analyzer, _reloading
+    try:
+        if current.is_stale():
+            logging.warning("Layer 2 model changed on disk or MODEL_NAME changed; reloading in the background")
+            fresh = IntentStateAnalyzer(padding_strategy=current.padding_strategy,
+                                        model_name=None if current.follows_default else current.model_name)
+            fresh.warm_up()
+            with _analyzer_lock:
+                if analyzer is current:
+                    analyzer = fresh
+            logging.info(f"Layer 2 now serving {fresh.model_id}")
+    except Exception:
+        logging.exception("Layer 2 model reload failed; keeping the loaded model")
+    finally:
+        with _analyzer_lock:
+            _reloading = False
+
+
+def use_model(model_name: str) -> None:
+    """
+    Serve `model_name` (e.g. one of IntentStateAnalyzer.MODEL_VARIANTS)
+    from now on; it is loaded in the background at the next staleness
+    check and replaces the current model once ready.
+    """
+    IntentStateAnalyzer.MODEL_NAME = model_name
+
+
+def _score_batch(prompts: List[str]) -> List[float]:
+    return _get_analyzer().score_batch(prompts)
+
+
+def warm_up(batch_sizes: Tuple[int, ...] = (1,)) -> None:
+    """Load the model now (instead of on first request) and warm it up."""
+    _get_analyzer().warm_up(batch_sizes=batch_sizes)
+
+
+def enable_batching(max_batch_size: int = 16, max_wait_ms: float = 5.0, timeout_seconds: float = 10.0) -> MicroBatcher:
+    """
+    Route detect_intent through a MicroBatcher so concurrent callers share
+    one ONNX batch; each call waits at most `timeout_seconds` for its score.
+    Calling it again replaces the batcher with new knobs; calls caught on
+    the old one fall back to direct inference.
+    """
+    global batcher, batch_timeout_seconds
+    old = batcher
+    batcher = MicroBatcher(_score_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    batch_timeout_seconds = timeout_seconds
+    if old is not None:
+        old.close()
+    return batcher
+
+
+def disable_batching() -> None:
+    """Go back to one session.run per detect_intent call."""
+    global batcher
+    if batcher is not None:
+        batcher.close()
+        batcher = None
+
+
+def batching_stats() -> Dict[str, Any]:
+    """Achieved batch-size distribution (empty when batching is disabled)."""
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+
+def enable_cache(max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 600.0) -> VerdictCache:
+    """
+    Put a bounded LRU+TTL score cache in front of detect_intent.
+    """
+    global verdict_cache
+    verdict_cache = VerdictCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    return verdict_cache
+
+
+def disable_cache() -> None:
+    global verdict_cache
+    verdict_cache = None
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters (empty when the cache is disabled)."""
+    if verdict_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **verdict_cache.stats()}
+
+
+def enable_cascade(model_path: str = CASCADE_MODEL_PATH, low: float = 0.02, high: float = 0.995) -> IntentCascade:
+    """
+    Put the hashed n-gram first stage in front of the model: scores below
+    `low` or above `high` are final, the band in between goes to DeBERTa.
+    Trains (and saves) the first stage from the bundled datasets if
+    `model_path` does not exist yet.
+    """
+    global cascade
+    cascade = IntentCascade(HashedNgramClassifier.load_or_train(model_path), low=low, high=high)
+    return cascade
+
+
+def disable_cascade() -> None:
+    global cascade
+    cascade = None
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """How much traffic the first stage decided (empty when the cascade is disabled)."""
+    if cascade is None:
+        return {"enabled": False}
+    return {"enabled": True, **cascade.stats()}
+
+
+def enable_allowlist(db_path: str = SAFE_PROMPTS_DB, min_similarity: float = 0.7, mode: str = "downweight",
+                     margin: float = 0.5, reload_interval_seconds: Optional[float] = 30.0) -> SafePromptAllowlist:
+    """
+    Check prompts against the safe_prompts table first: a near-duplicate
+    (word n-gram Jaccard >= `min_similarity`) of a curated safe prompt is
+    either not scored at all (`mode="skip"`) or scored against thresholds
+    raised by `margin` of their headroom (`mode="downweight"`): a threshold
+    t becomes t + margin * (1 - t), so a confident attack that copies a safe
+    prompt is still blocked. Rows added to the table are picked up within
+    `reload_interval_seconds`, without a restart.
+    """
+    global allowlist, allowlist_mode, allowlist_margin
+    if mode not in ALLOWLIST_MODES:
+        raise ValueError(f"Allowlist mode must be one of {ALLOWLIST_MODES}, got {mode!r}")
+    if not 0.0 <= margin < 1.0:
+        raise ValueError(f"Allowlist margin must be in [0, 1), got {margin!r}")
+    if allowlist is not None:
+        allowlist.close()
+    allowlist_mode, allowlist_margin = mode, margin
+    allowlist = SafePromptAllowlist(db_path, min_similarity=min_similarity, reload_interval_seconds=reload_interval_seconds)
+    return allowlist
+
+
+def disable_allowlist() -> None:
+    global allowlist
+    if allowlist is not None:
+        allowlist.close()
+        allowlist = None
+
+
+def allowlist_stats() -> Dict[str, Any]:
+    """Index size and hit counters (empty when the allowlist is disabled)."""
+    if allowlist is None:
+        return {"enabled": False}
+    return {"enabled": True, "mode": allowlist_mode, "margin": allowlist_margin, **allowlist.stats()}
+
+
+def enable_signatures(block_similarity: float = 0.6, tag_similarity: float = 0.4) -> AttackSignatureIndex:
+    """
+    Match prompts against the known attacks of the bundled datasets before
+    anything else: a prompt at `block_similarity` (TF-IDF cosine) or above
+    is blocked without inference; from `tag_similarity` the verdict carries
+    the nearest attack's "technique" and "signature_similarity".
+    """
+    global signatures
+    signatures = AttackSignatureIndex.from_datasets(block_similarity=block_similarity, tag_similarity=tag_similarity)
+    return signatures
+
+
+def disable_signatures() -> None:
+    global signatures
+    signatures = None
+
+
+def signature_stats() -> Dict[str, Any]:
+    """Index size and match counters (empty when the index is disabled)."""
+    if signatures is None:
+        return {"enabled": False}
+    return {"enabled": True, **signatures.stats()}
+
+
+def _with_signature(verdict: Dict[str, Any], match) -> Dict[str, Any]:
+    if match is not None:
+        verdict["technique"] = match.technique
+        verdict["signature_similarity"] = match.similarity
+    return verdict
+
+
+def _downweight(score: float) -> float:
+    """
+    Allowlisted score: passes a threshold t exactly when the raw score
+    passes t + allowlist_margin * (1 - t), which stays below 1.
+    """
+    return max(0.0, (score - allowlist_margin) / (1.0 - allowlist_margin))
+
+
+def _raised(threshold: Optional[float]) -> Optional[float]:
+    """Raw score an allowlisted prompt needs to reach `threshold`."""
+    return None if threshold is None else threshold + allowlist_margin * (1.0 - threshold)
+
+
+def _score(prompt: str, stop_at: Optional[float] = None) -> float:
+    """
+    Malicious score for one prompt: allowlist → cascade → cache → batcher →
+    direct inference. Windowed long prompts stop once above `stop_at`; their
+    score is then a lower bound (still above `stop_at`) and is not cached.
+    """
+    if allowlist is not None and allowlist.match(prompt) is not None:
+        if allowlist_mode == "skip":
+            return ALLOWLIST_SCORE
+        return _downweight(_score_model(prompt, _raised(stop_at)))
+    return _score_model(prompt, stop_at)
+
+
+def _score_model(prompt: str, stop_at: Optional[float] = None) -> float:
+    if cascade is not None:
+        decided = cascade.decide(prompt)
+        if decided is not None:
+            return decided
+
+    current = _get_analyzer()
+    cache = verdict_cache
+
+    key = None
+    if cache is not None:
+        cache.bind_model(current.model_id)
+        key = cache.make_key(prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    # Long prompts are a multi-window batch of their own and can exit early
+    complete = True
+    score = None
+    current_batcher = batcher
+    if current_batcher is not None and len(prompt) <= current.LONG_PROMPT_CHARS:
+        try:
+            score = current_batcher.score(prompt, timeout=batch_timeout_seconds)
+        except MicroBatcherClosed:
+            pass  # replaced or disabled under us: score it directly below
+    if score is None:
+        (score,), (complete,) = current.score_windows([prompt], stop_at=stop_at)
+
+    # An early-exit score only holds for thresholds up to stop_at
+    if cache is not None and complete:
+        cache.put(key, score)
+    return score
+
+
+def detect_intent_batch(prompts: List[str], threshold: float = 0.7, batch_size: int = 32) -> List[Dict[str, Any]]:
+    """
+    Score many prompts at once (bulk screening). Known attacks are matched
+    in one sparse product; allowlisted prompts are skipped or down-weighted,
+    prompts the cascade decides and cached scores are reused; the rest are
+    sorted by length so each ONNX batch shares a length bucket, then scored
+    `batch_size` rows at a time. Verdicts come back in input order.
+    """
+    matches = signatures.match_batch(prompts) if signatures is not None else [None] * len(prompts)
+    scores = [SIGNATURE_SCORE] * len(prompts)
+    rest = [idx for idx, match in enumerate(matches) if match is None or not match.blocked]
+    for idx, score in zip(rest, _score_many([prompts[i] for i in rest], batch_size, threshold)):
+        scores[idx] = score
+    return [_with_signature(build_verdict(score, threshold), match) for score, match in zip(scores, matches)]
+
+
+def _score_many(prompts: List[str], batch_size: int, stop_at: Optional[float] = None) -> List[float]:
+    scores: List[Optional[float]] = [None] * len(prompts)
+    keys: List[Optional[bytes]] = [None] * len(prompts)
+    downweighted = [False] * len(prompts)
+    if allowlist is not None:
+        for idx, prompt in enumerate(prompts):
+            if allowlist.match(prompt) is not None:
+                if allowlist_mode == "skip":
+                    scores[idx] = ALLOWLIST_SCORE
+                else:
+                    downweighted[idx] = True
+    if cascade is not None:
+        scores = [cascade.decide(prompt) if score is None else score for prompt, score in zip(prompts, scores)]
+    if all(score is not None for score in scores):
+        return [_downweight(score) if down else score for score, down in zip(scores, downweighted)]
+
+    current = _get_analyzer()
+    cache = verdict_cache
+    if cache is not None:
+        cache.bind_model(current.model_id)
+        for idx, prompt in enumerate(prompts):
+            if scores[idx] is None:
+                keys[idx] = cache.make_key(prompt)
+                scores[idx] = cache.get(keys[idx])
+
+    # Down-weighted prompts need a higher raw score to pass the threshold
+    if any(downweighted):
+        stop_at = _raised(stop_at)
+    missing = sorted((idx for idx, score in enumerate(scores) if score is None), key=lambda i: len(prompts[i]))
+    for start in range(0, len(missing), batch_size):
+        indices = missing[start:start + batch_size]
+        batch_scores, complete = current.score_windows([prompts[i] for i in indices], stop_at=stop_at)
+        for idx, score, whole in zip(indices, batch_scores, complete):
+            scores[idx] = score
+            if cache is not None and whole:
+                cache.put(keys[idx], score)
+
+    return [_downweight(score) if down else score for score, down in zip(scores, downweighted)]
 
 
 # Convenience function for other parts of the code
@@ -97,4 +630,6 @@ def detect_intent(prompt: str, threshold: float = 0.7) -> Dict[str, Any]:
     Main function to call from main.py or other layers
     This will initialize the ONNX model on first call rather than at import time.
     """
-    return _get_analyzer().analyze(prompt, threshold)
\ No newline at end of file
+    match = signatures.match(prompt) if signatures is not None else None
+    score = SIGNATURE_SCORE if match is not None and match.blocked else _score(prompt, stop_at=threshold)
+    return _with_signature(build_verdict(score, threshold), match)
@@ -0,0 +1,192 @@
+# layer2/micro_batcher.py
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcherClosed(RuntimeError):
+    """The batcher was closed before the prompt could be scored."""
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching front-end for Layer 2 inference.
+
+    Concurrent callers submit single prompts; a background worker collects
+    them for up to `max_wait_ms` milliseconds or `max_batch_size` items,
+    scores them with ONE call to `score_fn`, and fans the per-row scores
+    back to each caller through a Future.
+
+    `score_fn` takes a list of prompts and returns one malicious score per
+    prompt, in the same order (see IntentStateAnalyzer.score_batch).
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[List[str]], List[float]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        # Guards _closed against submit(): nothing is queued behind _STOP
+        self._submit_lock = threading.Lock()
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._run, name="layer2-micro-batcher", daemon=True
+        )
+        self._worker.start()
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def submit(self, prompt: str) -> Future:
+        """
+        Queue a prompt for scoring. The Future resolves to its malicious score,
+        or fails with MicroBatcherClosed if the batcher stops first.
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise MicroBatcherClosed("MicroBatcher is closed")
+            self._queue.put((prompt, future))
+        return future
+
+    def score(self, prompt: str, timeout: Optional[float] = None) -> float:
+        """
+        Blocking helper: submit a prompt and wait for its score. On timeout
+        the request is cancelled (skipped if its batch has not started).
+        """
+        future = self.submit(prompt)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Achieved batch-size distribution, so latency/throughput can be tuned.
+        """
+        with self._stats_lock:
+            distribution = dict(sorted(self._batch_sizes.items()))
+
+        batches = sum(distribution.values())
+        requests = sum(size * count for size, count in distribution.items())
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": batches,
+            "requests": requests,
+            "mean_batch_size": (requests / batches) if batches else 0.0,
+            "batch_size_distribution": distribution,
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """
+        Stop the worker after the requests already queued have been served.
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout=timeout)
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def _collect(self, first: Tuple[str, Future]) -> Tuple[List[Tuple[str, Future]], bool]:
+        """
+        Gather more requests until the batch is full or the wait budget runs out.
+        Returns (batch, stop_requested).
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    # Budget spent: still take whatever is already waiting
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        # Drop requests whose callers already gave up
+        live = [(p, f) for p, f in batch if f.set_running_or_notify_cancel()]
+        if not live:
+            return
+
+        try:
+            scores = [float(score) for score in self.score_fn([p for p, _ in live])]
+            if len(scores) != len(live):
+                # Rows cannot be matched to prompts; never leave a caller waiting
+                raise RuntimeError(f"score_fn returned {len(scores)} scores for {len(live)} prompts")
+        except Exception as e:
+            logger.error(f"Layer 2 batch inference failed: {e}")
+            for _, future in live:
+                future.set_exception(e)
+            return
+
+        for (_, future), score in zip(live, scores):
+            future.set_result(score)
+
+        with self._stats_lock:
+            self._batch_sizes[len(live)] += 1
+
+    def _run(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+
+                batch, stop = self._collect(item)
+                self._run_batch(batch)
+                if stop:
+                    return
+        finally:
+            self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        """Worker is gone: refuse new requests and fail every queued one."""
+        with self._submit_lock:
+            self._closed = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(MicroBatcherClosed("MicroBatcher closed before the prompt was scored"))
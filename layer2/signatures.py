@@ -0,0 +1,199 @@
+# layer2/signatures.py
+import csv
+import os
+import re
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cascade import DATA_DIR, TRAINING_FILES, word_ngrams
+
+try:
+    import scipy.sparse as sp
+except ImportError:  # Optional: without scipy there is no signature index
+    sp = None
+
+ADVERSARIAL_FILE = os.path.join(DATA_DIR, "adversarial_dataset_with_techniques.csv")
+INTENT_FILE = TRAINING_FILES[0]
+
+# Leading list numbering ("1. ") or label ("Adversarial Prompt: ")
+_NUMBERING = re.compile(r"^(?:\d+\.\s*|(?:adversarial\s+)?prompt\s*:\s*)", re.IGNORECASE)
+
+
+def available() -> bool:
+    return sp is not None
+
+
+def clean_attack(text: str) -> str:
+    """
+    The attack prompt itself: drops the generator's preamble paragraph
+    ("Certainly! Here's a personalized adversarial prompt ...:"), list
+    numbering and labels, wrapping quotes and fine-tuning "###" markers.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text.strip())]
+    while len(paragraphs) > 1 and (paragraphs[0].endswith(":") or not paragraphs[0].strip("-")):
+        paragraphs.pop(0)
+    text = "\n\n".join(paragraphs)
+    previous = None
+    while text != previous:
+        previous = text
+        text = _NUMBERING.sub("", text.strip().strip('"').removesuffix("###").strip())
+    return text
+
+
+class SignatureRow(NamedTuple):
+    text: str
+    technique: Optional[str]
+    # The benign query the attack was built from ("" if unknown)
+    source: str = ""
+
+
+def load_signature_rows(adversarial_path: str = ADVERSARIAL_FILE,
+                        intent_path: str = INTENT_FILE) -> List[SignatureRow]:
+    """
+    Distinct attack rows: the persuasive prompts of the adversarial dataset
+    with their technique and source queries (original and variant), then
+    the ATTACK rows of the intent dataset not already among them.
+    """
+    csv.field_size_limit(10 * 1024 * 1024)
+    rows: Dict[str, SignatureRow] = {}
+    with open(adversarial_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            text = clean_attack(row.get("persuasive_prompt") or "")
+            if text and text not in rows:
+                source = "\n".join(clean_attack(row.get(column) or "") for column in ("original_query", "variant_query"))
+                rows[text] = SignatureRow(text, (row.get("technique") or "").strip() or None, source)
+    with open(intent_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("label", "").strip() == "ATTACK":
+                text = clean_attack(row.get("text") or "")
+                if text and text not in rows:
+                    rows[text] = SignatureRow(text, None)
+    return list(rows.values())
+
+
+class SignatureMatch(NamedTuple):
+    similarity: float
+    technique: Optional[str]
+    blocked: bool
+
+
+class AttackSignatureIndex:
+    """
+    Nearest known attack by TF-IDF cosine similarity over hashed word
+    unigrams and bigrams. The attacks are stored as one sparse matrix
+    (features x attacks), so a batch of prompts is matched with a single
+    sparse product whose cost follows the postings of the prompts' own
+    features, not the corpus size.
+
+    A signature keeps only what the attack adds to the benign query it was
+    built from (row.source): most dataset attacks are a customer query
+    wrapped in a persuasion sentence, and matching on the query part would
+    flag the plain query. Features in more than `max_df` of the signatures
+    are dropped from the postings (they still count in the norms).
+
+    Matches at `block_similarity` or above are final (blocked); matches at
+    `tag_similarity` or above only report the nearest technique.
+    """
+
+    def __init__(self, rows: Sequence[SignatureRow], block_similarity: float = 0.6,
+                 tag_similarity: float = 0.4, bits: int = 20, max_df: float = 0.5):
+        if not available():
+            raise RuntimeError("The attack signature index needs scipy")
+        if not 0.0 < tag_similarity <= block_similarity <= 1.0:
+            raise ValueError(f"Need 0 < tag_similarity <= block_similarity <= 1, got ({tag_similarity}, {block_similarity})")
+        self.block_similarity = block_similarity
+        self.tag_similarity = tag_similarity
+        self.techniques = [row.technique for row in rows]
+        self._mask = (1 << bits) - 1
+
+        hashed = []
+        for row in rows:
+            indexes, counts = self._hashed(row.text)
+            if row.source:
+                keep = ~np.isin(indexes, self._hashed(row.source)[0])
+                indexes, counts = indexes[keep], counts[keep]
+            hashed.append((indexes, counts))
+        df = np.zeros(1 << bits)
+        for indexes, _ in hashed:
+            df[indexes] += 1
+        n = max(len(rows), 1)
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        self._posted = df <= max_df * n
+        # Stored transposed: row f lists the attacks containing feature f
+        self.matrix = self._vectors(hashed, posted_only=True).T.tocsr()
+
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.tagged = 0
+        self.blocked = 0
+
+    @classmethod
+    def from_datasets(cls, **kwargs) -> "AttackSignatureIndex":
+        return cls(load_signature_rows(), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.techniques)
+
+    def _hashed(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(distinct feature indexes, count of each) of `text`."""
+        grams = word_ngrams(text)
+        mask = self._mask
+        indexes = np.fromiter((zlib.crc32(g.encode("utf-8")) & mask for g in grams), dtype=np.int64, count=len(grams))
+        return np.unique(indexes, return_counts=True)
+
+    def _vectors(self, hashed: Iterable[Tuple[np.ndarray, np.ndarray]], posted_only: bool = False) -> "sp.csr_matrix":
+        """L2-normalised sublinear TF-IDF rows (`posted_only`: without the unposted features)."""
+        indptr, indices, data = [0], [], []
+        for indexes, counts in hashed:
+            values = (1 + np.log(counts)) * self.idf[indexes]
+            norm = np.sqrt(np.dot(values, values))
+            if posted_only:
+                keep = self._posted[indexes]
+                indexes, values = indexes[keep], values[keep]
+            indices.append(indexes)
+            data.append(values / norm if norm else values)
+            indptr.append(indptr[-1] + len(indexes))
+        return sp.csr_matrix(
+            (np.concatenate(data or [np.zeros(0)]).astype(np.float32), np.concatenate(indices or [np.zeros(0, np.int64)]), indptr),
+            shape=(len(indptr) - 1, self._mask + 1),
+        )
+
+    def match_batch(self, texts: Sequence[str]) -> List[Optional[SignatureMatch]]:
+        """The nearest attack of each text at tag_similarity or above, else None."""
+        if not texts:
+            return []
+        similarities = self._vectors(self._hashed(text) for text in texts) @ self.matrix
+        matches: List[Optional[SignatureMatch]] = []
+        for start, end in zip(similarities.indptr[:-1], similarities.indptr[1:]):
+            if start == end:
+                matches.append(None)
+                continue
+            best = start + int(similarities.data[start:end].argmax())
+            score = float(similarities.data[best])
+            if score >= self.tag_similarity:
+                technique = self.techniques[similarities.indices[best]]
+                matches.append(SignatureMatch(score, technique, score >= self.block_similarity))
+            else:
+                matches.append(None)
+        with self._lock:
+            self.queries += len(texts)
+            self.tagged += sum(match is not None for match in matches)
+            self.blocked += sum(match is not None and match.blocked for match in matches)
+        return matches
+
+    def match(self, text: str) -> Optional[SignatureMatch]:
+        return self.match_batch([text])[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "signatures": len(self.techniques),
+                "thresholds": {"block": self.block_similarity, "tag": self.tag_similarity},
+                "queries": self.queries,
+                "tagged": self.tagged,
+                "blocked": self.blocked,
+                "block_fraction": self.blocked / self.queries if self.queries else 0.0,
+            }
@@ -0,0 +1,126 @@
+# layer2/verdict_cache.py
+import hashlib
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used for cache keys: NFC unicode, collapsed whitespace.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class VerdictCache:
+    """
+    Bounded LRU + TTL cache of Layer 2 malicious scores.
+
+    - Keyed on sha256(model id + normalized sanitized text), so a fixed-size
+      key stands in for arbitrarily long prompts.
+    - Stores the raw score, not the verdict: the threshold comparison happens
+      after the lookup, so one entry serves every `threshold` argument.
+    - Bounded by an approximate memory budget; least-recently-used entries
+      are evicted first. Expired entries are dropped lazily on lookup.
+    - bind_model() clears everything when the model id changes.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 600.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.model_id: Optional[str] = None
+
+        # key -> (score, monotonic time stored), least recently used first
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Keys and values are fixed-size, so every entry costs the same
+        self._entry_bytes = self._estimate_entry_bytes()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _estimate_entry_bytes() -> int:
+        key = hashlib.sha256(b"").digest()
+        value = (0.5, time.monotonic())
+        # OrderedDict keeps a dict slot plus a linked-list node per entry
+        node_overhead = 100
+        return sys.getsizeof(key) + sys.getsizeof(value) + 2 * sys.getsizeof(0.5) + node_overhead
+
+    @property
+    def max_entries(self) -> int:
+        return max(1, self.max_bytes // self._entry_bytes)
+
+    def make_key(self, text: str) -> bytes:
+        digest = hashlib.sha256()
+        digest.update((self.model_id or "").encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalize_text(text).encode("utf-8"))
+        return digest.digest()
+
+    def bind_model(self, model_id: str) -> None:
+        """
+        Tie cached scores to one model; a different id flushes the cache.
+        """
+        if model_id == self.model_id:
+            return
+        with self._lock:
+            if self.model_id is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_id = model_id
+
+    def get(self, key: bytes) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            score, stored_at = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: bytes, score: float) -> None:
+        with self._lock:
+            self._entries[key] = (float(score), time.monotonic())
+            self._entries.move_to_end(key)
+            limit = self.max_entries
+            while len(self._entries) > limit:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "model_id": self.model_id,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "approx_bytes": len(self._entries) * self._entry_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -18,7 +18,7 @@ class MathematicalArmor:
 
     def __init__(
         self,
-        max_input_length: int = 2000,
+        max_input_length: int = 16000,
         enable_defensive_tokens: bool = True,
     ):
         self.max_input_length = max_input_length
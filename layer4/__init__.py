@@ -1,4 +1,4 @@
 # layer4/__init__.py
-from .output_filter import filter_output, filter_instance
+from .output_filter import filter_output, filter_instance, StreamingOutputFilter
 
-__all__ = ["filter_output", "filter_instance"]
\ No newline at end of file
+__all__ = ["filter_output", "filter_instance", "StreamingOutputFilter"]
@@ -1,18 +1,97 @@
 # layer4/output_filter.py
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 class OutputFilter:
     """
     Layer 4: Egress Security - The Filter
     Scans LLM output for leaks and jailbreak success.
+
+    Every detector is compiled once. Secret and keyword patterns run against
+    one lower-cased copy of the response, so each stays on re's fast
+    literal-prefix search instead of a case-insensitive scan, and all
+    redactions are applied in a single rebuild of the string.
     """
+    # Both PII patterns start with a digit at a word boundary. Writing that
+    # as "\d(?<!\w\d)" rather than "\b\d" lets re skip straight from
+    # digit to digit instead of trying every position.
+    SSN_PATTERN = r'\d(?<!\w\d)\d{2}-\d{2}-\d{4}\b'
+    CC_PATTERN = r'\d(?<!\w\d)[ -]*?(?:\d[ -]*?){12,15}\b'   # basic pattern
+
+    # API Keys (common formats), written for lower-cased text
+    API_PATTERNS = [
+        r'sk-[a-z0-9]{32,}',                    # OpenAI
+        r'ghp_[a-z0-9]{36}',                    # GitHub
+        r'aws_access_key_id=[a-z0-9]{20}',
+        r'aws_secret_access_key=[a-z0-9/+=]{40}',
+        r'bearer\s+[a-z0-9\-_]{30,}',
+    ]
+
+    # Jailbreak Success / Harmful Instructions
+    HARMFUL_KEYWORDS = [
+        "ingredients", "precursors", "synthesis", "synthesize",
+        "build a bomb", "make explosives", "phishing attack", "how to hack",
+        "methamphetamine", "ricin", "sarin", "cyanide", "virus code"
+    ]
+    HARMFUL_PATTERNS = [
+        r"step.?by.?step",
+    ]
+
+    REPLACEMENTS = {
+        "ssn": "[REDACTED_SSN]",
+        "cc": "[REDACTED_CC]",
+        "api": "[REDACTED_API_KEY]",
+    }
+
     def __init__(self):
         self.name = "OutputFilter"
+        self.ssn_regex = re.compile(self.SSN_PATTERN)
+        self.cc_regex = re.compile(self.CC_PATTERN)
+        self.api_regexes = [re.compile(p) for p in self.API_PATTERNS]
+        self.harmful_regexes = [re.compile(p) for p in self.HARMFUL_PATTERNS]
+
+    @staticmethod
+    def _lowered(text: str) -> str:
+        """
+        Lower-cased copy with the same length, so match offsets line up
+        with the original. The rare characters whose lower case is longer
+        (e.g. "İ") are kept as they are.
+        """
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return lowered
+        return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+    @staticmethod
+    def _collect(rgx: re.Pattern, text: str, kind: str, spans: List[Tuple[int, int, str]]) -> bool:
+        """Append every match of `rgx` as a span to redact; True if any."""
+        before = len(spans)
+        spans.extend((m.start(), m.end(), kind) for m in rgx.finditer(text))
+        return len(spans) > before
 
-    def filter(self, response: str) -> Dict[str, any]:
+    def _redact(self, text: str, spans: List[Tuple[int, int, str]]) -> str:
+        """
+        Replace every span in one pass. Overlapping spans are merged and
+        take the replacement of the span that starts first.
+        """
+        parts: List[str] = []
+        cursor = 0
+        for start, end, kind in sorted(spans, key=lambda s: (s[0], -s[1])):
+            if start < cursor:
+                # Overlaps the span just redacted: extend it
+                cursor = max(cursor, end)
+                continue
+            parts.append(text[cursor:start])
+            parts.append(self.REPLACEMENTS[kind])
+            cursor = end
+        parts.append(text[cursor:])
+        return "".join(parts)
+
+    def filter(self, response: str, total_length: Optional[int] = None) -> Dict[str, any]:
         """
         Main filtering function.
+        total_length: length of the whole response when `response` is only a
+        window of it (streaming); used for the short-refusal exemption.
         Returns: {
             "safe": bool,
             "sanitized": str,
@@ -20,44 +99,31 @@ class OutputFilter:
         }
         """
         issues: List[str] = []
-        sanitized = response
+        spans: List[Tuple[int, int, str]] = []
+        lowered = self._lowered(response)
 
         # 1. PII: Social Security Numbers
-        ssn_pattern = r'\b\d{3}-\d{2}-\d{4}\b'
-        if re.search(ssn_pattern, response):
+        if self._collect(self.ssn_regex, response, "ssn", spans):
             issues.append("PII Detected: SSN")
-            sanitized = re.sub(ssn_pattern, "[REDACTED_SSN]", sanitized)
 
-        # 2. Credit Cards (basic pattern)
-        cc_pattern = r'\b(?:\d[ -]*?){13,16}\b'
-        if re.search(cc_pattern, response):
+        # 2. Credit Cards
+        if self._collect(self.cc_regex, response, "cc", spans):
             issues.append("Potential Credit Card Number")
-            sanitized = re.sub(cc_pattern, "[REDACTED_CC]", sanitized)
-
-        # 3. API Keys (common formats)
-        api_patterns = [
-            r'(?i)sk-[a-zA-Z0-9]{32,}',                  # OpenAI
-            r'(?i)ghp_[a-zA-Z0-9]{36}',                  # GitHub
-            r'(?i)aws_access_key_id=[A-Z0-9]{20}',
-            r'(?i)aws_secret_access_key=[A-Za-z0-9/+=]{40}',
-            r'(?i)Bearer\s+[a-zA-Z0-9\-_]{30,}',
-        ]
-        for pattern in api_patterns:
-            if re.search(pattern, response):
+
+        # 3. API Keys: one issue per matching format
+        for rgx in self.api_regexes:
+            if self._collect(rgx, lowered, "api", spans):
                 issues.append("API Key Leak")
-                sanitized = re.sub(pattern, "[REDACTED_API_KEY]", sanitized)
 
         # 4. Jailbreak Success / Harmful Instructions
-        harmful_indicators = [
-            "step.?by.?step", "ingredients", "precursors", "synthesis", "synthesize",
-            "build a bomb", "make explosives", "phishing attack", "how to hack",
-            "methamphetamine", "ricin", "sarin", "cyanide", "virus code"
-        ]
-        lower_resp = response.lower()
-        if any(indicator in lower_resp for indicator in harmful_indicators):
-            if len(response) > 150:  # Avoid flagging short refusals
+        if any(keyword in lowered for keyword in self.HARMFUL_KEYWORDS) or any(
+            rgx.search(lowered) for rgx in self.harmful_regexes
+        ):
+            if (total_length or len(response)) > 150:  # Avoid flagging short refusals
                 issues.append("Potential Harmful Instructions")
 
+        sanitized = self._redact(response, spans) if spans else response
+
         # Final verdict
         is_safe = len(issues) == 0
 
@@ -67,6 +133,79 @@ class OutputFilter:
             "issues": issues
         }
 
+
+class StreamingOutputFilter:
+    """
+    Incremental Layer 4 for streamed LLM output.
+
+    feed() scans a sliding window made of the tail of already-released text
+    plus everything not yet released, and only releases text that is at
+    least `holdback` characters behind the end of the stream. A match split
+    across chunk boundaries is therefore seen whole before any of it leaves.
+    After the first issue nothing more is released; callers should stop
+    generation (see `blocked`).
+    """
+
+    def __init__(self, output_filter: Optional[OutputFilter] = None, window: int = 256, holdback: int = 128):
+        self.output_filter = output_filter or filter_instance
+        self.window = window
+        self.holdback = holdback
+
+        self.issues: List[str] = []
+        self.total_length = 0
+        self._context = ""   # tail of released text, kept for split matches
+        self._pending = ""   # received but not yet released
+
+    @property
+    def blocked(self) -> bool:
+        return bool(self.issues)
+
+    def _scan(self) -> None:
+        result = self.output_filter.filter(self._context + self._pending, total_length=self.total_length)
+        for issue in result["issues"]:
+            if issue not in self.issues:
+                self.issues.append(issue)
+
+    def _release(self, upto: int) -> str:
+        released = self._pending[:upto]
+        self._pending = self._pending[upto:]
+        self._context = (self._context + released)[-self.window:]
+        return released
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk; return the text that is now safe to forward ("" if none).
+        """
+        if self.blocked:
+            return ""
+        self._pending += chunk
+        self.total_length += len(chunk)
+
+        self._scan()
+        if self.blocked:
+            return ""
+        return self._release(max(0, len(self._pending) - self.holdback))
+
+    def finish(self) -> str:
+        """
+        End of stream: scan once more and release the held-back tail.
+        """
+        if self.blocked:
+            return ""
+        self._scan()
+        if self.blocked:
+            return ""
+        return self._release(len(self._pending))
+
+    def result(self) -> Dict[str, any]:
+        """Verdict in the same shape as OutputFilter.filter()."""
+        return {
+            "safe": not self.issues,
+            "sanitized": "",
+            "issues": list(self.issues),
+        }
+
+
 # Global instance
 filter_instance = OutputFilter()
 
@@ -0,0 +1,113 @@
+# layer5/compact_profile.py
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+STATUS_NAMES = ("LOW_RISK", "MEDIUM_RISK", "HIGH_RISK")
+_STATUS_INTERN = {name: name for name in STATUS_NAMES}
+
+# Event names are stored as one-byte codes; names seen for the first time
+# are registered on the fly
+EVENT_NAMES: List[str] = ["normal", "probe", "breach"]
+_EVENT_CODES: Dict[str, int] = {name: code for code, name in enumerate(EVENT_NAMES)}
+
+
+# One ring slot: epoch seconds (float64), event code (uint8), score (float32)
+_EVENT = struct.Struct("<dBf")
+
+
+def event_code(name: str) -> int:
+    code = _EVENT_CODES.get(name)
+    if code is None:
+        if len(EVENT_NAMES) >= 256:
+            raise ValueError("too many distinct Layer 5 event names")
+        code = len(EVENT_NAMES)
+        EVENT_NAMES.append(name)
+        _EVENT_CODES[name] = code
+    return code
+
+
+class CompactProfile:
+    """
+    Memory-lean Layer 5 profile.
+
+    Slots instead of a per-instance dict, numeric timestamps, status kept
+    as one of the shared STATUS_NAMES strings, and events in a fixed-capacity ring buffer: one
+    bytearray of packed 13-byte slots (epoch seconds, one-byte event code,
+    score). The buffer is only allocated on the first event and grows up to
+    `capacity` slots, after which the oldest slot is overwritten.
+    """
+    __slots__ = ("score", "score_at", "status", "banned", "tokens", "tokens_at", "_ring", "_next")
+
+    def __init__(self, score: float = 0.0, score_at: Optional[float] = None, status: str = "LOW_RISK",
+                 banned: bool = False, tokens: Optional[float] = None, tokens_at: Optional[float] = None):
+        self.set_state(score, score_at, status, banned, tokens, tokens_at)
+        self._ring: Optional[bytearray] = None
+        self._next = 0  # ring slot written next, once the buffer is full
+
+    # -----------------------------
+    # State
+    # -----------------------------
+    def state(self) -> Tuple[float, Optional[float], str, bool, Optional[float], Optional[float]]:
+        """
+        (score, score_at, status, banned, tokens, tokens_at): the score as of
+        score_at (wall clock) and the rate-limit bucket as of tokens_at
+        (monotonic clock).
+        """
+        return (self.score, self.score_at, self.status, self.banned, self.tokens, self.tokens_at)
+
+    def set_state(self, score: float, score_at: Optional[float], status: str, banned: bool,
+                  tokens: Optional[float], tokens_at: Optional[float]) -> None:
+        self.score = score
+        self.score_at = score_at
+        # Share the interned name rather than keep a copy per profile
+        self.status = _STATUS_INTERN.get(status, status)
+        self.banned = banned
+        self.tokens = tokens
+        self.tokens_at = tokens_at
+
+    # -----------------------------
+    # Event ring buffer
+    # -----------------------------
+    def add_event(self, event: str, at: float, score: float, capacity: int = 50) -> None:
+        packed = _EVENT.pack(at, event_code(event), score)
+        if self._ring is None:
+            self._ring = bytearray()
+        if len(self._ring) < capacity * _EVENT.size:
+            self._ring += packed
+            return
+        offset = self._next * _EVENT.size
+        self._ring[offset:offset + _EVENT.size] = packed
+        self._next = (self._next + 1) % capacity
+
+    def has_events(self) -> bool:
+        return bool(self._ring)
+
+    def events(self) -> List[Tuple[float, str, float]]:
+        """(epoch seconds, event name, score), oldest first."""
+        if not self._ring:
+            return []
+        split = self._next * _EVENT.size
+        ordered = self._ring[split:] + self._ring[:split]
+        return [(at, EVENT_NAMES[code], score) for at, code, score in _EVENT.iter_unpack(ordered)]
+
+    def take_events(self) -> List[Tuple[float, str, float]]:
+        """Return the buffered events and release the buffer."""
+        events = self.events()
+        self._ring = None
+        self._next = 0
+        return events
+
+    def to_dict(self, events: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """The historical dict shape returned by get_user_status()."""
+        if events is None:
+            events = [
+                {"event": name, "time": datetime.fromtimestamp(at).isoformat(), "score": round(score, 2)}
+                for at, name, score in self.events()
+            ]
+        return {
+            "score": round(self.score, 2),
+            "status": self.status,
+            "banned": self.banned,
+            "events": events,
+        }
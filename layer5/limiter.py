@@ -0,0 +1,98 @@
+# layer5/limiter.py
+import math
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class TierLimit(NamedTuple):
+    """`prompts` per `per_seconds`, with bursts of up to `burst` prompts."""
+    prompts: float
+    per_seconds: float
+    burst: float
+
+    @classmethod
+    def per_minute(cls, prompts: float, burst: Optional[float] = None) -> "TierLimit":
+        return cls(prompts, 60.0, prompts if burst is None else burst)
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second."""
+        return self.prompts / self.per_seconds
+
+    def describe(self) -> str:
+        unit = "minute" if self.per_seconds == 60 else f"{self.per_seconds:g} seconds"
+        noun = "prompt" if self.prompts == 1 else "prompts"
+        return f"{self.prompts:g} {noun} per {unit}"
+
+
+# Playbook A. None (or a missing tier) = no limit; HIGH_RISK users are
+# banned (Playbook B) before any limit applies
+DEFAULT_TIER_LIMITS: Dict[str, Optional[TierLimit]] = {
+    "LOW_RISK": None,
+    "MEDIUM_RISK": TierLimit.per_minute(1),
+}
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with one limit per status tier.
+
+    The bucket is two numbers kept by the caller (tokens left and the
+    monotonic-clock time they were counted), so a check is a few float
+    operations with no history to scan. time.monotonic() is system-wide on
+    one host, so the state can be shared between worker processes; a stamp
+    from the future (the host rebooted) simply counts as a full bucket.
+    """
+
+    def __init__(self, tier_limits: Optional[Dict[str, Optional[TierLimit]]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tier_limits = dict(DEFAULT_TIER_LIMITS if tier_limits is None else tier_limits)
+        self.clock = clock
+
+    def limit_for(self, tier: str) -> Optional[TierLimit]:
+        return self.tier_limits.get(tier)
+
+    def take(
+        self,
+        limit: TierLimit,
+        tokens: Optional[float],
+        stamp: Optional[float],
+        now: Optional[float] = None,
+    ) -> Tuple[bool, Optional[float], Optional[float], float]:
+        """
+        Try to spend one token. `tokens`/`stamp` of None mean a full bucket.
+        Returns (allowed, tokens, stamp, retry_after_seconds); when denied the
+        state comes back unchanged, so callers have nothing to write.
+        """
+        if now is None:
+            now = self.clock()
+        if tokens is None or stamp is None or stamp > now:
+            available = limit.burst
+        else:
+            available = min(limit.burst, tokens + (now - stamp) * limit.rate)
+
+        if available >= 1.0:
+            return True, available - 1.0, now, 0.0
+        return False, tokens, stamp, (1.0 - available) / limit.rate
+
+
+class ScoreDecay:
+    """
+    Exponential decay of risk scores, evaluated lazily: the stored score is
+    only correct as of its timestamp, and value() projects it to `now`.
+    Wall-clock time is used because scores outlive reboots.
+    half_life_seconds=None disables decay.
+    """
+
+    def __init__(self, half_life_seconds: Optional[float] = 3600.0, clock: Callable[[], float] = time.time):
+        self.half_life_seconds = half_life_seconds
+        self.clock = clock
+        self._rate = math.log(2) / half_life_seconds if half_life_seconds else 0.0
+
+    def value(self, score: float, stamp: Optional[float], now: Optional[float] = None) -> float:
+        if not self._rate or stamp is None or score <= 0:
+            return score
+        if now is None:
+            now = self.clock()
+        elapsed = now - stamp
+        return score * math.exp(-self._rate * elapsed) if elapsed > 0 else score
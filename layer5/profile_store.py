@@ -0,0 +1,451 @@
+# layer5/profile_store.py
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .compact_profile import CompactProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DB = "user_profiles.db"
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id    TEXT PRIMARY KEY,
+        score      REAL    NOT NULL DEFAULT 0,
+        score_at   REAL,
+        status     TEXT    NOT NULL DEFAULT 'LOW_RISK',
+        banned     INTEGER NOT NULL DEFAULT 0,
+        tokens     REAL,
+        tokens_at  REAL,
+        updated_at REAL    NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS profile_events (
+        id      INTEGER PRIMARY KEY,
+        user_id TEXT    NOT NULL,
+        time    TEXT    NOT NULL,
+        event   TEXT    NOT NULL,
+        score   REAL    NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS profile_events_user ON profile_events (user_id, id)",
+]
+
+# Columns added after the first release of the table, with their types
+_ADDED_COLUMNS = {"score_at": "REAL", "tokens": "REAL", "tokens_at": "REAL"}
+
+_SELECT = "SELECT score, score_at, status, banned, tokens, tokens_at FROM profiles WHERE user_id = ?"
+
+_INSERT = """
+INSERT INTO profiles (user_id, score, score_at, status, banned, tokens, tokens_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_UPSERT = _INSERT + """
+ON CONFLICT(user_id) DO UPDATE SET
+    score = excluded.score,
+    score_at = excluded.score_at,
+    status = excluded.status,
+    banned = excluded.banned,
+    tokens = excluded.tokens,
+    tokens_at = excluded.tokens_at,
+    updated_at = excluded.updated_at
+"""
+
+# Number of per-user lock stripes inside one process
+LOCK_STRIPES = 64
+
+
+class ProfileStore:
+    """
+    SQLite (WAL mode) persistence for Layer 5 profiles, shared by every
+    thread and every worker process on the host.
+
+    - Profile state (score, status, ban, rate-limit bucket) is the source of
+      truth for all workers, so it is written through: update() runs a
+      read-modify-write inside BEGIN IMMEDIATE, which makes it atomic across
+      processes. Inside a process, callers for the same user queue on one of
+      LOCK_STRIPES locks, so different users never wait on each other in
+      Python and SQLite's write lock is held only for the few microseconds
+      of the row update.
+    - The event history is write-behind: append_event() adds the event to
+      the user's in-memory ring buffer and a background thread inserts
+      everything buffered in one transaction every `flush_interval_ms`
+      (sooner once `max_batch` events are waiting), keeping the newest
+      `max_events` per user.
+    - Only a bounded hot set of `max_resident` CompactProfiles stays in
+      memory, least recently used evicted first. A resident profile caches
+      the ban flag (bans are permanent) and holds unflushed events; evicting
+      it hands those events to the next flush, so it costs memory, never data.
+    """
+
+    def __init__(
+        self,
+        path: str = PROFILE_DB,
+        flush_interval_ms: float = 200.0,
+        max_batch: int = 256,
+        max_events: int = 50,
+        max_resident: int = 100_000,
+    ):
+        self.path = path
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self.max_events = max_events
+        self.max_resident = max_resident
+
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._conns = threading.local()
+        # Hot set. _resident_lock guards the containers below; a profile's
+        # contents are guarded by its user's stripe lock
+        self._resident: "OrderedDict[str, CompactProfile]" = OrderedDict()
+        self._resident_lock = threading.Lock()
+        self._dirty: Set[str] = set()                          # resident, with unflushed events
+        self._retired: List[Tuple[str, CompactProfile]] = []   # evicted, with unflushed events
+        self._pending_count = 0
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.updates = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.events_written = 0
+
+        self._init_schema()
+
+        self._flusher = threading.Thread(target=self._run, name="layer5-profile-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # -----------------------------
+    # Connections
+    # -----------------------------
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly below
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits survive a process crash; a power cut can only
+        # drop the newest transactions, never corrupt older ones
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._conns, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._conns.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(profiles)")}
+            if "events" in columns:
+                # Stores written before events had their own table
+                conn.execute(
+                    "INSERT INTO profile_events (user_id, time, event, score) "
+                    "SELECT p.user_id, json_extract(e.value, '$.time'), json_extract(e.value, '$.event'), "
+                    "json_extract(e.value, '$.score') FROM profiles p, json_each(p.events) e"
+                )
+                conn.execute("ALTER TABLE profiles DROP COLUMN events")
+            for column, kind in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE profiles ADD COLUMN {column} {kind}")
+                    if column == "score_at":
+                        # Existing scores start decaying from their last update
+                        conn.execute("UPDATE profiles SET score_at = updated_at")
+            if "last_prompt_time" in columns:
+                # Replaced by the token bucket (tokens, tokens_at)
+                conn.execute("ALTER TABLE profiles DROP COLUMN last_prompt_time")
+            event_types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(profile_events)")}
+            if event_types.get("score") != "REAL":
+                # Scores decay, so they are fractional: rebuild the table
+                # (SQLite cannot change a column's declared type)
+                conn.execute("ALTER TABLE profile_events RENAME TO profile_events_old")
+                conn.execute("DROP INDEX IF EXISTS profile_events_user")
+                for statement in _SCHEMA[1:]:
+                    conn.execute(statement)
+                conn.execute(
+                    "INSERT INTO profile_events (id, user_id, time, event, score) "
+                    "SELECT id, user_id, time, event, score FROM profile_events_old"
+                )
+                conn.execute("DROP TABLE profile_events_old")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _to_row(user_id: str, profile: CompactProfile) -> tuple:
+        score, score_at, status, banned, tokens, tokens_at = profile.state()
+        return (user_id, float(score), score_at, status, int(banned), tokens, tokens_at, time.time())
+
+    # -----------------------------
+    # Hot set
+    # -----------------------------
+    def _touch(self, user_id: str) -> CompactProfile:
+        """
+        The resident profile for `user_id` (created empty if absent), marked
+        most recently used. Evicts least recently used profiles beyond the bound.
+        """
+        with self._resident_lock:
+            return self._touch_locked(user_id)
+
+    def _touch_locked(self, user_id: str) -> CompactProfile:
+        """_touch for callers already holding _resident_lock."""
+        profile = self._resident.get(user_id)
+        if profile is not None:
+            self._resident.move_to_end(user_id)
+            return profile
+        profile = self._resident[user_id] = CompactProfile()
+        while len(self._resident) > self.max_resident:
+            old_id, old = self._resident.popitem(last=False)
+            self.evictions += 1
+            if old_id in self._dirty:
+                self._dirty.discard(old_id)
+                self._retired.append((old_id, old))
+        return profile
+
+    def _buffered(self, user_id: str) -> List[CompactProfile]:
+        """Profiles holding unflushed events for `user_id`, oldest first."""
+        with self._resident_lock:
+            buffered = [p for uid, p in self._retired if uid == user_id]
+            if user_id in self._dirty:
+                buffered.append(self._resident[user_id])
+        return buffered
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def lock_for(self, user_id: str) -> threading.Lock:
+        """The in-process lock stripe that serializes updates to `user_id`."""
+        return self._locks[zlib.crc32(user_id.encode("utf-8")) % LOCK_STRIPES]
+
+    def update(self, user_id: str, mutate: Callable[[CompactProfile], Any]) -> Tuple[CompactProfile, Any]:
+        """
+        Atomically apply `mutate` to the user's stored profile (a default
+        profile on first touch) and write it back if it changed. `mutate`
+        edits the profile in place; its return value is passed through.
+        Returns (resident profile after the update, mutate's return value).
+        Other threads may change the profile as soon as this returns: read
+        what the caller needs inside `mutate`.
+        """
+        with self.lock_for(user_id):
+            profile = self._touch(user_id)
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(_SELECT, (user_id,)).fetchone()
+                if row:
+                    score, score_at, status, banned, tokens, tokens_at = row
+                    profile.set_state(score, score_at, status, bool(banned), tokens, tokens_at)
+                else:
+                    profile.set_state(0.0, None, "LOW_RISK", False, None, None)
+                before = profile.state()
+                try:
+                    result = mutate(profile)
+                    if row is None or profile.state() != before:
+                        conn.execute(_UPSERT, self._to_row(user_id, profile))
+                except BaseException:
+                    # Never cache state (e.g. a ban) that was not committed
+                    profile.set_state(*before)
+                    raise
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.updates += 1
+        return profile, result
+
+    def is_banned(self, user_id: str) -> bool:
+        """
+        Ban flag from the hot set only (no database read). Bans are never
+        lifted, so True is always current; False means "ask the store".
+        """
+        profile = self._resident.get(user_id)
+        return profile is not None and profile.banned
+
+    def load(self, user_id: str) -> Optional[Tuple[CompactProfile, List[Dict[str, Any]]]]:
+        """
+        The stored profile for `user_id` and its newest events (including
+        ones not yet flushed), or None for a user never seen.
+        """
+        conn = self._conn()
+        row = conn.execute(_SELECT, (user_id,)).fetchone()
+        if row is None:
+            return None
+        score, score_at, status, banned, tokens, tokens_at = row
+
+        stored = conn.execute(
+            "SELECT time, event, score FROM profile_events WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, self.max_events),
+        ).fetchall()
+        events = [{"event": event, "time": at, "score": s} for at, event, s in reversed(stored)]
+        with self.lock_for(user_id):
+            for profile in self._buffered(user_id):
+                events += profile.to_dict()["events"]
+
+        profile = CompactProfile(score, score_at, status, bool(banned), tokens, tokens_at)
+        return profile, events[-self.max_events:]
+
+    def append_event(self, user_id: str, event: str, at: float, score: float) -> None:
+        """
+        Buffer one history event (epoch seconds) for the next batched insert.
+        """
+        with self.lock_for(user_id):
+            # Buffered and marked dirty under the hot-set lock, so the
+            # profile cannot be evicted in between and take the event with it
+            with self._resident_lock:
+                profile = self._touch_locked(user_id)
+                profile.add_event(event, at, score, capacity=self.max_events)
+                self._dirty.add(user_id)
+                self._pending_count += 1
+                backlog = self._pending_count
+        if backlog >= self.max_batch:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Insert every buffered event in one transaction and trim each touched
+        user's history to `max_events`. Returns events written.
+        """
+        with self._flush_lock:
+            with self._resident_lock:
+                # Evicted profiles first: their events are the older ones
+                batch = self._retired + [(user_id, self._resident[user_id]) for user_id in self._dirty]
+                self._dirty, self._retired = set(), []
+                self._pending_count = 0
+            if not batch:
+                return 0
+
+            taken: Dict[str, List[Tuple[float, str, int]]] = {}
+            for user_id, profile in batch:
+                with self.lock_for(user_id):
+                    taken.setdefault(user_id, []).extend(profile.take_events())
+            rows = [
+                (user_id, datetime.fromtimestamp(at).isoformat(), event, score)
+                for user_id, events in taken.items() for at, event, score in events
+            ]
+
+            conn = self._conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "INSERT INTO profile_events (user_id, time, event, score) VALUES (?, ?, ?, ?)", rows
+                    )
+                    conn.executemany(
+                        "DELETE FROM profile_events WHERE user_id = ? AND id <= "
+                        "(SELECT id FROM profile_events WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        [(user_id, user_id, self.max_events) for user_id in taken],
+                    )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logger.error(f"Layer 5 event flush failed, will retry: {e}")
+                # Park the events ahead of anything buffered since
+                with self._resident_lock:
+                    for user_id, events in taken.items():
+                        holder = CompactProfile()
+                        for at, event, score in events:
+                            holder.add_event(event, at, score, capacity=self.max_events)
+                        self._retired.insert(0, (user_id, holder))
+                    self._pending_count += len(rows)
+                return 0
+
+            self.flushes += 1
+            self.events_written += len(rows)
+            return len(rows)
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def migrate_json(self, json_path: str) -> int:
+        """
+        One-time import of the legacy user_profiles.json. Existing rows win,
+        and the file is renamed to *.migrated afterwards. A file that cannot
+        be parsed is left in place and reported, not treated as empty.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r") as f:
+                profiles = json.load(f)
+        except Exception as e:
+            logger.error(f"Layer 5: could not read {json_path} ({e}); leaving it in place, not migrated")
+            return 0
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for user_id, profile in profiles.items():
+                # Scores start decaying from the migration; rate-limit buckets start full
+                row = CompactProfile(
+                    float(profile.get("score", 0)),
+                    time.time(),
+                    profile.get("status", "LOW_RISK"),
+                    bool(profile.get("banned", False)),
+                )
+                inserted = conn.execute(
+                    _INSERT.replace("INSERT", "INSERT OR IGNORE", 1), self._to_row(user_id, row)
+                ).rowcount
+                if inserted:
+                    conn.executemany(
+                        "INSERT INTO profile_events (user_id, time, event, score) VALUES (?, ?, ?, ?)",
+                        [(user_id, e["time"], e["event"], e["score"]) for e in profile.get("events", [])[-self.max_events:]],
+                    )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        os.replace(json_path, json_path + ".migrated")
+        logger.info(f"Layer 5: migrated {len(profiles)} profiles from {json_path} to {self.path}")
+        return len(profiles)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "updates": self.updates,
+            "resident": len(self._resident),
+            "max_resident": self.max_resident,
+            "evictions": self.evictions,
+            "pending_events": self._pending_count,
+            "flushes": self.flushes,
+            "events_written": self.events_written,
+            "flush_interval_ms": self.flush_interval_ms,
+            "max_batch": self.max_batch,
+        }
+
+    def close(self) -> None:
+        """Flush buffered events and stop the background writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5.0)
+        self.flush()
+
+    # -----------------------------
+    # Background writer
+    # -----------------------------
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval_ms / 1000.0)
+            self._wake.clear()
+            self.flush()
@@ -1,110 +1,135 @@
 # layer5/user_profiler.py
-import json
-import os
-from datetime import datetime, timedelta
+import math
+import time
 from typing import Dict, Any, Optional
 
+from .compact_profile import CompactProfile
+from .limiter import RateLimiter, ScoreDecay, TierLimit
+from .profile_store import ProfileStore, PROFILE_DB
+
+# Legacy whole-file store, imported into PROFILE_DB on first start
 PROFILE_FILE = "user_profiles.json"
 
+# Score change per event type
+EVENT_POINTS = {"probe": 3, "breach": 10}
+
 class UserProfiler:
     """
     Layer 5: Dynamic Profiling & Automated Playbooks (with real enforcement)
+
+    All state lives in a ProfileStore shared by every thread and worker
+    process on the host, and each playbook check or score update is one
+    atomic read-modify-write there, so bans and rate limits hold no matter
+    which worker serves the request.
+
+    Risk scores decay exponentially (half-life `score_half_life_seconds`,
+    None to disable) and the status tier follows the decayed score, so a
+    MEDIUM_RISK user that behaves drops back to LOW_RISK on its own. Bans
+    (Playbook B) are permanent. Playbook A rate-limits each tier with a
+    token bucket from `tier_limits` (default: LOW_RISK unlimited,
+    MEDIUM_RISK 1 prompt per minute).
     """
-    def __init__(self):
-        self.profiles = self._load_profiles()
-
-    def _load_profiles(self) -> Dict[str, Any]:
-        if os.path.exists(PROFILE_FILE):
-            try:
-                with open(PROFILE_FILE, "r") as f:
-                    return json.load(f)
-            except Exception:
-                return {}
-        return {}
-
-    def _save_profiles(self):
-        with open(PROFILE_FILE, "w") as f:
-            json.dump(self.profiles, f, indent=2)
+    def __init__(
+        self,
+        store: Optional[ProfileStore] = None,
+        legacy_file: Optional[str] = PROFILE_FILE,
+        medium_risk_score: int = 12,
+        ban_score: int = 30,
+        tier_limits: Optional[Dict[str, Optional[TierLimit]]] = None,
+        score_half_life_seconds: Optional[float] = 3600.0,
+    ):
+        self.store = store or ProfileStore(PROFILE_DB)
+        if legacy_file:
+            self.store.migrate_json(legacy_file)
+        self.medium_risk_score = medium_risk_score
+        self.ban_score = ban_score
+        self.limiter = RateLimiter(tier_limits)
+        self.decay = ScoreDecay(score_half_life_seconds)
+
+    def _status_for(self, score: float) -> str:
+        if score >= self.ban_score:
+            return "HIGH_RISK"
+        if score >= self.medium_risk_score:
+            return "MEDIUM_RISK"
+        return "LOW_RISK"
+
+    def _current(self, profile: CompactProfile, now: float) -> float:
+        """
+        The profile's score decayed to `now` (wall clock), to the 2 decimals
+        profiles report, so back-to-back events still add up to exact
+        thresholds.
+        """
+        return round(self.decay.value(profile.score, profile.score_at, now), 2)
+
+    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Current profile with its recent events, or None if never seen."""
+        loaded = self.store.load(user_id)
+        if loaded is None:
+            return None
+        profile, events = loaded
+        profile.score = self._current(profile, time.time())
+        if not profile.banned:
+            profile.status = self._status_for(profile.score)
+        return profile.to_dict(events)
+
+    BAN_MESSAGE = "🚫 ACCESS DENIED: User banned (Playbook B activated). Contact SOC."
+
+    def _check_playbook(self, profile: CompactProfile) -> Optional[str]:
+        if profile.banned:
+            return self.BAN_MESSAGE
+
+        limit = self.limiter.limit_for(self._status_for(self._current(profile, time.time())))
+        if limit is None:
+            return None  # Allow the prompt; unlimited tiers spend no tokens
+
+        allowed, profile.tokens, profile.tokens_at, retry_after = self.limiter.take(
+            limit, profile.tokens, profile.tokens_at
+        )
+        if not allowed:
+            wait = math.ceil(retry_after)
+            return f"⏳ RATE LIMITED (Playbook A): {limit.describe()}. Try again in {wait // 60}m {wait % 60}s."
+        return None  # Allow the prompt
 
     def enforce_playbook(self, user_id: str) -> Optional[str]:
         """
         Check current status and enforce playbook.
         Returns: None (allow) or error message (block)
         """
-        if user_id not in self.profiles:
-            # Full default profile on first touch
-            self.profiles[user_id] = {
-                "score": 0,
-                "status": "LOW_RISK",
-                "last_prompt_time": None,
-                "banned": False,
-                "events": []
-            }
-            self._save_profiles()
-
-        profile = self.profiles[user_id]
-
-        if profile.get("banned", False):
-            return "🚫 ACCESS DENIED: User banned (Playbook B activated). Contact SOC."
-
-        if profile["status"] == "MEDIUM_RISK":
-            last_time_str = profile.get("last_prompt_time")
-            if last_time_str:
-                last_time = datetime.fromisoformat(last_time_str)
-                if datetime.now() - last_time < timedelta(minutes=1):  # ← 1 minute for demo
-                    remaining = timedelta(minutes=1) - (datetime.now() - last_time)
-                    mins = int(remaining.total_seconds() // 60)
-                    secs = int(remaining.total_seconds() % 60)
-                    return f"⏳ RATE LIMITED (Playbook A): 1 prompt per minute. Try again in {mins}m {secs}s."
-
-        # Allow prompt and update last time
-        profile["last_prompt_time"] = datetime.now().isoformat()
-        self._save_profiles()
-        return None  # Allow the prompt
+        # Bans are permanent, so a ban already seen needs no database trip
+        if self.store.is_banned(user_id):
+            return self.BAN_MESSAGE
+        _, block_msg = self.store.update(user_id, self._check_playbook)
+        return block_msg
+
+    def _apply_event(self, profile: CompactProfile, event: str, now: float) -> tuple:
+        """Apply `event` to `profile` (under its store lock); returns the new state."""
+        # Score update, starting from the score decayed to now
+        score = self._current(profile, now)
+        if event == "normal":
+            score = max(0.0, score - 1)
+        else:
+            score += EVENT_POINTS.get(event, 0)
+        profile.score, profile.score_at = score, now
+
+        # Update status and playbook
+        profile.status = self._status_for(score)
+        if profile.status == "HIGH_RISK":
+            profile.banned = True  # Permanent ban
+        elif profile.banned:
+            profile.status = "HIGH_RISK"
+        return profile.state()
 
     def update_score(self, user_id: str, event: str):
         """
         Update score and status based on event
         """
-        if user_id not in self.profiles:
-            self.profiles[user_id] = {
-                "score": 0,
-                "events": [],
-                "status": "LOW_RISK",
-                "last_prompt_time": None,
-                "banned": False
-            }
-
-        profile = self.profiles[user_id]
-
-        # Score update
-        if event == "normal":
-            profile["score"] = max(0, profile["score"] - 1)
-        elif event == "probe":
-            profile["score"] += 3
-        elif event == "breach":
-            profile["score"] += 10
-
-        # Update status and playbook
-        if profile["score"] >= 30:
-            profile["status"] = "HIGH_RISK"
-            profile["banned"] = True  # Permanent ban
-        elif profile["score"] >= 12:
-            profile["status"] = "MEDIUM_RISK"
-        else:
-            profile["status"] = "LOW_RISK"
-
-        # Record event
-        profile["events"].append({
-            "event": event,
-            "time": datetime.now().isoformat(),
-            "score": profile["score"]
-        })
-        if len(profile["events"]) > 50:
-            profile["events"] = profile["events"][-50:]
+        now = time.time()
+        _, state = self.store.update(user_id, lambda p: self._apply_event(p, event, now))
+        score, _, status, banned, _, _ = state
 
-        self._save_profiles()
-        return profile
+        # Record event (history is written behind; the score above is not)
+        self.store.append_event(user_id, event, now, score)
+        return {"score": round(score, 2), "status": status, "banned": banned}
 
 # Global singleton instance
 profiler = UserProfiler()
@@ -117,9 +142,9 @@ def update_user_score(user_id: str, event: str):
     profiler.update_score(user_id, event)
 
 def get_user_status(user_id: str) -> Dict[str, Any]:
-    return profiler.profiles.get(user_id, {
+    return profiler.get_profile(user_id) or {
         "status": "LOW_RISK",
         "score": 0,
         "banned": False,
         "events": []
-    })
\ No newline at end of file
+    }
@@ -1,5 +1,6 @@
 # layer6/__init__.py
-from .forensic_analysis import record_transaction, generate_daily_report, analyzer
-
-__all__ = ["record_transaction", "generate_daily_report", "analyzer"]
+from .forensic_analysis import record_transaction, generate_daily_report, metrics_snapshot, analyzer
+from .latency import StageLatency, STAGES
+from .transaction import TransactionRecord
 
+__all__ = ["record_transaction", "generate_daily_report", "metrics_snapshot", "analyzer", "TransactionRecord", "StageLatency", "STAGES"]
@@ -0,0 +1,236 @@
+# layer6/compaction.py
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .log_writer import ForensicLogWriter, open_part_owner, utc_day
+from .transaction import FIELD_NAMES, TransactionRecord
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: without pyarrow, days simply stay in JSONL
+    pa = pc = pq = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_NAME = "transactions.parquet"
+
+# Columns the report metrics read
+METRIC_COLUMNS = ["layer1_flags", "layer2_is_suspicious", "layer4_issues", "was_blocked"]
+COUNT_KEYS = ("total_requests", "detected_attacks", "successful_attacks", "sanitizations", "pii_prevented")
+
+if pa is not None:
+    # TransactionRecord as Arrow columns; `extra` holds any other fields as JSON
+    ARROW_SCHEMA = pa.schema([
+        ("timestamp", pa.string()),
+        ("user_id", pa.string()),
+        ("raw_input", pa.string()),
+        ("sanitized_input", pa.string()),
+        ("layer1_flags", pa.list_(pa.string())),
+        ("layer2_score", pa.float64()),
+        ("layer2_is_suspicious", pa.bool_()),
+        ("layer2_technique", pa.string()),
+        ("layer2_signature_similarity", pa.float64()),
+        ("severity", pa.string()),
+        ("layer3_armored", pa.bool_()),
+        ("layer4_issues", pa.list_(pa.string())),
+        ("final_output", pa.string()),
+        ("was_blocked", pa.bool_()),
+        ("blocked_by", pa.string()),
+        ("stage_ms", pa.map_(pa.string(), pa.float64())),
+        ("extra", pa.string()),
+    ])
+    assert tuple(ARROW_SCHEMA.names[:-1]) == FIELD_NAMES, "ARROW_SCHEMA is out of sync with TransactionRecord"
+else:
+    ARROW_SCHEMA = None
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def parquet_path(writer: ForensicLogWriter, day: str) -> str:
+    return os.path.join(writer.day_dir(day), PARQUET_NAME)
+
+
+def open_compacted(writer: ForensicLogWriter, day: str) -> Optional["pq.ParquetFile"]:
+    """
+    `day`'s Parquet file, or None if the day is not compacted (or pyarrow
+    is missing). Read counts and covered parts from the same handle: a
+    concurrent compaction replaces the file, never rewrites it in place.
+    """
+    if not available():
+        return None
+    try:
+        return pq.ParquetFile(parquet_path(writer, day))
+    except FileNotFoundError:
+        return None
+
+
+def covered_parts(compacted: "pq.ParquetFile") -> Set[int]:
+    """Numbers of the JSONL parts already folded into `compacted`."""
+    metadata = compacted.schema_arrow.metadata or {}
+    return set(json.loads(metadata.get(b"parts", b"[]")))
+
+
+def _row(line: str) -> Dict[str, Any]:
+    record = TransactionRecord.from_dict(json.loads(line))
+    row = {name: getattr(record, name) for name in FIELD_NAMES}
+    row["extra"] = json.dumps(record.extra) if record.extra else None
+    return row
+
+
+def _conform(table: "pa.Table", schema: "pa.Schema") -> "pa.Table":
+    """`table` in `schema`'s layout; columns added to the schema since it was written are null."""
+    columns = [
+        table[f.name].cast(f.type) if f.name in table.column_names else pa.nulls(table.num_rows, f.type)
+        for f in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def compact_day(writer: ForensicLogWriter, day: str, row_group_size: int = 50_000, grace_seconds: float = 600.0) -> int:
+    """
+    Fold the finished JSONL parts of `day` into <day>/transactions.parquet,
+    rewriting it (with its previous rows) when late parts have arrived.
+    The Parquet metadata lists the parts it covers, and readers skip
+    those, so parts are only deleted `grace_seconds` after being covered
+    instead of under a reader's feet. Returns rows added.
+    """
+    path = parquet_path(writer, day)
+    for name in os.listdir(writer.day_dir(day)):
+        stale = os.path.join(writer.day_dir(day), name)
+        # Left by a compaction interrupted at exit
+        if name.startswith(PARQUET_NAME) and name.endswith(".tmp") and time.time() - os.path.getmtime(stale) >= grace_seconds:
+            os.remove(stale)
+    compacted = open_compacted(writer, day)
+    covered = covered_parts(compacted) if compacted else set()
+
+    if covered and time.time() - os.path.getmtime(path) >= grace_seconds:
+        # Keeps the writer from handing out a covered part number again
+        open(os.path.join(writer.day_dir(day), f"part-{max(covered):04d}.compacted"), "a").close()
+        for n, name in writer.part_names(day):
+            if n in covered:
+                try:
+                    os.remove(os.path.join(writer.day_dir(day), name))
+                except FileNotFoundError:
+                    pass  # Renamed by the gzip thread; removed next time
+
+    # Parts still open in any process are left for a later run
+    new = [
+        (n, os.path.join(writer.day_dir(day), name)) for n, name in writer.part_names(day)
+        if n not in covered and open_part_owner(name) is None
+    ]
+    if not new:
+        return 0
+
+    parts = sorted(covered | {n for n, _ in new})
+    schema = ARROW_SCHEMA.with_metadata({b"parts": json.dumps(parts).encode()})
+    tmp = f"{path}.{os.getpid()}.tmp"
+    added = 0
+    try:
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as out:
+            if covered:
+                for batch in compacted.iter_batches(batch_size=row_group_size):
+                    out.write_table(_conform(pa.Table.from_batches([batch]), schema))
+            rows: List[Dict[str, Any]] = []
+            for _, part in new:
+                for line in writer.read_part(part):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rows.append(_row(line))
+                    except (json.JSONDecodeError, TypeError):
+                        continue  # Skip corrupted lines
+                    if len(rows) >= row_group_size:
+                        out.write_table(pa.Table.from_pylist(rows, schema=schema))
+                        added += len(rows)
+                        rows = []
+            if rows:
+                out.write_table(pa.Table.from_pylist(rows, schema=schema))
+                added += len(rows)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return added
+
+
+def day_counts(compacted: "pq.ParquetFile") -> Dict[str, int]:
+    """Report counts for one day's Parquet file, as vectorized column operations."""
+    table = compacted.read(columns=METRIC_COLUMNS)
+    suspicious = pc.fill_null(table["layer2_is_suspicious"], False)
+    not_blocked = pc.invert(pc.fill_null(table["was_blocked"], True))
+
+    def count(mask) -> int:
+        return int(pc.sum(mask).as_py() or 0)
+
+    def non_empty(column: str):
+        return pc.greater(pc.fill_null(pc.list_value_length(table[column]), 0), 0)
+
+    return {
+        "total_requests": table.num_rows,
+        "detected_attacks": count(suspicious),
+        "successful_attacks": count(pc.and_(suspicious, not_blocked)),
+        "sanitizations": count(non_empty("layer1_flags")),
+        "pii_prevented": count(non_empty("layer4_issues")),
+    }
+
+
+def iter_parquet(compacted: "pq.ParquetFile", batch_size: int = 10_000) -> Iterator[Dict[str, Any]]:
+    """Records of a day's Parquet file in the JSONL dict shape."""
+    for batch in compacted.iter_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            extra = row.pop("extra")
+            if row.get("stage_ms") is not None:
+                row["stage_ms"] = dict(row["stage_ms"])  # Arrow maps come back as pairs
+            if extra:
+                row.update(json.loads(extra))
+            yield row
+
+
+class ParquetCompactor:
+    """
+    Background job: every `interval_seconds`, compact each closed day
+    (before today, UTC) of `writer`'s log into Parquet.
+    """
+
+    def __init__(self, writer: ForensicLogWriter, interval_seconds: float = 3600.0, grace_seconds: float = 600.0):
+        if not available():
+            raise RuntimeError("Parquet compaction needs pyarrow")
+        self.writer = writer
+        self.interval_seconds = interval_seconds
+        self.grace_seconds = grace_seconds
+        self.rows_compacted = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="layer6-compactor", daemon=True)
+        self._thread.start()
+
+    def run_once(self) -> int:
+        today = utc_day()
+        added = 0
+        for day in self.writer.days():
+            if day >= today:
+                continue
+            try:
+                added += compact_day(self.writer, day, grace_seconds=self.grace_seconds)
+            except Exception:
+                logger.exception("Layer 6: could not compact %s", day)
+        self.rows_compacted += added
+        return added
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
@@ -1,52 +1,204 @@
 # layer6/forensic_analysis.py
+import glob
+import gzip
 import json
+import logging
 import os
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, Iterator, Union
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from . import compaction
+from .log_writer import ForensicLogWriter
+from .rolling_metrics import RollingMetrics
+from .transaction import TransactionRecord
+
+logger = logging.getLogger(__name__)
+
+# Legacy logs are imported into the day partitions this many lines at a time
+MIGRATE_CHUNK = 10_000
+
 class ForensicAnalyzer:
     """
     Layer 6: Forensic Analysis & Reporting
-    - Black Box Recorder: Logs every transaction in JSONL format
-    - Daily PDF Reports: Metrics like ISR, Sanitization Efficiency, etc.
+    - Black Box Recorder: Logs every transaction (a TransactionRecord) in
+      JSONL format, written off the request path by a ForensicLogWriter
+      into one partition per day (<log_dir>/forensic_logs/<YYYY-MM-DD>/;
+      see log_writer.py)
+    - Compaction: with pyarrow installed, a background job folds each
+      closed day into a columnar Parquet file (see compaction.py);
+      `compact_interval_seconds=None` turns it off
+    - Daily PDF Reports: Metrics like ISR, Sanitization Efficiency, etc.,
+      from that day's partition only: vectorized over the Parquet columns,
+      plus a streaming pass over any JSONL not compacted yet
+    - Live Metrics: running totals and last minute/hour/day windows,
+      updated per transaction and seeded from the last day of logs on
+      startup (see rolling_metrics.py); `rebuild_metrics=False` starts
+      them empty
     """
-    def __init__(self, log_dir: str = "logs", report_dir: str = "reports"):
+    def __init__(self, log_dir: str = "logs", report_dir: str = "reports",
+                 compact_interval_seconds: Optional[float] = 3600.0, rebuild_metrics: bool = True,
+                 **writer_options):
         self.log_dir = log_dir
         self.report_dir = report_dir
+        # Pre-partitioning single-file log, imported on first start
         self.log_file = os.path.join(self.log_dir, "forensic_logs.jsonl")
+        self.partition_dir = os.path.join(self.log_dir, "forensic_logs")
         
         # Create directories
         os.makedirs(self.log_dir, exist_ok=True)
         os.makedirs(self.report_dir, exist_ok=True)
 
-    def record_transaction(self, transaction: Dict[str, Any]) -> None:
+        self.writer = ForensicLogWriter(self.partition_dir, **writer_options)
+        self.migrate_legacy_logs()
+
+        self.metrics = RollingMetrics()
+        if rebuild_metrics:
+            self.rebuild_metrics()
+
+        self.compactor = None
+        if compact_interval_seconds and compaction.available():
+            self.compactor = compaction.ParquetCompactor(self.writer, compact_interval_seconds)
+        elif compact_interval_seconds:
+            logger.info("Layer 6: pyarrow not installed; forensic logs stay in JSONL (no Parquet compaction)")
+
+    @staticmethod
+    def _day_of(timestamp: Any) -> str:
+        # ISO timestamps start with the date; the local date part is the
+        # day, as in the original report filter
+        return str(timestamp)[:10]
+
+    def record_transaction(self, transaction: Union[TransactionRecord, Dict[str, Any]]) -> bool:
         """
-        Append a full transaction log (one JSON line)
+        Queue a full transaction log (one JSON line) for the background
+        writer. Returns False if it was dropped because the queue was full.
         """
+        if isinstance(transaction, TransactionRecord):
+            transaction = transaction.to_dict()
         transaction.setdefault('timestamp', datetime.utcnow().isoformat())
         transaction.setdefault('user_id', 'anonymous')
-        
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            json.dump(transaction, f)
-            f.write('\n')
-
-    def _load_logs(self) -> List[Dict[str, Any]]:
-        """Load all logs from JSONL"""
-        if not os.path.exists(self.log_file):
-            return []
-        
-        logs = []
-        with open(self.log_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line:
+
+        # Serialized here, so later changes to the dict cannot leak into the log
+        queued = self.writer.write(json.dumps(transaction), day=self._day_of(transaction['timestamp']))
+        self.metrics.observe(transaction)
+        return queued
+
+    def rebuild_metrics(self) -> int:
+        """
+        Seed the live metrics from the partitions that can hold the last
+        24 hours (yesterday's and today's). Returns transactions counted.
+        """
+        since = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        days = [day for day in self.writer.days() if day >= since]
+        counted = sum(self.metrics.rebuild(self.iter_logs(day)) for day in days)
+        if counted:
+            logger.info(f"Layer 6: live metrics rebuilt from {counted} records ({', '.join(days)})")
+        return counted
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """Live metrics: totals and last minute/hour/day windows (constant time)."""
+        return self.metrics.snapshot()
+
+    def migrate_legacy_logs(self) -> int:
+        """
+        One-time import of the single-file log (and its rotated segments)
+        into the day partitions. Each file is renamed to *.migrated once
+        imported. Returns records imported.
+        """
+        stem, ext = os.path.splitext(self.log_file)
+        legacy = sorted(p for p in glob.glob(glob.escape(stem) + ".*" + ext + "*") if p.endswith((ext, ext + ".gz")))
+        if os.path.exists(self.log_file):
+            legacy.append(self.log_file)
+        if not legacy:
+            return 0
+
+        imported = skipped = 0
+        for path in legacy:
+            day, chunk = None, []
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
                     try:
-                        logs.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue  # Skip corrupted lines
-        return logs
+                        line_day = self._day_of(json.loads(line)['timestamp'])
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        skipped += 1  # Corrupted lines were never reportable
+                        continue
+                    if line_day != day or len(chunk) >= MIGRATE_CHUNK:
+                        imported += self.writer.import_lines(day, chunk) if chunk else 0
+                        day, chunk = line_day, []
+                    chunk.append(line)
+            if chunk:
+                imported += self.writer.import_lines(day, chunk)
+            os.replace(path, path + ".migrated")
+        logger.info(f"Layer 6: imported {imported} records from {len(legacy)} legacy log file(s) "
+                    f"into {self.partition_dir} ({skipped} unreadable lines skipped)")
+        return imported
+
+    def _iter_jsonl(self, day: str, skip=()) -> Iterator[Dict[str, Any]]:
+        self.writer.flush()
+        for line in self.writer.read_day(day, skip):
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Skip corrupted lines
+
+    def iter_logs(self, date) -> Iterator[Dict[str, Any]]:
+        """Stream the transactions recorded for `date` (a date or YYYY-MM-DD)."""
+        day = date if isinstance(date, str) else date.strftime('%Y-%m-%d')
+        compacted = compaction.open_compacted(self.writer, day)
+        skip = set()
+        if compacted is not None:
+            skip = compaction.covered_parts(compacted)
+            yield from compaction.iter_parquet(compacted)
+        yield from self._iter_jsonl(day, skip)
+
+    def daily_metrics(self, date) -> Dict[str, Any]:
+        """
+        Report metrics for `date`: column operations over the day's Parquet
+        file, plus one streaming pass over its JSONL parts not compacted yet.
+        """
+        day = date if isinstance(date, str) else date.strftime('%Y-%m-%d')
+        counts = dict.fromkeys(compaction.COUNT_KEYS, 0)
+        compacted = compaction.open_compacted(self.writer, day)
+        skip = set()
+        if compacted is not None:
+            skip = compaction.covered_parts(compacted)
+            counts.update(compaction.day_counts(compacted))
+
+        for log in self._iter_jsonl(day, skip):
+            counts['total_requests'] += 1
+            if log.get('layer2_is_suspicious') == True:
+                counts['detected_attacks'] += 1
+                if log.get('was_blocked') == False:
+                    counts['successful_attacks'] += 1
+            if log.get('layer1_flags'):
+                counts['sanitizations'] += 1
+            if log.get('layer4_issues'):
+                counts['pii_prevented'] += 1
+
+        total_requests = counts['total_requests']
+        detected_attacks = counts['detected_attacks']
+        successful_attacks = counts['successful_attacks']
+        sanitizations = counts['sanitizations']
+        pii_prevented = counts['pii_prevented']
+
+        isr = (successful_attacks / detected_attacks * 100) if detected_attacks > 0 else 0.0
+        sanitization_efficiency = (sanitizations / total_requests * 100) if total_requests > 0 else 0.0
+        return {
+            'total_requests': total_requests,
+            'detected_attacks': detected_attacks,
+            'successful_attacks': successful_attacks,
+            'isr': isr,
+            'sanitizations': sanitizations,
+            'sanitization_efficiency': sanitization_efficiency,
+            'pii_prevented': pii_prevented,
+        }
 
     def generate_daily_report(self, date: Optional[datetime] = None) -> str:
         """
@@ -58,30 +210,10 @@ class ForensicAnalyzer:
         else:
             date = date.date()
 
-        start_time = datetime.combine(date, datetime.min.time())
-        end_time = start_time + timedelta(days=1)
-
-        logs = self._load_logs()
-        daily_logs = [
-            log for log in logs
-            if start_time <= datetime.fromisoformat(log.get('timestamp', '').replace('Z', '+00:00')).replace(tzinfo=None) < end_time
-        ]
-
-        if not daily_logs:
+        m = self.daily_metrics(date)
+        if not m['total_requests']:
             raise ValueError(f"No logs found for {date.strftime('%Y-%m-%d')}")
 
-        df = pd.DataFrame(daily_logs)
-
-        # Metrics
-        total_requests = len(df)
-        detected_attacks = len(df[df.get('layer2_is_suspicious', False) == True])
-        successful_attacks = len(df[(df.get('layer2_is_suspicious', False) == True) & (df.get('was_blocked', True) == False)])
-        sanitizations = len(df[df['layer1_flags'].apply(lambda x: len(x or []) > 0)])
-        pii_prevented = len(df[df['layer4_issues'].apply(lambda x: len(x or []) > 0)])
-
-        isr = (successful_attacks / detected_attacks * 100) if detected_attacks > 0 else 0.0
-        sanitization_efficiency = (sanitizations / total_requests * 100) if total_requests > 0 else 0.0
-
         # Generate PDF
         fig, ax = plt.subplots(figsize=(10, 7))
         ax.axis('off')
@@ -99,13 +231,13 @@ class ForensicAnalyzer:
                 'PII/Leaks Prevented'
             ],
             'Value': [
-                total_requests,
-                detected_attacks,
-                successful_attacks,
-                f"{isr:.2f}%",
-                sanitizations,
-                f"{sanitization_efficiency:.2f}%",
-                pii_prevented
+                m['total_requests'],
+                m['detected_attacks'],
+                m['successful_attacks'],
+                f"{m['isr']:.2f}%",
+                m['sanitizations'],
+                f"{m['sanitization_efficiency']:.2f}%",
+                m['pii_prevented']
             ]
         }
         metrics_df = pd.DataFrame(metrics)
@@ -127,8 +259,11 @@ class ForensicAnalyzer:
 analyzer = ForensicAnalyzer()
 
 # Convenience functions
-def record_transaction(transaction: Dict[str, Any]):
-    analyzer.record_transaction(transaction)
+def record_transaction(transaction: Union[TransactionRecord, Dict[str, Any]]) -> bool:
+    return analyzer.record_transaction(transaction)
 
 def generate_daily_report(date: Optional[datetime] = None) -> str:
-    return analyzer.generate_daily_report(date)
\ No newline at end of file
+    return analyzer.generate_daily_report(date)
+
+def metrics_snapshot() -> Dict[str, Any]:
+    return analyzer.metrics_snapshot()
\ No newline at end of file
@@ -0,0 +1,99 @@
+# layer6/latency.py
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Mapping, Optional
+
+# Pipeline stages, in request order. layer5_update is the profile score
+# update after Layers 1, 2 and 4; layer6 is the forensic log hand-off.
+STAGES = ("layer5", "layer1", "layer2", "layer3", "llm", "layer4", "layer5_update", "layer6", "total")
+
+# Upper bounds (ms) of the histogram buckets, plus an implicit +Inf
+BUCKETS_MS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0,
+    100.0, 250.0, 500.0, 1000.0, 2500.0, 5000.0, 10000.0, 30000.0, 60000.0,
+)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (Prometheus style): observe() is one
+    bisect over BUCKETS_MS and two additions, so it can sit on the hot
+    path. Quantiles are estimated from the buckets.
+    """
+
+    def __init__(self, buckets_ms: Iterable[float] = BUCKETS_MS):
+        self.bounds = tuple(buckets_ms)
+        self.counts = [0] * (len(self.bounds) + 1)  # last: above every bound
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def cumulative(self) -> List[int]:
+        total, out = 0, []
+        for n in self.counts:
+            total += n
+            out.append(total)
+        return out
+
+
+class StageLatency:
+    """
+    One LatencyHistogram per pipeline stage (STAGES), fed with each
+    request's stage timings in milliseconds.
+    """
+
+    def __init__(self, stages: Iterable[str] = STAGES):
+        self.histograms: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in stages}
+        self._lock = threading.Lock()
+
+    def observe(self, stage_ms: Mapping[str, float]) -> None:
+        with self._lock:
+            for stage, ms in stage_ms.items():
+                histogram = self.histograms.get(stage)
+                if histogram is not None:
+                    histogram.observe(ms)
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Per-stage count, mean and p50/p95/p99 (bucket upper bounds, ms)."""
+        with self._lock:
+            return {
+                stage: {
+                    "count": h.count,
+                    "mean_ms": h.sum_ms / h.count if h.count else None,
+                    "p50_ms": h.quantile(0.50),
+                    "p95_ms": h.quantile(0.95),
+                    "p99_ms": h.quantile(0.99),
+                }
+                for stage, h in self.histograms.items()
+            }
+
+    def prometheus(self, name: str = "promptguard_stage_latency_seconds") -> str:
+        """Prometheus text exposition format (0.0.4), one histogram labelled by stage."""
+        lines = [
+            f"# HELP {name} Time spent in each PromptGuard pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for stage, h in self.histograms.items():
+                for bound, total in zip(h.bounds + (None,), h.cumulative()):
+                    le = "+Inf" if bound is None else repr(bound / 1000)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {total}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum_ms / 1000!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,491 @@
+# layer6/log_writer.py
+import atexit
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows: parts left open by a crash stay plain
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("batch", "interval", "never")
+ON_FULL_POLICIES = ("block", "drop")
+
+_STOP = object()
+
+
+def utc_day() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def open_part_owner(name: str) -> Optional[int]:
+    """Pid of the writer of an open part (part-NNNN.<pid>.jsonl), else None."""
+    fields = name.split(".")
+    if len(fields) == 3 and fields[2] == "jsonl" and fields[1].isdigit():
+        return int(fields[1])
+    return None
+
+
+def finished_name(path: str) -> str:
+    """part-NNNN.jsonl for an open part-NNNN.<pid>.jsonl path; other paths as they are."""
+    directory, name = os.path.split(path)
+    if open_part_owner(name) is None:
+        return path
+    return os.path.join(directory, name.split(".")[0] + ".jsonl")
+
+
+class ForensicLogWriter:
+    """
+    Background group-commit writer for the Layer 6 JSONL log, partitioned
+    by day.
+
+    Layout: <root>/<YYYY-MM-DD>/part-NNNN.jsonl, gzip-compressed (.gz) once
+    a part is finished. The day is the one a record belongs to (passed to
+    write()), not the day it reached the disk, so a day's partition is
+    exactly that day's records and readers never open anything else.
+
+    Several processes (e.g. gunicorn workers) may share a root: each only
+    appends to parts it created, written as part-NNNN.<pid>.jsonl while
+    open (locked with flock) and renamed to part-NNNN.jsonl when finished.
+    Part numbers are reserved with O_EXCL. Open parts left by a process
+    that exited are finished by the next writer that starts.
+
+    write() only puts an already-serialized line on a bounded queue; one
+    writer thread keeps the current part open and appends whole batches
+    with a single write, every `flush_every` records or `flush_interval_ms`
+    after the first record of a batch, whichever comes first. A full batch
+    also takes everything queued behind it, so a backlog drains in big writes.
+
+    - fsync: "batch" fsyncs every batch, "interval" at most once per
+      `fsync_interval_ms`, "never" leaves it to the OS. A process crash
+      loses nothing already written in any mode; fsync only matters for
+      power loss.
+    - Queue full (`max_queue` lines): with on_full="block" the caller
+      waits up to `block_timeout_ms` for room, with "drop" it does not
+      wait. A line that still does not fit is dropped, counted in
+      stats()["dropped"] and reported in a warning, so a stalled disk can
+      never stall requests indefinitely.
+    - Rotation: the current part is finished once it reaches
+      `rotate_bytes` (0 = no size limit) or a newer day starts. Finished
+      parts are gzip-compressed by a background thread. Late records for
+      an earlier day go to a new part of that day.
+    - close() (also run at exit) drains the queue, finishes the current
+      part and waits for pending compressions.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_queue: int = 10_000,
+        flush_every: int = 256,
+        flush_interval_ms: float = 200.0,
+        fsync: str = "interval",
+        fsync_interval_ms: float = 1000.0,
+        on_full: str = "block",
+        block_timeout_ms: float = 50.0,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        compress: bool = True,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        if on_full not in ON_FULL_POLICIES:
+            raise ValueError(f"on_full must be one of {ON_FULL_POLICIES}, got {on_full!r}")
+        self.root = root
+        self.flush_every = flush_every
+        self.flush_interval_ms = flush_interval_ms
+        self.fsync = fsync
+        self.fsync_interval_ms = fsync_interval_ms
+        self.on_full = on_full
+        self.block_timeout_ms = block_timeout_ms
+        self.rotate_bytes = rotate_bytes
+        self.compress = compress
+        os.makedirs(self.root, exist_ok=True)
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        # Held across write()'s closed check and put, so nothing is queued behind _STOP
+        self._close_lock = threading.Lock()
+        # Serializes part files between the writer thread and import_lines()
+        self._file_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self._last_drop_warning = 0.0
+
+        # Current part, opened on the first batch
+        self._file = None
+        self._day: Optional[str] = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._last_fsync = time.monotonic()
+
+        self._compress_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._compressor = threading.Thread(target=self._run_compressor, name="layer6-log-gzip", daemon=True)
+        self._compressor.start()
+        self._recover_stale()
+
+        self._writer = threading.Thread(target=self._run, name="layer6-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    def write(self, line: str, day: Optional[str] = None) -> bool:
+        """
+        Queue one serialized record (without the trailing newline) for the
+        partition of `day` (YYYY-MM-DD, default: today, UTC).
+        Returns False if it was dropped because the queue stayed full.
+        """
+        item = (day or utc_day(), line)
+        try:
+            with self._close_lock:
+                if self._closed:
+                    raise RuntimeError("forensic log writer is closed")
+                if self.on_full == "block":
+                    self._queue.put(item, timeout=self.block_timeout_ms / 1000.0)
+                else:
+                    self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._last_drop_warning >= 10.0:
+                self._last_drop_warning = now
+                logger.warning("Forensic log queue full: %d records dropped so far", self.dropped)
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything queued before this call is on disk (written
+        and flushed to the OS). Returns False on timeout.
+        """
+        done = threading.Event()
+        with self._close_lock:
+            if self._closed:
+                return True
+            self._queue.put(done)
+        return done.wait(timeout)
+
+    def import_lines(self, day: str, lines: Iterable[str]) -> int:
+        """
+        Synchronously write `lines` as a new finished part of `day`'s
+        partition (used to import existing logs). Returns lines written.
+        """
+        lines = list(lines)
+        if lines:
+            with self._file_lock:
+                self._write_part(day, lines)
+        return len(lines)
+
+    # -----------------------------
+    # Writer thread
+    # -----------------------------
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval_ms / 1000.0
+            batch: List[Tuple[str, str]] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                # Shutdown and flush() callers do not wait for the interval
+                if stop or waiters or len(batch) >= self.flush_every:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            # Commit whatever else is already queued with this batch, so a
+            # backlog (or lines that raced with close()) costs one write
+            if len(batch) >= self.flush_every or stop:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        batch.append(item)
+            try:
+                if batch:
+                    with self._file_lock:
+                        self._commit(batch)
+            except Exception:
+                logger.exception("Forensic log write failed; %d records lost", len(batch))
+            for done in waiters:
+                done.set()
+            if stop:
+                return
+
+    def _commit(self, batch: List[Tuple[str, str]]) -> None:
+        # Records arrive in time order, so a batch is almost always one day
+        runs: List[Tuple[str, List[str]]] = []
+        for day, line in batch:
+            if runs and runs[-1][0] == day:
+                runs[-1][1].append(line)
+            else:
+                runs.append((day, [line]))
+
+        for day, lines in runs:
+            if self._day is not None and day < self._day:
+                self._write_part(day, lines)  # late records for a finished day
+                continue
+            if day != self._day or (self.rotate_bytes and self._size >= self.rotate_bytes):
+                self._start_part(day)
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            self._file.write(data)
+            self._size += len(data)
+        self.written += len(batch)
+        self.batches += 1
+        if self._file is None:
+            return
+        self._file.flush()
+
+        now = time.monotonic()
+        if self.fsync == "batch" or (
+            self.fsync == "interval" and (now - self._last_fsync) * 1000.0 >= self.fsync_interval_ms
+        ):
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+            self._last_fsync = now
+
+    # -----------------------------
+    # Partitions
+    # -----------------------------
+    def day_dir(self, day: str) -> str:
+        return os.path.join(self.root, day)
+
+    def part_names(self, day: str) -> List[Tuple[int, str]]:
+        """(part number, file name) of every part of `day`, in part order."""
+        try:
+            names = os.listdir(self.day_dir(day))
+        except FileNotFoundError:
+            return []
+        # A .gz wins over the plain copy of a part caught mid-compression
+        best: Dict[int, Tuple[int, str]] = {}
+        for name in names:
+            if not (name.startswith("part-") and name[5:9].isdigit()):
+                continue
+            if name.endswith(".jsonl.gz"):
+                rank = 0
+            elif name.endswith(".jsonl"):
+                rank = 1
+            else:
+                continue
+            n = int(name[5:9])
+            if n not in best or rank < best[n][0]:
+                best[n] = (rank, name)
+        return sorted((n, name) for n, (_, name) in best.items())
+
+    def _open_part(self, day: str) -> Tuple[str, BinaryIO]:
+        """
+        Reserve the next part number of `day` (part-NNNN.reserved, until
+        the part is finished) and open its part for this process only:
+        (path, file). Numbers are never reused, including those of parts
+        compacted away (compaction leaves a part-NNNN.compacted marker).
+        """
+        directory = self.day_dir(day)
+        os.makedirs(directory, exist_ok=True)
+        numbers = [int(name[5:9]) for name in os.listdir(directory)
+                   if name.startswith("part-") and name[5:9].isdigit()]
+        n = max(numbers) + 1 if numbers else 1
+        while True:
+            reservation = os.path.join(directory, f"part-{n:04d}.reserved")
+            try:
+                os.close(os.open(reservation, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            except FileExistsError:
+                n += 1
+                continue
+            finished = os.path.join(directory, f"part-{n:04d}.jsonl")
+            if os.path.exists(finished) or os.path.exists(finished + ".gz"):
+                # Written and finished between our listing and the reservation
+                os.remove(reservation)
+                n += 1
+                continue
+            name = f"part-{n:04d}.{os.getpid()}.jsonl"
+            path = os.path.join(directory, name)
+            # Locked (held while the part is open) before it appears under
+            # its name, so _recover_stale never mistakes it for a leftover
+            f = open(os.path.join(directory, "." + name), "xb")
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            os.replace(os.path.join(directory, "." + name), path)
+            return path, f
+
+    @staticmethod
+    def _finish(path: str, f: BinaryIO) -> str:
+        """Flush and close an open part and give it its finished name."""
+        f.flush()
+        os.fsync(f.fileno())
+        finished = finished_name(path)
+        # Renamed before closing, so the lock covers the open part until it is gone
+        os.replace(path, finished)
+        f.close()
+        try:
+            os.remove(finished[:-len(".jsonl")] + ".reserved")
+        except FileNotFoundError:
+            pass
+        return finished
+
+    def _finish_part(self) -> None:
+        if self._file is None:
+            return
+        finished = self._finish(self._path, self._file)
+        self._file = None
+        if self._size:
+            self._queue_compress(finished)
+
+    def _start_part(self, day: str) -> None:
+        if self._file is not None:
+            self._finish_part()
+            self.rotations += 1
+        self._path, self._file = self._open_part(day)
+        self._day, self._size = day, 0
+
+    def _write_part(self, day: str, lines: List[str]) -> None:
+        path, f = self._open_part(day)
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self._queue_compress(self._finish(path, f))
+
+    def _recover_stale(self) -> None:
+        """
+        Finish (and compress) the open parts left by processes that have
+        exited: their lock is gone. Parts of running writers, in this
+        process or others, are never touched.
+        """
+        if fcntl is None:
+            return
+        for day in self.days():
+            for _, name in self.part_names(day):
+                if open_part_owner(name) is None:
+                    continue
+                path = os.path.join(self.day_dir(day), name)
+                try:
+                    f = open(path, "ab")
+                except FileNotFoundError:
+                    continue  # Finished in the meantime
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue  # Still being written
+                if not os.path.exists(path):
+                    f.close()  # Finished between open and lock
+                    continue
+                size = f.tell()
+                finished = self._finish(path, f)
+                if size:
+                    self._queue_compress(finished)
+                logger.info("Recovered forensic log part %s left by process %s", finished, open_part_owner(name))
+
+    def _queue_compress(self, path: str) -> None:
+        if self.compress:
+            self._compress_queue.put(path)
+
+    def _run_compressor(self) -> None:
+        # Only ever given parts this writer finished, so no other process
+        # has them open
+        while True:
+            path = self._compress_queue.get()
+            if path is None:
+                return
+            try:
+                with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(path + ".gz.tmp", path + ".gz")
+                os.remove(path)
+            except OSError:
+                logger.exception("Could not compress forensic log part %s", path)
+
+    def days(self) -> List[str]:
+        """Days that have a partition, oldest first."""
+        return sorted(
+            name for name in os.listdir(self.root)
+            if len(name) == 10 and name[4] == "-" and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def parts(self, day: str) -> List[str]:
+        """Part files (plain or gzip) of `day`, in write order."""
+        return [os.path.join(self.day_dir(day), name) for _, name in self.part_names(day)]
+
+    def current_part(self) -> Optional[str]:
+        """The part the writer is appending to, if any."""
+        return self._path if self._file is not None else None
+
+    @staticmethod
+    def read_part(path: str) -> Iterator[str]:
+        """Stream the raw lines of one part file."""
+        try:
+            opener = gzip.open if path.endswith(".gz") else open
+            f = opener(path, "rt", encoding="utf-8")
+        except FileNotFoundError:
+            # Finished, or compressed, between listing and opening
+            path = finished_name(path)
+            try:
+                f = open(path, "rt", encoding="utf-8")
+            except FileNotFoundError:
+                f = gzip.open(path + ".gz", "rt", encoding="utf-8")
+        with f:
+            yield from f
+
+    def read_day(self, day: str, skip: Iterable[int] = ()) -> Iterator[str]:
+        """
+        Stream the raw lines of `day`'s partition, one at a time, leaving
+        out the part numbers in `skip`.
+        """
+        skip = set(skip)
+        for n, name in self.part_names(day):
+            if n not in skip:
+                yield from self.read_part(os.path.join(self.day_dir(day), name))
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "rotations": self.rotations,
+        }
+
+    def close(self) -> None:
+        """Drain the queue, flush and fsync. Safe to call more than once."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._writer.join()
+        with self._file_lock:
+            self._finish_part()
+        self._compress_queue.put(None)
+        self._compressor.join()
@@ -0,0 +1,172 @@
+# layer6/rolling_metrics.py
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Layers that can end a request, and the severities Layer 3 hands out
+# (BLOCKED: ended before Layer 3 assigned one)
+BLOCKING_LAYERS = ("layer2", "layer3", "layer4", "layer5")
+SEVERITIES = ("SAFE", "SUSPICIOUS", "ATTACK", "BLOCKED")
+
+COUNTERS = (
+    ("requests", "blocked", "suspicious", "successful_attacks", "sanitizations", "pii_redactions")
+    + tuple(f"blocked_{layer}" for layer in BLOCKING_LAYERS)
+    + tuple(f"severity_{severity}" for severity in SEVERITIES)
+)
+_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+
+# name: (span in seconds, buckets); a window slides one bucket at a time
+WINDOWS = {
+    "minute": (60, 60),
+    "hour": (3600, 60),
+    "day": (86400, 96),
+}
+
+
+class _SlidingWindow:
+    """
+    Counter sums over the last `span` seconds, kept as a ring of `buckets`
+    buckets plus their running sums: adding a record and reading the sums
+    are both O(number of counters), whatever the traffic.
+    """
+
+    def __init__(self, span: float, buckets: int):
+        self.width = span / buckets
+        self.buckets = [[0] * len(COUNTERS) for _ in range(buckets)]
+        self.sums = [0] * len(COUNTERS)
+        self.head: Optional[int] = None  # absolute number of the newest bucket
+
+    def _advance(self, slot: int) -> None:
+        if self.head is None or slot - self.head >= len(self.buckets):
+            for bucket in self.buckets:
+                bucket[:] = [0] * len(COUNTERS)
+            self.sums = [0] * len(COUNTERS)
+            self.head = slot
+            return
+        while self.head < slot:
+            self.head += 1
+            bucket = self.buckets[self.head % len(self.buckets)]
+            for i, value in enumerate(bucket):
+                if value:
+                    self.sums[i] -= value
+                    bucket[i] = 0
+
+    def add(self, at: float, hits: List[int]) -> None:
+        slot = int(at // self.width)
+        if self.head is None or slot > self.head:
+            self._advance(slot)
+        elif slot <= self.head - len(self.buckets):
+            return  # already outside the window
+        bucket = self.buckets[slot % len(self.buckets)]
+        for i in hits:
+            bucket[i] += 1
+            self.sums[i] += 1
+
+    def totals(self, now: float) -> List[int]:
+        slot = int(now // self.width)
+        if self.head is None or slot > self.head:
+            self._advance(slot)
+        return list(self.sums)
+
+
+def _hits(transaction: Dict[str, Any]) -> List[int]:
+    """Indexes of the counters one transaction increments."""
+    hits = [_INDEX["requests"]]
+    blocked = transaction.get("was_blocked") == True
+    suspicious = transaction.get("layer2_is_suspicious") == True
+    if blocked:
+        hits.append(_INDEX["blocked"])
+        layer = _INDEX.get(f"blocked_{transaction.get('blocked_by')}")
+        if layer is not None:
+            hits.append(layer)
+    if suspicious:
+        hits.append(_INDEX["suspicious"])
+        if transaction.get("was_blocked") == False:
+            hits.append(_INDEX["successful_attacks"])
+    if transaction.get("layer1_flags"):
+        hits.append(_INDEX["sanitizations"])
+    if transaction.get("layer4_issues"):
+        hits.append(_INDEX["pii_redactions"])
+    severity = transaction.get("severity") or ("BLOCKED" if blocked else None)
+    if severity is not None:
+        index = _INDEX.get(f"severity_{severity}")
+        if index is not None:
+            hits.append(index)
+    return hits
+
+
+def _summary(sums: List[int]) -> Dict[str, Any]:
+    value = dict(zip(COUNTERS, sums))
+    return {
+        "requests": value["requests"],
+        "blocked": value["blocked"],
+        "blocked_by": {layer: value[f"blocked_{layer}"] for layer in BLOCKING_LAYERS},
+        "severity": {severity: value[f"severity_{severity}"] for severity in SEVERITIES},
+        "suspicious": value["suspicious"],
+        "successful_attacks": value["successful_attacks"],
+        # Injection Success Rate, as in the daily report
+        "isr": (value["successful_attacks"] / value["suspicious"] * 100) if value["suspicious"] else 0.0,
+        "sanitizations": value["sanitizations"],
+        "pii_redactions": value["pii_redactions"],
+    }
+
+
+class RollingMetrics:
+    """
+    Live Layer 6 metrics, updated as transactions are recorded: running
+    totals plus sliding windows over the last minute, hour and day
+    (WINDOWS). observe() and snapshot() are constant time.
+
+    State is per process: each worker counts the transactions it records,
+    after seeding itself from the log with rebuild() on startup.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._totals = [0] * len(COUNTERS)
+        self._windows = {name: _SlidingWindow(span, buckets) for name, (span, buckets) in WINDOWS.items()}
+        self.since: Optional[float] = None
+
+    def observe(self, transaction: Dict[str, Any], at: Optional[float] = None) -> None:
+        """Count one transaction (a logged dict), at `at` epoch seconds (default: now)."""
+        if at is None:
+            at = self.clock()
+        hits = _hits(transaction)
+        with self._lock:
+            if self.since is None or at < self.since:
+                self.since = at
+            for i in hits:
+                self._totals[i] += 1
+            for window in self._windows.values():
+                window.add(at, hits)
+
+    def rebuild(self, transactions: Iterable[Dict[str, Any]]) -> int:
+        """
+        Seed the counters from logged transactions (e.g. the last day's),
+        placing each at its own timestamp. Returns transactions counted.
+        """
+        now = self.clock()
+        count = 0
+        for transaction in transactions:
+            try:
+                at = datetime.fromisoformat(str(transaction.get("timestamp"))).timestamp()
+            except ValueError:
+                continue
+            self.observe(transaction, min(at, now))
+            count += 1
+        return count
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self.clock()
+        with self._lock:
+            totals = list(self._totals)
+            windows = {name: window.totals(now) for name, window in self._windows.items()}
+            since = self.since
+        return {
+            "generated_at": datetime.fromtimestamp(now).isoformat(),
+            "since": datetime.fromtimestamp(since).isoformat() if since is not None else None,
+            "totals": _summary(totals),
+            "windows": {name: _summary(sums) for name, sums in windows.items()},
+        }
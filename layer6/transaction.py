@@ -0,0 +1,64 @@
+# layer6/transaction.py
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class TransactionRecord:
+    """
+    One forensic log record: every layer writes its result into the same
+    typed fields, so the log, the Parquet compaction and the report
+    metrics all share one schema (see compaction.ARROW_SCHEMA).
+    """
+    timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    user_id: str = "anonymous"
+    raw_input: str = ""
+    # Layer 1
+    sanitized_input: Optional[str] = None
+    layer1_flags: List[str] = field(default_factory=list)
+    # Layer 2 (suspicious: blocked, or scored high enough to armor as such)
+    layer2_score: Optional[float] = None
+    layer2_is_suspicious: bool = False
+    # Nearest known attack (see layer2.signatures), when close enough to tag
+    layer2_technique: Optional[str] = None
+    layer2_signature_similarity: Optional[float] = None
+    # Layer 3
+    severity: Optional[str] = None
+    layer3_armored: Optional[bool] = None
+    # Layer 4
+    layer4_issues: List[str] = field(default_factory=list)
+    final_output: Optional[str] = None
+    # Outcome: the layer that ended the request, if any
+    was_blocked: bool = False
+    blocked_by: Optional[str] = None
+    # Milliseconds spent per pipeline stage (see latency.STAGES)
+    stage_ms: Dict[str, float] = field(default_factory=dict)
+    # Fields outside the schema (records written as plain dicts)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Flat JSONL shape: schema fields, then any extra fields."""
+        record = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "extra"}
+        record["layer1_flags"] = list(self.layer1_flags)
+        record["layer4_issues"] = list(self.layer4_issues)
+        record["stage_ms"] = dict(self.stage_ms)
+        record.update(self.extra)
+        return record
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TransactionRecord":
+        """Typed record from a logged dict; unknown keys are kept in `extra`."""
+        known = {name: data[name] for name in FIELD_NAMES if name in data and data[name] is not None}
+        known["extra"] = {key: value for key, value in data.items() if key not in FIELD_NAMES}
+        known["layer1_flags"] = list(known.get("layer1_flags") or [])
+        known["layer4_issues"] = list(known.get("layer4_issues") or [])
+        known["stage_ms"] = dict(known.get("stage_ms") or {})
+        for name in ("layer2_is_suspicious", "was_blocked"):
+            known[name] = bool(known.get(name, False))
+        if "timestamp" in known:
+            known["timestamp"] = str(known["timestamp"])
+        return cls(**known)
+
+
+FIELD_NAMES = tuple(f.name for f in fields(TransactionRecord) if f.name != "extra")
@@ -0,0 +1,565 @@
+# llm_backends.py - Pluggable LLM backends for the PromptGuard gateway
+#
+# Every backend exposes the same two calls used by the Pipeline:
+#     generate(system_prompt, user_prompt) -> str
+#     stream(system_prompt, user_prompt)   -> Iterator[str]
+# Errors are returned as "Error: ..." text (never raised), matching the
+# original run_llama behaviour, so Layer 4 and the frontend see a response.
+#
+# For the asyncio gateway (async_api.py) each backend also offers
+#     await agenerate(system_prompt, user_prompt) -> str
+#     astream(system_prompt, user_prompt)         -> AsyncIterator[str]
+# which wait on the LLM without holding a thread.
+import asyncio
+import codecs
+import http.client
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class SubprocessBackend:
+    """
+    Fallback backend: one `ollama run <model>` process per request, prompt on stdin.
+    """
+
+    def __init__(self, model: str = "llama3.2:1b", timeout: float = 60.0):
+        self.model = model
+        self.timeout = timeout
+
+    def _command(self):
+        return ["ollama", "run", self.model]
+
+    def generate(self, system_prompt: str, user_prompt: str) -> str:
+        """Call Ollama LLM"""
+        full_prompt = f"{system_prompt}\n\nUser: {user_prompt}"
+
+        try:
+            # Using input=full_prompt to pass via stdin is safer for large/complex strings
+            result = subprocess.run(
+                self._command(),
+                input=full_prompt,
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                timeout=self.timeout
+            )
+
+            if result.returncode != 0:
+                logger.warning(f"Ollama stderr: {result.stderr}")
+                return "Error: LLM failed to respond."
+
+            return result.stdout.strip()
+        except subprocess.TimeoutExpired:
+            logger.error("Ollama call timed out")
+            return "Error: LLM response timeout."
+        except Exception as e:
+            logger.error(f"Error calling Ollama: {str(e)}")
+            return f"Error: {str(e)}"
+
+    def stream(self, system_prompt: str, user_prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """Call Ollama LLM and yield output chunks as soon as they are produced.
+
+        Closing the generator (e.g. when Layer 4 aborts) kills the ollama process,
+        so no more tokens are generated for a response that will be blocked.
+        `timeout` overrides self.timeout (e.g. what is left of a caller's deadline).
+        """
+        full_prompt = f"{system_prompt}\n\nUser: {user_prompt}"
+        budget = self.timeout if timeout is None else timeout
+
+        try:
+            proc = subprocess.Popen(
+                self._command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        except Exception as e:
+            logger.error(f"Error calling Ollama: {str(e)}")
+            yield f"Error: {str(e)}"
+            return
+
+        # Same budget as generate() unless given, enforced while we read
+        watchdog = threading.Timer(budget, proc.kill)
+        watchdog.start()
+        try:
+            proc.stdin.write(full_prompt.encode("utf-8"))
+            proc.stdin.close()
+
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            produced = False
+            while True:
+                data = proc.stdout.read1(4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    produced = True
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                produced = True
+                yield tail
+
+            if proc.wait() != 0:
+                timed_out = not watchdog.is_alive()
+                logger.warning(f"Ollama exited with code {proc.returncode}" + (" (timed out)" if timed_out else ""))
+                if not produced:
+                    yield "Error: LLM response timeout." if timed_out else "Error: LLM failed to respond."
+        finally:
+            watchdog.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    async def agenerate(self, system_prompt: str, user_prompt: str) -> str:
+        parts = [chunk async for chunk in self.astream(system_prompt, user_prompt)]
+        return "".join(parts).strip()
+
+    async def astream(self, system_prompt: str, user_prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """asyncio version of stream(): awaits the CLI's stdout without a thread."""
+        full_prompt = f"{system_prompt}\n\nUser: {user_prompt}"
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self._command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        except Exception as e:
+            logger.error(f"Error calling Ollama: {str(e)}")
+            yield f"Error: {str(e)}"
+            return
+
+        try:
+            proc.stdin.write(full_prompt.encode("utf-8"))
+            await proc.stdin.drain()
+            proc.stdin.close()
+
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            produced = False
+            while True:
+                data = await asyncio.wait_for(proc.stdout.read(4096), deadline - time.monotonic())
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    produced = True
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                produced = True
+                yield tail
+
+            if await proc.wait() != 0:
+                logger.warning(f"Ollama exited with code {proc.returncode}")
+                if not produced:
+                    yield "Error: LLM failed to respond."
+        except asyncio.TimeoutError:
+            logger.error("Ollama call timed out")
+            yield "Error: LLM response timeout."
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "subprocess", "model": self.model}
+
+
+class OllamaHTTPBackend:
+    """
+    Talks to a resident `ollama serve` (or any server speaking its
+    /api/generate protocol) over pooled keep-alive HTTP connections.
+
+    - max_concurrency: in-flight generations allowed at once; extra callers
+      wait for a slot until their deadline, then get an error response.
+    - timeout: per-call deadline in seconds, covering the wait for a slot,
+      connecting and reading the whole (or streamed) response.
+    - keep_alive: how long the server keeps the model loaded between calls.
+    - fallback: backend used when the server cannot be reached at all.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:11434",
+        model: str = "llama3.2:1b",
+        max_concurrency: int = 4,
+        timeout: float = 60.0,
+        keep_alive: str = "30m",
+        fallback: Optional[SubprocessBackend] = None,
+    ):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 11434
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.fallback = fallback
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+
+        # asyncio side: own slots and pool, bound to the loop that first uses them
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._async_pool: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "busy_rejections": 0,
+            "timeouts": 0,
+            "fallbacks": 0,
+        }
+
+    # -----------------------------
+    # Connection pool
+    # -----------------------------
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def _checkout(self, timeout: float) -> http.client.HTTPConnection:
+        try:
+            conn = self._pool.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            self._count("connections_reused")
+            return conn
+        except queue.Empty:
+            self._count("connections_opened")
+            return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _checkin(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def _payload(self, system_prompt: str, user_prompt: str, stream: bool) -> bytes:
+        return json.dumps({
+            "model": self.model,
+            "system": system_prompt,
+            "prompt": f"User: {user_prompt}",
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }).encode("utf-8")
+
+    def _post(self, body: bytes, deadline: float):
+        """
+        Send POST /api/generate on a pooled connection, retrying once on a
+        stale keep-alive socket. Returns (conn, response, socket); the socket
+        is kept because conn drops it when the response will close.
+        """
+        for attempt in range(2):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("LLM deadline exceeded")
+            conn = self._checkout(remaining)
+            try:
+                conn.request("POST", "/api/generate", body=body, headers={
+                    "Content-Type": "application/json",
+                    "Connection": "keep-alive",
+                })
+                sock = conn.sock
+                return conn, conn.getresponse(), sock
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Server closed an idle pooled connection; retry on a fresh one
+                conn.close()
+                if attempt == 1:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+    # -----------------------------
+    # Backend API
+    # -----------------------------
+    def generate(self, system_prompt: str, user_prompt: str) -> str:
+        return "".join(self.stream(system_prompt, user_prompt)).strip()
+
+    def stream(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        """
+        Yield response text as the server produces it. Closing the generator
+        early drops the connection, which makes the server stop generating.
+        """
+        deadline = time.monotonic() + self.timeout
+        self._count("requests")
+
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("busy_rejections")
+            logger.error("LLM backend busy: no free slot before the deadline")
+            yield "Error: LLM busy, try again later."
+            return
+
+        conn = None
+        reusable = False
+        try:
+            try:
+                conn, response, sock = self._post(self._payload(system_prompt, user_prompt, stream=True), deadline)
+            except (ConnectionRefusedError, OSError) as e:
+                if isinstance(e, TimeoutError) or self.fallback is None:
+                    raise
+                self._count("fallbacks")
+                logger.warning(f"Ollama server unreachable ({e}); using subprocess fallback")
+                yield from self.fallback.stream(system_prompt, user_prompt,
+                                                timeout=max(0.0, deadline - time.monotonic()))
+                return
+
+            if response.status != 200:
+                logger.warning(f"Ollama HTTP {response.status}: {response.read()[:200]!r}")
+                reusable = not response.will_close
+                yield "Error: LLM failed to respond."
+                return
+
+            while True:
+                # Each read may only wait for what is left of the deadline
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM deadline exceeded")
+                sock.settimeout(remaining)
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("error"):
+                    logger.warning(f"Ollama error: {event['error']}")
+                    yield "Error: LLM failed to respond."
+                    break
+                text = event.get("response", "")
+                if text:
+                    yield text
+                if event.get("done"):
+                    # Drain the chunked terminator so the socket can be reused
+                    response.read()
+                    reusable = not response.will_close
+                    break
+        except TimeoutError:
+            self._count("timeouts")
+            logger.error("Ollama call timed out")
+            yield "Error: LLM response timeout."
+        except Exception as e:
+            logger.error(f"Error calling Ollama: {str(e)}")
+            yield f"Error: {str(e)}"
+        finally:
+            if conn is not None:
+                self._checkin(conn, reusable)
+            self._slots.release()
+
+    # -----------------------------
+    # asyncio API
+    # -----------------------------
+    def _bind_loop(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+            self._async_pool = []
+        return self._async_slots
+
+    async def _aopen(self):
+        while self._async_pool:
+            reader, writer = self._async_pool.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                self._count("connections_reused")
+                return reader, writer, True
+            writer.close()
+        self._count("connections_opened")
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        return reader, writer, False
+
+    async def _apost(self, body: bytes):
+        """
+        POST /api/generate and read the status line and headers.
+        Returns (reader, writer, status, headers).
+        """
+        for attempt in range(2):
+            reader, writer, reused = await self._aopen()
+            try:
+                writer.write(
+                    f"POST /api/generate HTTP/1.1\r\n"
+                    f"Host: {self.host}:{self.port}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode("ascii") + body
+                )
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionResetError("server closed the connection")
+                status = int(status_line.split()[1])
+
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                return reader, writer, status, headers
+            except (ConnectionResetError, BrokenPipeError):
+                writer.close()
+                # Only a stale pooled connection earns a retry
+                if not reused or attempt == 1:
+                    raise
+            except Exception:
+                writer.close()
+                raise
+
+    @staticmethod
+    async def _abody_lines(reader: asyncio.StreamReader, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+        """Yield NDJSON lines from a chunked, sized or close-delimited body."""
+        buffer = b""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await reader.readline()  # CRLF after the last chunk
+                    break
+                buffer += await reader.readexactly(size)
+                await reader.readexactly(2)
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    yield line
+        elif "content-length" in headers:
+            buffer = await reader.readexactly(int(headers["content-length"]))
+        else:
+            buffer = await reader.read()
+        for line in buffer.split(b"\n"):
+            yield line
+
+    async def agenerate(self, system_prompt: str, user_prompt: str) -> str:
+        parts = [chunk async for chunk in self.astream(system_prompt, user_prompt)]
+        return "".join(parts).strip()
+
+    async def astream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        asyncio version of stream(): same pooling, limit, deadline and
+        fallback semantics, but waits on sockets instead of threads.
+        """
+        deadline = time.monotonic() + self.timeout
+        self._count("requests")
+        slots = self._bind_loop()
+
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._count("busy_rejections")
+            logger.error("LLM backend busy: no free slot before the deadline")
+            yield "Error: LLM busy, try again later."
+            return
+
+        conn = None
+        reusable = False
+        try:
+            try:
+                reader, writer, status, headers = await asyncio.wait_for(
+                    self._apost(self._payload(system_prompt, user_prompt, stream=True)),
+                    deadline - time.monotonic()
+                )
+                conn = (reader, writer)
+            except asyncio.TimeoutError:
+                raise
+            except OSError as e:
+                if self.fallback is None:
+                    raise
+                self._count("fallbacks")
+                logger.warning(f"Ollama server unreachable ({e}); using subprocess fallback")
+                async for chunk in self.fallback.astream(system_prompt, user_prompt,
+                                                         timeout=max(0.0, deadline - time.monotonic())):
+                    yield chunk
+                return
+
+            if status != 200:
+                logger.warning(f"Ollama HTTP {status}")
+                yield "Error: LLM failed to respond."
+                return
+
+            lines = self._abody_lines(reader, headers)
+            while True:
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), deadline - time.monotonic())
+                except StopAsyncIteration:
+                    reusable = headers.get("connection", "").lower() != "close"
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("error"):
+                    logger.warning(f"Ollama error: {event['error']}")
+                    yield "Error: LLM failed to respond."
+                    break
+                text = event.get("response", "")
+                if text:
+                    yield text
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            logger.error("Ollama call timed out")
+            yield "Error: LLM response timeout."
+        except Exception as e:
+            logger.error(f"Error calling Ollama: {str(e)}")
+            yield f"Error: {str(e)}"
+        finally:
+            if conn is not None:
+                if reusable:
+                    self._async_pool.append(conn)
+                else:
+                    conn[1].close()
+            slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            counters = dict(self._counters)
+        return {
+            "backend": "http",
+            "url": self.base_url,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "idle_connections": self._pool.qsize(),
+            **counters,
+        }
+
+
+def build_backend(
+    kind: str = "http",
+    base_url: str = "http://127.0.0.1:11434",
+    model: str = "llama3.2:1b",
+    max_concurrency: int = 4,
+    timeout: float = 60.0,
+    keep_alive: str = "30m",
+):
+    """
+    kind: "http" (resident server, subprocess fallback) or "subprocess".
+    """
+    subprocess_backend = SubprocessBackend(model=model, timeout=timeout)
+    if kind == "subprocess":
+        return subprocess_backend
+    if kind != "http":
+        raise ValueError(f"Unknown LLM backend: {kind}")
+    return OllamaHTTPBackend(
+        base_url=base_url,
+        model=model,
+        max_concurrency=max_concurrency,
+        timeout=timeout,
+        keep_alive=keep_alive,
+        fallback=subprocess_backend,
+    )
@@ -0,0 +1,80 @@
+# test_layer2_allowlist.py
+# "downweight" must stay softer than "skip": an allowlisted prompt the model
+# is sure about is still blocked at the default threshold, while the same
+# raw score on the edge of the threshold passes. Scores come from a stub
+# cascade, so no model is loaded.
+import sys
+
+import layer2.intent_detector as intent_detector
+
+THRESHOLD = 0.95
+MARGIN = 0.5
+
+
+class _MatchAll:
+    def match(self, prompt):
+        return object()
+
+
+class _FixedScores:
+    """Cascade stand-in that "decides" every prompt with a preset score."""
+
+    def __init__(self, scores):
+        self.scores = scores
+
+    def decide(self, prompt):
+        return self.scores[prompt]
+
+
+def _with_allowlist(scores, mode="downweight"):
+    intent_detector.allowlist = _MatchAll()
+    intent_detector.allowlist_mode = mode
+    intent_detector.allowlist_margin = MARGIN
+    intent_detector.cascade = _FixedScores(scores)
+
+
+def _reset():
+    intent_detector.allowlist = None
+    intent_detector.cascade = None
+
+
+def test_downweight_still_blocks_confident_attacks():
+    scores = {"sure": 0.99, "edge": 0.96, "low": 0.4}
+    _with_allowlist(scores)
+    try:
+        single = {p: intent_detector.detect_intent(p, threshold=THRESHOLD)["is_malicious"] for p in scores}
+        batch = intent_detector.detect_intent_batch(list(scores), threshold=THRESHOLD)
+    finally:
+        _reset()
+    # Blocking needs a raw score of 0.95 + 0.5 * 0.05 = 0.975
+    assert single == {"sure": True, "edge": False, "low": False}, single
+    assert [v["is_malicious"] for v in batch] == [True, False, False], batch
+    print(f"✓ downweight: raw 0.99 blocked, raw 0.96 passes at threshold {THRESHOLD}")
+
+
+def test_skip_never_blocks():
+    _with_allowlist({"sure": 0.99}, mode="skip")
+    try:
+        verdict = intent_detector.detect_intent("sure", threshold=THRESHOLD)
+    finally:
+        _reset()
+    assert not verdict["is_malicious"] and verdict["score"] == intent_detector.ALLOWLIST_SCORE
+    print("✓ skip: allowlisted prompt is never scored")
+
+
+def test_margin_must_leave_headroom():
+    for margin in (1.0, 1.5, -0.1):
+        try:
+            intent_detector.enable_allowlist(margin=margin)
+        except ValueError:
+            continue
+        raise AssertionError(f"margin {margin} was accepted")
+    print("✓ margins outside [0, 1) are rejected")
+
+
+if __name__ == "__main__":
+    print("🔍 TESTING LAYER 2 ALLOWLIST\n" + "=" * 50)
+    test_downweight_still_blocks_confident_attacks()
+    test_skip_never_blocks()
+    test_margin_must_leave_headroom()
+    sys.exit(0)
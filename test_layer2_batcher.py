@@ -0,0 +1,95 @@
+# test_layer2_batcher.py
+# MicroBatcher must hand every caller the score of ITS prompt, fail (never
+# strand) callers when a batch cannot be matched back to its prompts, and
+# resolve every future, even those racing close().
+import sys
+import threading
+import time
+from concurrent.futures import wait
+
+from layer2.micro_batcher import MicroBatcher, MicroBatcherClosed
+
+CALLERS = 64
+
+
+def _score_by_number(prompts):
+    # Distinct, recognisable score per prompt: "17" → 0.17
+    time.sleep(0.002)
+    return [int(p) / 100 for p in prompts]
+
+
+def test_fan_out_keeps_each_callers_score():
+    batcher = MicroBatcher(_score_by_number, max_batch_size=8, max_wait_ms=5.0)
+    results = {}
+    start = threading.Barrier(CALLERS)
+
+    def caller(n):
+        start.wait()
+        results[n] = batcher.score(str(n), timeout=10)
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(CALLERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = batcher.stats()
+    batcher.close()
+
+    assert results == {n: n / 100 for n in range(CALLERS)}, "a caller got another prompt's score"
+    assert stats["requests"] == CALLERS and stats["mean_batch_size"] > 1, stats
+    print(f"✓ {CALLERS} callers, {stats['batches']} batches (mean size {stats['mean_batch_size']:.1f}), scores in order")
+
+
+def test_wrong_count_fails_every_future():
+    batcher = MicroBatcher(lambda prompts: [0.5], max_batch_size=4, max_wait_ms=50.0)
+    futures = [batcher.submit(str(n)) for n in range(4)]
+    done, not_done = wait(futures, timeout=10)
+    batcher.close()
+
+    assert not not_done, f"{len(not_done)} callers left waiting"
+    assert all(isinstance(f.exception(), RuntimeError) for f in done), [f.exception() for f in done]
+    print("✓ score_fn returning 1 score for 4 prompts fails all 4 futures")
+
+
+def test_close_with_submits_in_flight_resolves_everything():
+    batcher = MicroBatcher(_score_by_number, max_batch_size=4, max_wait_ms=1.0)
+    futures, refused = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(9)
+
+    def submitter():
+        start.wait()
+        for n in range(200):
+            try:
+                future = batcher.submit(str(n % 100))
+            except MicroBatcherClosed:
+                with lock:
+                    refused.append(n)
+                return
+            with lock:
+                futures.append(future)
+
+    threads = [threading.Thread(target=submitter) for _ in range(8)]
+    for t in threads:
+        t.start()
+    start.wait()
+    time.sleep(0.005)
+    batcher.close(timeout=10)
+    for t in threads:
+        t.join()
+
+    done, not_done = wait(futures, timeout=10)
+    scored = sum(1 for f in done if f.exception() is None)
+    failed = [f.exception() for f in done if f.exception() is not None]
+    assert not not_done, f"{len(not_done)} futures never resolved after close()"
+    assert all(isinstance(e, MicroBatcherClosed) for e in failed), failed
+    print(f"✓ close() mid-submit: {scored} scored, {len(failed)} failed closed, "
+          f"{len(refused)} submitters refused, none left waiting")
+
+
+if __name__ == "__main__":
+    print("🔍 TESTING LAYER 2 MICRO-BATCHER\n" + "=" * 50)
+    test_fan_out_keeps_each_callers_score()
+    test_wrong_count_fails_every_future()
+    test_close_with_submits_in_flight_resolves_everything()
+    sys.exit(0)
@@ -0,0 +1,76 @@
+# test_layer5_stress.py
+# N worker processes hammer ONE user with "breach" events through their own
+# UserProfiler on a shared store. No update may be lost, and the ban must
+# trigger exactly when the score reaches the configured ban score.
+import multiprocessing
+import os
+import tempfile
+
+from layer5.profile_store import ProfileStore
+from layer5.user_profiler import UserProfiler
+
+USER_ID = "stress_user"
+PROCESSES = 8
+EVENTS_PER_PROCESS = 25
+BAN_SCORE = 30
+BREACH_POINTS = 10
+
+
+def worker(db_path: str, start_barrier, results):
+    # Decay off: the ban must land exactly at BAN_SCORE however long the run takes
+    profiler = UserProfiler(
+        store=ProfileStore(db_path), legacy_file=None, ban_score=BAN_SCORE, score_half_life_seconds=None
+    )
+    start_barrier.wait()
+    observed = []
+    for _ in range(EVENTS_PER_PROCESS):
+        profile = profiler.update_score(USER_ID, "breach")
+        observed.append((profile["score"], profile["banned"]))
+    profiler.store.close()
+    results.put(observed)
+
+
+def test_concurrent_breaches_ban_at_threshold():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "profiles.db")
+        ProfileStore(db_path).close()  # create the schema once up front
+
+        start_barrier = multiprocessing.Barrier(PROCESSES)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(db_path, start_barrier, results))
+            for _ in range(PROCESSES)
+        ]
+        for p in procs:
+            p.start()
+        observed = [entry for _ in procs for entry in results.get(timeout=120)]
+        for p in procs:
+            p.join()
+
+        final = UserProfiler(
+            store=ProfileStore(db_path), legacy_file=None, score_half_life_seconds=None
+        ).get_profile(USER_ID)
+
+    total = PROCESSES * EVENTS_PER_PROCESS
+    scores = sorted(score for score, _ in observed)
+    expected = [BREACH_POINTS * (i + 1) for i in range(total)]
+    wrong_bans = [(score, banned) for score, banned in observed if banned != (score >= BAN_SCORE)]
+
+    print(f"Events sent: {total} from {PROCESSES} processes")
+    assert len(observed) == total, f"{len(observed)} of {total} updates returned"
+    assert scores == expected, f"Lost or duplicated updates: {len(set(scores))} distinct scores, expected {total}"
+    print(f"✓ Every update applied exactly once (final score {scores[-1]})")
+
+    assert not wrong_bans, f"Ban state wrong at scores: {wrong_bans[:5]}"
+    assert sum(banned for _, banned in observed) == total - BAN_SCORE // BREACH_POINTS + 1
+    print(f"✓ Ban triggered exactly at score {BAN_SCORE}")
+
+    assert final["score"] == total * BREACH_POINTS, f"Stored score {final['score']}"
+    assert final["banned"], "Stored profile not banned"
+    assert len(final["events"]) == 50, f"Stored history has {len(final['events'])} events"
+    print("✓ Stored profile matches (banned, history trimmed to 50 events)")
+
+
+if __name__ == "__main__":
+    print("🔍 STRESS TESTING LAYER 5 ACROSS PROCESSES\n" + "=" * 50)
+    test_concurrent_breaches_ban_at_threshold()
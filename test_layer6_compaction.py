@@ -0,0 +1,113 @@
+# test_layer6_compaction.py
+# A day is compacted to Parquet, a late part arrives and the day is
+# compacted again. At every step, before and after the covered JSONL parts
+# are deleted, daily_metrics and iter_logs must see each record exactly once.
+import os
+import sys
+import tempfile
+from collections import Counter
+
+from layer6 import TransactionRecord, compaction
+from layer6.forensic_analysis import ForensicAnalyzer
+from layer6.log_writer import open_part_owner
+
+DAY = "2026-01-15"
+NEXT_DAY = "2026-01-16"
+FIRST_BATCH = 120
+LATE_BATCH = 30
+METRIC_KEYS = ("total_requests", "detected_attacks", "successful_attacks", "sanitizations", "pii_prevented")
+
+
+def _transaction(i: int, day: str = DAY) -> TransactionRecord:
+    suspicious = i % 4 == 0
+    return TransactionRecord(
+        timestamp=f"{day}T12:00:{i % 60:02d}",
+        user_id=f"user-{i}",
+        raw_input=f"prompt {i}",
+        layer1_flags=["phrase_jailbreak"] if i % 3 == 0 else [],
+        layer2_is_suspicious=suspicious,
+        layer4_issues=["Potential SSN"] if i % 5 == 0 else [],
+        was_blocked=suspicious and i % 8 == 0,
+    )
+
+
+def _expected_metrics(ids) -> dict:
+    records = [_transaction(i) for i in ids]
+    return {
+        "total_requests": len(records),
+        "detected_attacks": sum(r.layer2_is_suspicious for r in records),
+        "successful_attacks": sum(r.layer2_is_suspicious and not r.was_blocked for r in records),
+        "sanitizations": sum(bool(r.layer1_flags) for r in records),
+        "pii_prevented": sum(bool(r.layer4_issues) for r in records),
+    }
+
+
+def _check(analyzer: ForensicAnalyzer, ids, step: str) -> None:
+    users = Counter(log["user_id"] for log in analyzer.iter_logs(DAY))
+    expected_users = {f"user-{i}" for i in ids}
+    assert set(users) == expected_users, f"{step}: iter_logs saw {len(users)} users, expected {len(expected_users)}"
+    duplicated = [user for user, n in users.items() if n > 1]
+    assert not duplicated, f"{step}: iter_logs repeated {duplicated[:5]}"
+
+    metrics = analyzer.daily_metrics(DAY)
+    got = {key: metrics[key] for key in METRIC_KEYS}
+    assert got == _expected_metrics(ids), f"{step}: daily_metrics {got} != {_expected_metrics(ids)}"
+    print(f"✓ {step}: {len(ids)} records, each counted once")
+
+
+def _jsonl_parts(analyzer: ForensicAnalyzer):
+    return [name for _, name in analyzer.writer.part_names(DAY)]
+
+
+def test_compaction_counts_every_record_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = ForensicAnalyzer(os.path.join(tmp, "logs"), os.path.join(tmp, "reports"),
+                                    compact_interval_seconds=None, rebuild_metrics=False)
+        writer = analyzer.writer
+        try:
+            ids = list(range(FIRST_BATCH))
+            for i in ids:
+                analyzer.record_transaction(_transaction(i))
+            # A newer day finishes DAY's open part, so compaction can take it
+            analyzer.record_transaction(_transaction(-1, NEXT_DAY))
+            writer.flush()
+            assert not any(open_part_owner(name) for name in _jsonl_parts(analyzer))
+            _check(analyzer, ids, "JSONL only")
+
+            assert compaction.compact_day(writer, DAY) == FIRST_BATCH
+            _check(analyzer, ids, "compacted, parts kept for the grace period")
+
+            # Late records for a finished day land in a part of their own
+            late = list(range(FIRST_BATCH, FIRST_BATCH + LATE_BATCH))
+            for i in late:
+                analyzer.record_transaction(_transaction(i))
+            writer.flush()
+            ids += late
+            _check(analyzer, ids, "late part next to the Parquet file")
+
+            assert compaction.compact_day(writer, DAY) == LATE_BATCH
+            _check(analyzer, ids, "re-compacted with the late part")
+
+            assert compaction.compact_day(writer, DAY, grace_seconds=0) == 0
+            _check(analyzer, ids, "covered parts deleted")
+            # A part the gzip thread renamed mid-delete goes on the next run
+            assert compaction.compact_day(writer, DAY, grace_seconds=0) == 0
+            leftover = _jsonl_parts(analyzer)
+            assert not leftover, f"covered parts not deleted after the grace period: {leftover}"
+
+            # A part written now must not reuse a covered (deleted) number
+            analyzer.record_transaction(_transaction(FIRST_BATCH + LATE_BATCH))
+            writer.flush()
+            ids.append(FIRST_BATCH + LATE_BATCH)
+            _check(analyzer, ids, "late part after deletion")
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    print("🔍 TESTING LAYER 6 COMPACTION\n" + "=" * 50)
+    if not compaction.available():
+        print("pyarrow not installed; skipping")
+        sys.exit(0)
+    test_compaction_counts_every_record_once()
+    sys.exit(0)
@@ -0,0 +1,123 @@
+# test_layer6_writers.py
+# N writer processes share one forensic log root, rotating parts as they go;
+# one of them exits without close(). The next writer to start must finish
+# its open part, and the day must then hold every record exactly once.
+# close() must also return, losing nothing it accepted, while threads are
+# still writing.
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from layer6.log_writer import ForensicLogWriter, open_part_owner
+
+DAY = "2026-01-15"
+PROCESSES = 6
+RECORDS_PER_PROCESS = 2000
+THREADS = 8
+
+
+def _record(worker: int, i: int) -> str:
+    return json.dumps({"worker": worker, "i": i, "pad": "x" * 64})
+
+
+def writer_process(root: str, worker: int, crash: bool, start_barrier) -> None:
+    writer = ForensicLogWriter(root, flush_every=64, flush_interval_ms=5.0, rotate_bytes=32 * 1024)
+    start_barrier.wait()
+    for i in range(RECORDS_PER_PROCESS):
+        assert writer.write(_record(worker, i), day=DAY)
+    if crash:
+        writer.flush()
+        os._exit(0)  # No close(), no atexit: the open part stays behind
+    writer.close()
+
+
+def _read_day(root: str) -> Counter:
+    writer = ForensicLogWriter(root)
+    writer.close()  # Waits for the compressions queued by recovery
+    return Counter(line.strip() for line in writer.read_day(DAY) if line.strip())
+
+
+def test_crashed_writer_part_is_recovered_once():
+    with tempfile.TemporaryDirectory() as root:
+        start_barrier = multiprocessing.Barrier(PROCESSES)
+        procs = [
+            multiprocessing.Process(target=writer_process, args=(root, worker, worker == 0, start_barrier))
+            for worker in range(PROCESSES)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=120)
+            assert p.exitcode == 0, f"writer process exited with {p.exitcode}"
+
+        day_dir = os.path.join(root, DAY)
+        left_open = [name for name in os.listdir(day_dir) if open_part_owner(name) is not None]
+        assert left_open, "the crashed writer should have left an open part"
+
+        counts = _read_day(root)
+        still_open = [name for name in os.listdir(day_dir) if open_part_owner(name) is not None]
+        reserved = [name for name in os.listdir(day_dir) if name.endswith(".reserved")]
+
+    expected = {_record(worker, i) for worker in range(PROCESSES) for i in range(RECORDS_PER_PROCESS)}
+    missing = expected - set(counts)
+    duplicated = [line for line, n in counts.items() if n > 1]
+    print(f"Records: {sum(counts.values())} read, {len(expected)} written by {PROCESSES} processes")
+    print(f"Open parts left by the crash: {left_open}")
+    assert not still_open, f"parts still open after recovery: {still_open}"
+    assert not reserved, f"reservations left behind: {reserved}"
+    assert not missing, f"{len(missing)} records lost"
+    assert not duplicated, f"{len(duplicated)} records duplicated"
+    assert set(counts) == expected, "unexpected records in the day"
+    print("✓ crashed writer's part recovered; no record lost or duplicated")
+
+
+def test_close_returns_while_writes_race():
+    with tempfile.TemporaryDirectory() as root:
+        writer = ForensicLogWriter(root, flush_every=32, flush_interval_ms=5.0, rotate_bytes=16 * 1024)
+        accepted = {t: [] for t in range(THREADS)}
+        started = threading.Barrier(THREADS + 1)
+
+        def hammer(t: int) -> None:
+            started.wait()
+            i = 0
+            while True:
+                try:
+                    if writer.write(_record(t, i), day=DAY):
+                        accepted[t].append(i)
+                except RuntimeError:
+                    return  # Closed
+                i += 1
+
+        threads = [threading.Thread(target=hammer, args=(t,), daemon=True) for t in range(THREADS)]
+        for t in threads:
+            t.start()
+        started.wait()
+        time.sleep(0.2)
+
+        closer = threading.Thread(target=writer.close, daemon=True)
+        closer.start()
+        closer.join(timeout=30)
+        assert not closer.is_alive(), "close() hung while writes were racing"
+        for t in threads:
+            t.join(timeout=30)
+            assert not t.is_alive(), "a writer thread never saw the close"
+
+        counts = _read_day(root)
+
+    expected = {_record(t, i) for t, indices in accepted.items() for i in indices}
+    assert expected, "no writes were accepted before close()"
+    assert set(counts) == expected, f"{len(expected - set(counts))} accepted records missing after close()"
+    assert all(n == 1 for n in counts.values()), "records duplicated"
+    print(f"✓ close() returned mid-write; all {len(expected)} accepted records on disk once")
+
+
+if __name__ == "__main__":
+    print("🔍 TESTING LAYER 6 MULTI-PROCESS WRITERS\n" + "=" * 50)
+    test_crashed_writer_part_is_recovered_once()
+    test_close_returns_while_writes_race()
+    sys.exit(0)
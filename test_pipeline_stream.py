@@ -0,0 +1,138 @@
+# test_pipeline_stream.py
+# A client that disconnects on the Layer 4 "abort" event must not skip
+# egress: the Layer 5 breach (+10) and the Layer 6 record have to land
+# before the abort is yielded, whichever way the generator is closed.
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import layer5.user_profiler as user_profiler
+import layer6.forensic_analysis as forensic_analysis
+import pipeline as pipeline_module
+from layer5.profile_store import ProfileStore
+from layer5.user_profiler import UserProfiler
+from layer6.forensic_analysis import ForensicAnalyzer
+
+USER_ID = "stream_user"
+BREACH_POINTS = 10
+LEAKY_CHUNKS = ["Sure, here it is. ", "The SSN is 123-", "45-6789 and ", "more text that never arrives."]
+
+
+def _safe_intent(text, threshold=0.95):
+    return {"score": 0.0, "is_malicious": False}
+
+
+def _leaky_stream(system_message, user_message):
+    yield from LEAKY_CHUNKS
+
+
+def _clean_stream(system_message, user_message):
+    for i in range(100):
+        yield f"Harmless sentence number {i}. "
+
+
+async def _aleaky_stream(system_message, user_message):
+    for chunk in LEAKY_CHUNKS:
+        yield chunk
+
+
+class _AsyncBackend:
+    astream = staticmethod(_aleaky_stream)
+
+
+class _Isolated:
+    """Private Layer 5 / Layer 6 singletons in a temp dir for one test."""
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = (user_profiler.profiler, forensic_analysis.analyzer, pipeline_module.detect_intent)
+        user_profiler.profiler = UserProfiler(
+            store=ProfileStore(os.path.join(self.tmp.name, "profiles.db")),
+            legacy_file=None,
+            score_half_life_seconds=None,
+        )
+        forensic_analysis.analyzer = ForensicAnalyzer(
+            log_dir=os.path.join(self.tmp.name, "logs"),
+            report_dir=os.path.join(self.tmp.name, "reports"),
+            compact_interval_seconds=None,
+        )
+        pipeline_module.detect_intent = _safe_intent
+        return self
+
+    def score(self) -> float:
+        profile = user_profiler.profiler.get_profile(USER_ID)
+        return profile["score"] if profile else 0
+
+    def records(self):
+        return list(forensic_analysis.analyzer.iter_logs(datetime.now()))
+
+    def __exit__(self, *exc):
+        forensic_analysis.analyzer.writer.close()
+        user_profiler.profiler.store.close()
+        user_profiler.profiler, forensic_analysis.analyzer, pipeline_module.detect_intent = self.saved
+        self.tmp.cleanup()
+
+
+def _pipeline(llm_stream=_leaky_stream):
+    return pipeline_module.Pipeline(llm=lambda s, u: "", llm_stream=llm_stream)
+
+
+def test_close_after_abort_still_scores_and_records():
+    with _Isolated() as env:
+        pl = _pipeline()
+        before = env.score()
+        events = pl.process_stream("What is my SSN?", USER_ID)
+        for kind, _ in events:
+            if kind == "abort":
+                break
+        else:
+            raise AssertionError("stream was never aborted")
+        events.close()
+        assert env.score() == before + BREACH_POINTS, f"score {env.score()} != {before + BREACH_POINTS}"
+        records = env.records()
+        assert len(records) == 1, f"{len(records)} forensic records"
+        assert records[0]["blocked_by"] == "layer4"
+        print(f"✓ sync: disconnect on abort → score +{BREACH_POINTS}, 1 record")
+
+
+def test_close_mid_stream_still_scores_and_records():
+    with _Isolated() as env:
+        pl = _pipeline(_clean_stream)
+        events = pl.process_stream("Tell me something", USER_ID)
+        assert next(events)[0] == "token"
+        events.close()
+        records = env.records()
+        assert len(records) == 1, "disconnect before abort lost the record"
+        assert not records[0]["was_blocked"]
+        print("✓ sync: disconnect on first token → 1 record")
+
+
+def test_async_close_after_abort_still_scores_and_records():
+    from async_api import AsyncGateway, CpuOffloader
+
+    async def run(gateway, ctx):
+        events = gateway.stream(ctx)
+        async for kind, _ in events:
+            if kind == "abort":
+                break
+        await events.aclose()
+
+    with _Isolated() as env:
+        pl = _pipeline()
+        gateway = AsyncGateway(pl, _AsyncBackend(), CpuOffloader(max_workers=2, max_pending=2), max_inflight=4)
+        ctx = pl.ingress("What is my SSN?", USER_ID)
+        before = env.score()
+        asyncio.run(run(gateway, ctx))
+        assert env.score() == before + BREACH_POINTS, f"score {env.score()} != {before + BREACH_POINTS}"
+        assert len(env.records()) == 1, "async disconnect lost the record"
+        print(f"✓ async: disconnect on abort → score +{BREACH_POINTS}, 1 record")
+
+
+if __name__ == "__main__":
+    print("🔍 TESTING STREAMING DISCONNECTS\n" + "=" * 50)
+    test_close_after_abort_still_scores_and_records()
+    test_close_mid_stream_still_scores_and_records()
+    test_async_close_after_abort_still_scores_and_records()
+    sys.exit(0)